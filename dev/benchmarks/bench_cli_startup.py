@@ -0,0 +1,77 @@
+"""
+CLI startup time, guarded by a budget. Exits with 1 when `import vpntools.cli`
+takes longer than --budget-ms or imports a module that has to stay lazy.
+
+    python3 dev/benchmarks/bench_cli_startup.py --budget-ms 100
+"""
+import os
+import sys
+import subprocess
+from argparse import ArgumentParser
+from typing import Dict, List, Tuple
+
+from bench_utils import best_of
+
+# dependencies only the subcommands running a workflow may import
+LAZY_MODULES = ("fabric", "paramiko", "jinja2", "prettytable", "termcolor", "segno")
+
+
+def run_importtime(module: str) -> List[Tuple[int, int, str]]:
+    """(self us, cumulative us, module) of `python -X importtime -c 'import ...'`"""
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    rows = []
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def main() -> None:
+    cli = ArgumentParser()
+    cli.add_argument("--budget-ms", type=float, default=100)
+    cli.add_argument("--repeat", type=int, default=5)
+    cli.add_argument("--top", type=int, default=10)
+    args = cli.parse_args()
+
+    # best of several runs, the first one may pay for cold caches
+    runs = [run_importtime("vpntools.cli") for _ in range(args.repeat)]
+    best = min(runs, key=lambda rows: rows[-1][1])
+    import_ms = best[-1][1] / 1000
+    imported: Dict[str, int] = {name.strip(): cum for _, cum, name in best}
+    t_help = best_of(
+        lambda: subprocess.run(
+            [sys.executable, "-m", "vpntools.cli", "--help"],
+            capture_output=True,
+            check=True,
+            env={**os.environ, "PYTHONPATH": os.getcwd()},
+        ),
+        args.repeat,
+    )
+
+    print(f"import vpntools.cli: {import_ms:8.1f} ms (budget {args.budget_ms} ms)")
+    print(f"vpntools.cli --help: {t_help * 1000:8.1f} ms (interpreter start included)")
+    print("slowest imports (cumulative):")
+    for _, cumulative_us, name in sorted(best, key=lambda row: -row[1])[: args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms {name}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    if import_ms > args.budget_ms:
+        print(f"FAIL: startup over budget by {import_ms - args.budget_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Client pipeline (config render + QR code) serially and in a process pool, and
+the number of jobs above which the pool pays for its startup.
+
+    python3 dev/benchmarks/bench_clients.py --jobs 16,64,256 --qr-format png
+"""
+import os
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+from bench_fleet import fleet_config
+from bench_utils import best_of
+from vpntools.clients import build_client_artifacts, iter_client_jobs
+from vpntools.helpers import get_process_pool_context
+from vpntools.output import QR_FORMATS
+from vpntools.wireguard import build_peer_registries
+
+
+def pool_startup(processes: int) -> float:
+    """Seconds until every worker of a fresh pool ran a task"""
+    started = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=get_process_pool_context()
+    ) as executor:
+        list(executor.map(abs, range(processes)))
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    cli = ArgumentParser()
+    cli.add_argument("--jobs", default="16,64,256", help="Comma separated job counts")
+    cli.add_argument("--qr-format", choices=QR_FORMATS, default="png")
+    cli.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    cli.add_argument("--repeat", type=int, default=3)
+    args = cli.parse_args()
+
+    job_counts = [int(count) for count in args.jobs.split(",")]
+    config = fleet_config(1, max(job_counts))
+    hostnames = list(config)
+    all_jobs = list(iter_client_jobs(config, build_peer_registries(config), hostnames))
+
+    per_job = 0.0
+    for count in job_counts:
+        jobs = all_jobs[:count]
+        t_serial = best_of(
+            lambda: build_client_artifacts(jobs, args.qr_format, processes=1),
+            args.repeat,
+        )
+        t_pool = best_of(
+            lambda: build_client_artifacts(jobs, args.qr_format, args.processes),
+            args.repeat,
+        )
+        per_job = t_serial / count
+        print(
+            f"jobs {count:6}: serial {t_serial * 1000:9.1f} ms, "
+            f"pool {t_pool * 1000:9.1f} ms ({args.processes} processes)"
+        )
+
+    t_startup = best_of(lambda: pool_startup(args.processes), args.repeat)
+    print(f"per job: {per_job * 1000:.2f} ms, pool startup: {t_startup * 1000:.1f} ms")
+    if args.processes > 1:
+        # the pool saves (1 - 1/processes) of the serial time
+        break_even = t_startup / (per_job * (1 - 1 / args.processes))
+        print(f"pool pays off above ~{break_even:.0f} jobs")
+
+
+if __name__ == "__main__":
+    main()
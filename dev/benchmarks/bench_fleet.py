@@ -0,0 +1,181 @@
+"""
+Workflow timings on simulated fleets, hosts are served by vpntools.fake_transport
+with a fixed latency per round-trip.
+
+Runs load config, connect, status, deploy and client generation for every fleet
+size and reports the best time of each instruction. Results can be saved and
+compared with an earlier run, exiting with 1 on a regression:
+
+    python3 dev/benchmarks/bench_fleet.py --hosts 10,100,500 --peers 50000 \
+        --save fleet.json
+    python3 dev/benchmarks/bench_fleet.py --hosts 10,100,500 --peers 50000 \
+        --compare fleet.json
+"""
+import io
+import os
+import sys
+import json
+import logging
+import platform
+import tempfile
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from typing import Any, Dict
+
+from bench_utils import fake_wg_key
+from vpntools.fake_transport import fake_fleet
+from vpntools.helpers import dict_to_yaml
+from vpntools.tracing import TRACER
+from vpntools.workflow import ExecutionContext, Workflow
+
+FLEET_WF = {
+    "instructions": [
+        {"LOAD_CONFIG": {}},
+        {"CONNECT_HOSTS": {}},
+        {"GET_WIREGUARD_STATUS": {"format": "json"}},
+        {"DEPLOY_WIREGUARD": {"force": True}},
+        {"BUILD_WIREGUARD_CLIENTS": {}},
+    ]
+}
+
+
+def fleet_config(hosts: int, peers: int) -> Dict[str, Any]:
+    """hosts servers with peers spread evenly, all keys and addresses set"""
+    config = {}
+    for host_idx in range(hosts):
+        host_peers = peers // hosts + (host_idx < peers % hosts)
+        config[f"vpn{host_idx:04d}.example.net"] = {
+            "description": f"fake server {host_idx}",
+            "ssh_user": "bench",
+            "ssh_private_key": "unused by the fake transport",
+            "app_config": {
+                "wireguard": {
+                    "wg0": {
+                        "server_private_ip": "10.0.0.1/16",
+                        "server_port": 52101,
+                        "endpoint": f"203.0.113.{host_idx % 250 + 1}",
+                        "private_key": fake_wg_key(),
+                        "public_key": fake_wg_key(),
+                        "peers": [
+                            {
+                                f"peer_{idx}": {
+                                    "private_key": fake_wg_key(),
+                                    "public_key": fake_wg_key(),
+                                    "peer_private_ip": f"10.0.{(idx + 2) >> 8}."
+                                    f"{(idx + 2) & 255}/16",
+                                    "dns_servers": "1.1.1.1",
+                                }
+                            }
+                            for idx in range(host_peers)
+                        ],
+                    }
+                }
+            },
+        }
+    return config
+
+
+def run_fleet(config: Dict[str, Any], tmp_dir: str, args: Any) -> Dict[str, float]:
+    """Best time of every instruction over args.repeat runs, in seconds"""
+    vpn_yaml = os.path.join(tmp_dir, "vpn.yaml")
+    with open(vpn_yaml, "w", encoding="utf-8") as f:
+        f.write(dict_to_yaml(config))
+
+    best: Dict[str, float] = {}
+    for _ in range(args.repeat):
+        # a fresh pool per run, so connecting is measured every time
+        pool = fake_fleet(
+            config, args.latency_ms / 1000, args.connect_latency_ms / 1000
+        )
+        ctx = ExecutionContext(
+            {
+                "vpn_yaml": vpn_yaml,
+                "no_config_cache": True,
+                "workers": args.workers,
+                "state_file": os.path.join(tmp_dir, "deploy_state.json"),
+                "output_dir": os.path.join(tmp_dir, "clients"),
+                "processes": args.processes,
+            },
+            pool=pool,
+        )
+        TRACER.enable()
+        with redirect_stdout(io.StringIO()):
+            Workflow.from_dict(FLEET_WF).run(ctx)
+        TRACER.disable()
+        if ctx.errors:
+            raise RuntimeError(f"Fleet run failed: {ctx.errors}")
+
+        for (category, name), row in TRACER.summary().items():
+            if category in ("workflow", "instruction"):
+                best[name] = min(best.get(name, row["total"]), row["total"])
+    return best
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> bool:
+    """Print the ratios to the baseline, False if anything regressed"""
+    ok = True
+    for hosts, timings in results.items():
+        for name, timing in timings.items():
+            old = baseline.get(hosts, {}).get(name)
+            if old is None:
+                continue
+            ratio = timing / old if old else float("inf")
+            regressed = ratio > 1 + tolerance
+            ok = ok and not regressed
+            print(
+                f"hosts {hosts:>5} {name:22} {old * 1000:9.1f} -> "
+                f"{timing * 1000:9.1f} ms ({ratio:.2f}x){' REGRESSION' if regressed else ''}"
+            )
+    return ok
+
+
+def main() -> None:
+    cli = ArgumentParser()
+    cli.add_argument("--hosts", default="10,100", help="Comma separated fleet sizes")
+    cli.add_argument("--peers", type=int, default=5000, help="Peers in the whole fleet")
+    cli.add_argument("--latency-ms", type=float, default=20)
+    cli.add_argument("--connect-latency-ms", type=float, default=100)
+    cli.add_argument("--workers", type=int, default=16)
+    cli.add_argument("--processes", type=int)
+    cli.add_argument("--repeat", type=int, default=3)
+    cli.add_argument("--save", help="Write the results to this JSON file")
+    cli.add_argument("--compare", help="Compare with results saved by --save")
+    cli.add_argument("--tolerance", type=float, default=0.2)
+    args = cli.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    results: Dict[str, Dict[str, float]] = {}
+    for hosts in (int(size) for size in args.hosts.split(",")):
+        config = fleet_config(hosts, args.peers)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results[str(hosts)] = run_fleet(config, tmp_dir, args)
+        print(f"hosts: {hosts}, peers: {args.peers}")
+        for name, timing in results[str(hosts)].items():
+            print(f"  {name + ':':22} {timing * 1000:9.1f} ms")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "params": {
+                        key: value
+                        for key, value in vars(args).items()
+                        if key not in ("save", "compare")
+                    },
+                    "python": platform.python_version(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Validate and fill in peer addresses of a large interface.
+
+    python3 dev/benchmarks/bench_ipam.py --peers 65000
+"""
+import copy
+import ipaddress
+from argparse import ArgumentParser
+
+from bench_utils import best_of
+from vpntools.ipam import allocate_peer_ips
+
+
+def make_config(hosts: int, peers: int, assigned_ratio: float):
+    network = ipaddress.ip_network("10.0.0.0/16")
+    config = {}
+    for host_idx in range(hosts):
+        peer_lst = []
+        for peer_idx in range(peers):
+            peer_cfg = {}
+            if peer_idx < peers * assigned_ratio:
+                peer_cfg["peer_private_ip"] = f"{network[peer_idx + 2]}/16"
+            peer_lst.append({f"peer_{peer_idx}": peer_cfg})
+        config[f"host{host_idx}"] = {
+            "app_config": {
+                "wireguard": {
+                    "wg0": {"server_private_ip": f"{network[1]}/16", "peers": peer_lst}
+                }
+            }
+        }
+    return config
+
+
+def main() -> None:
+    cli = ArgumentParser()
+    cli.add_argument("--hosts", type=int, default=1)
+    cli.add_argument("--peers", type=int, default=65000)
+    cli.add_argument("--assigned", type=float, default=0.5)
+    cli.add_argument("--repeat", type=int, default=3)
+    args = cli.parse_args()
+
+    config = make_config(args.hosts, args.peers, args.assigned)
+    configs = [copy.deepcopy(config) for _ in range(args.repeat)]
+    t_ipam = best_of(lambda: allocate_peer_ips(configs.pop()), args.repeat)
+    print(f"hosts: {args.hosts}, peers per host: {args.peers}")
+    print(f"validate + allocate: {t_ipam * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
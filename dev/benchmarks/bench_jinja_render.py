@@ -0,0 +1,101 @@
+"""
+Render peer configs with a fresh Jinja environment per call vs the cached one.
+
+    python3 dev/benchmarks/bench_jinja_render.py --peers 10000
+"""
+import ipaddress
+import os
+import tempfile
+from argparse import ArgumentParser
+
+import jinja2
+
+from bench_utils import best_of, fake_wg_key
+from vpntools.jinja_render import (
+    compile_template_bundle,
+    get_environment,
+    render_from_template,
+)
+
+
+def render_with_new_env(context, globals_dict):
+    env = jinja2.Environment(
+        loader=jinja2.PackageLoader("vpntools", "resources/templates"),
+        undefined=jinja2.StrictUndefined,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    tmpl = env.get_template("wg_client_cfg.j2")
+    tmpl.globals.update(globals_dict)
+    return tmpl.render(context)
+
+
+def main() -> None:
+    cli = ArgumentParser()
+    cli.add_argument("--peers", type=int, default=10000)
+    cli.add_argument("--repeat", type=int, default=3)
+    args = cli.parse_args()
+
+    srv_cfg = {"public_key": fake_wg_key(), "server_port": 52101}
+    globals_dict = {
+        "wg_srv_cfg": srv_cfg,
+        "server_endpoint": "203.0.113.1:52101",
+        "ipaddress": ipaddress,
+    }
+    peers = [
+        {
+            "private_key": fake_wg_key(),
+            "peer_private_ip": f"10.{idx >> 16 & 255}.{idx >> 8 & 255}.{idx & 255}/8",
+            "dns_servers": "1.1.1.1, 1.0.0.1",
+        }
+        for idx in range(args.peers)
+    ]
+
+    def render_all_new_env():
+        for peer in peers:
+            render_with_new_env(peer, globals_dict)
+
+    def render_all_cached(bundle_path=None):
+        for peer in peers:
+            get_environment(bundle_path).get_template("wg_client_cfg.j2").render(
+                {**globals_dict, **peer}
+            )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bundle_path = os.path.join(tmp_dir, "templates.zip")
+        compile_template_bundle(bundle_path)
+
+        t_new_env = best_of(render_all_new_env, args.repeat)
+        t_cached = best_of(
+            lambda: [
+                render_from_template("wg_client_cfg.j2", p, globals_dict) for p in peers
+            ],
+            args.repeat,
+        )
+        get_environment.cache_clear()
+        t_cold = best_of(
+            lambda: (
+                get_environment.cache_clear(),
+                get_environment().get_template("wg_client_cfg.j2"),
+            ),
+            args.repeat,
+        )
+        t_cold_bundle = best_of(
+            lambda: (
+                get_environment.cache_clear(),
+                get_environment(bundle_path).get_template("wg_client_cfg.j2"),
+            ),
+            args.repeat,
+        )
+        t_bundle = best_of(lambda: render_all_cached(bundle_path), args.repeat)
+
+    print(f"peer configs: {args.peers}")
+    print(f"new environment per render: {t_new_env * 1000:9.1f} ms")
+    print(f"cached environment:         {t_cached * 1000:9.1f} ms")
+    print(f"cached, compiled bundle:    {t_bundle * 1000:9.1f} ms")
+    print(f"first template load, source: {t_cold * 1000:8.2f} ms")
+    print(f"first template load, bundle: {t_cold_bundle * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
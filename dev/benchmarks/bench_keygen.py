@@ -0,0 +1,29 @@
+"""
+Generate Wireguard key pairs in-process, serially and in a process pool.
+
+    python3 dev/benchmarks/bench_keygen.py --keys 100000
+"""
+from argparse import ArgumentParser
+
+from bench_utils import best_of
+from vpntools.keygen import generate_keypairs
+
+
+def main() -> None:
+    cli = ArgumentParser()
+    cli.add_argument("--keys", type=int, default=100000)
+    cli.add_argument("--processes", type=int)
+    cli.add_argument("--repeat", type=int, default=1)
+    args = cli.parse_args()
+
+    t_serial = best_of(lambda: generate_keypairs(args.keys, processes=1), args.repeat)
+    t_pool = best_of(
+        lambda: generate_keypairs(args.keys, processes=args.processes), args.repeat
+    )
+    print(f"key pairs: {args.keys}")
+    print(f"serial:       {t_serial:7.2f} s ({args.keys / t_serial:9.0f} keys/s)")
+    print(f"process pool: {t_pool:7.2f} s ({args.keys / t_pool:9.0f} keys/s)")
+
+
+if __name__ == "__main__":
+    main()
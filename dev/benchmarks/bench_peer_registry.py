@@ -0,0 +1,66 @@
+"""
+Memory footprint and lookup speed of PeerRegistry.
+
+    python3 dev/benchmarks/bench_peer_registry.py --peers 100000
+"""
+import random
+import tracemalloc
+from argparse import ArgumentParser
+
+from bench_utils import best_of, fake_wg_key
+from vpntools.peers import PeerRegistry
+
+
+def main() -> None:
+    cli = ArgumentParser()
+    cli.add_argument("--peers", type=int, default=100000)
+    cli.add_argument("--lookups", type=int, default=100000)
+    cli.add_argument("--repeat", type=int, default=3)
+    args = cli.parse_args()
+
+    wg_app_config = {
+        "wg0": {
+            "peers": [
+                {
+                    f"peer_{idx}": {
+                        "public_key": fake_wg_key(),
+                        "peer_private_ip": f"10.{idx >> 16 & 255}.{idx >> 8 & 255}."
+                        f"{idx & 255}/8",
+                    }
+                }
+                for idx in range(args.peers)
+            ]
+        }
+    }
+
+    tracemalloc.start()
+    registry = PeerRegistry.from_wg_config("host", wg_app_config)
+    registry_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t_build = best_of(
+        lambda: PeerRegistry.from_wg_config("host", wg_app_config), args.repeat
+    )
+    records = list(registry)
+    sample = [random.choice(records) for _ in range(args.lookups)]
+    keys = [record.public_key for record in sample]
+    names = [record.name for record in sample]
+    ips = [record.private_ip for record in sample]
+    t_key = best_of(
+        lambda: [registry.by_public_key(key, "wg0") for key in keys], args.repeat
+    )
+    t_name = best_of(lambda: [registry.by_name(name) for name in names], args.repeat)
+    t_ip = best_of(lambda: [registry.by_ip(ip) for ip in ips], args.repeat)
+
+    print(f"peers: {args.peers}")
+    print(f"registry build:  {t_build * 1000:8.1f} ms")
+    print(
+        f"registry memory: {registry_size / 2**20:8.1f} MiB "
+        f"({registry_size / args.peers:.0f} bytes/peer, peer configs excluded)"
+    )
+    for name, timing in (("public key", t_key), ("name", t_name), ("ip", t_ip)):
+        print(f"lookup by {name + ':':12} {timing / args.lookups * 1e9:6.0f} ns/lookup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Server config rendering of `plan` serially and in a process pool, and the
+number of peers above which the pool pays for its startup and the transfer of
+host configs to the workers.
+
+    python3 dev/benchmarks/bench_plan.py --fleets 10:100,100:5000,500:50000
+"""
+import os
+from argparse import ArgumentParser
+
+from bench_clients import pool_startup
+from bench_fleet import fleet_config
+from bench_utils import best_of
+from vpntools import plan
+
+
+def main() -> None:
+    cli = ArgumentParser()
+    cli.add_argument(
+        "--fleets",
+        default="10:100,100:5000,500:50000",
+        help="Comma separated hosts:peers pairs",
+    )
+    cli.add_argument("--processes", type=int, default=max(2, os.cpu_count() or 1))
+    cli.add_argument("--repeat", type=int, default=3)
+    args = cli.parse_args()
+
+    fleets = [
+        tuple(int(part) for part in fleet.split(":"))
+        for fleet in args.fleets.split(",")
+    ]
+    # the pool is only used above the threshold, lift it for the pooled runs
+    threshold = plan.MIN_PARALLEL_SERVER_PEERS
+    timings = []
+    for hosts, peers in fleets:
+        config = fleet_config(hosts, peers)
+        t_serial = best_of(
+            lambda: plan.render_server_configs(config, processes=1), args.repeat
+        )
+        plan.MIN_PARALLEL_SERVER_PEERS = 0
+        try:
+            t_pool = best_of(
+                lambda: plan.render_server_configs(config, args.processes),
+                args.repeat,
+            )
+        finally:
+            plan.MIN_PARALLEL_SERVER_PEERS = threshold
+        timings.append((peers, t_serial, t_pool))
+        print(
+            f"hosts {hosts:5}, peers {peers:7}: serial {t_serial * 1000:9.1f} ms, "
+            f"pool {t_pool * 1000:9.1f} ms ({args.processes} processes)"
+        )
+
+    t_startup = best_of(lambda: pool_startup(args.processes), args.repeat)
+    (small, s_small, p_small), (large, s_large, p_large) = timings[0], timings[-1]
+    per_peer = s_large / large
+    # what the pool adds per peer besides its startup: pickling host configs
+    # and rendered configs, plus the rendering itself when the workers do not
+    # get a CPU each
+    pool_per_peer = (p_large - p_small) / max(1, large - small)
+    print(
+        f"per peer: serial {per_peer * 1e6:.1f} us, pool {pool_per_peer * 1e6:.1f} us"
+        f" on {os.cpu_count()} CPU(s), pool startup: {t_startup * 1000:.1f} ms"
+    )
+    # workers short of a CPU each render one after another
+    if (os.cpu_count() or 1) < args.processes:
+        rendered_per_peer = per_peer
+    else:
+        rendered_per_peer = per_peer / args.processes
+    transfer_per_peer = max(0.0, pool_per_peer - rendered_per_peer)
+    # with a CPU per worker the pool saves (1 - 1/processes) of the rendering
+    # but still pays for the transfers
+    saved_per_peer = per_peer * (1 - 1 / args.processes) - transfer_per_peer
+    if saved_per_peer <= 0:
+        print("the pool does not pay off at any fleet size")
+    else:
+        print(f"pool pays off above ~{t_startup / saved_per_peer:.0f} peers")
+
+
+if __name__ == "__main__":
+    main()
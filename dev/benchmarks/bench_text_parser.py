@@ -0,0 +1,57 @@
+"""
+Compare the single-pass compiled TextParser with per-pattern re.match dispatch.
+
+    python3 dev/benchmarks/bench_text_parser.py --peers 10000
+"""
+import re
+import logging
+from argparse import ArgumentParser
+from typing import Optional, Tuple
+
+from bench_utils import best_of, fake_wg_key, wg_show_text
+from vpntools.parsers import TextParser
+
+logger = logging.getLogger()
+
+WG_SHOW_PATTERNS = [r"peer: (?P<pub_key>.*)", r"(?P<key>.*?):(?P<value>.*)"]
+
+
+class PerPatternTextParser(TextParser):
+    """TextParser matching every pattern in turn, the way it used to"""
+
+    def _match_line(self, line: str) -> Optional[Tuple[int, re.Match, int, str]]:
+        for idx, pattern in enumerate(self._regexp_lst):
+            logger.debug(
+                "_parse_line:\nline: '%s'\npattern[%s]: '%s'", line, idx, pattern
+            )
+            match = re.match(pattern, line)
+            if match:
+                return idx, match, 0, ""
+        return None
+
+
+def main() -> None:
+    cli = ArgumentParser()
+    cli.add_argument("--peers", type=int, default=10000)
+    cli.add_argument("--repeat", type=int, default=5)
+    args = cli.parse_args()
+
+    text = wg_show_text([fake_wg_key() for _ in range(args.peers)])
+    compiled = TextParser(WG_SHOW_PATTERNS)
+    per_pattern = PerPatternTextParser(WG_SHOW_PATTERNS)
+    assert compiled.parse_text(text) == per_pattern.parse_text(text)
+
+    t_per_pattern = best_of(lambda: per_pattern.parse_text(text), args.repeat)
+    t_compiled = best_of(lambda: compiled.parse_text(text), args.repeat)
+    t_stream = best_of(
+        lambda: compiled.parse_lines(iter(text.splitlines())), args.repeat
+    )
+    print(f"lines: {text.count(chr(10)) + 1}")
+    print(f"per-pattern re.match:   {t_per_pattern * 1000:8.1f} ms")
+    print(f"compiled alternation:   {t_compiled * 1000:8.1f} ms")
+    print(f"compiled, line stream:  {t_stream * 1000:8.1f} ms")
+    print(f"speedup: {t_per_pattern / t_compiled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import base64
+import os
+import time
+from typing import Any, Callable, List
+
+
+def best_of(func: Callable[[], Any], repeat: int = 5) -> float:
+    """Return the best wall time of `repeat` runs of func, in seconds"""
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def fake_wg_key() -> str:
+    return base64.b64encode(os.urandom(32)).decode()
+
+
+def wg_show_text(peer_keys: List[str], if_name: str = "wg0") -> str:
+    """Synthetic human-readable `wg show all` output"""
+    lines = [
+        f"interface: {if_name}",
+        f"  public key: {fake_wg_key()}",
+        "  private key: (hidden)",
+        "  listening port: 52101",
+        "",
+    ]
+    for idx, key in enumerate(peer_keys):
+        lines += [
+            f"peer: {key}",
+            f"  endpoint: 203.0.113.{idx % 250 + 1}:{1024 + idx % 60000}",
+            f"  allowed ips: 10.{idx >> 16 & 255}.{idx >> 8 & 255}.{idx & 255}/32",
+            "  latest handshake: 1 minute, 2 seconds ago",
+            "  transfer: 1.21 MiB received, 3.45 MiB sent",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def wg_dump_text(peer_keys: List[str], if_name: str = "wg0") -> str:
+    """Synthetic `wg show all dump` output"""
+    lines = [f"{if_name}\t{fake_wg_key()}\t{fake_wg_key()}\t52101\toff"]
+    for idx, key in enumerate(peer_keys):
+        lines.append(
+            "\t".join(
+                [
+                    if_name,
+                    key,
+                    "(none)",
+                    f"203.0.113.{idx % 250 + 1}:{1024 + idx % 60000}",
+                    f"10.{idx >> 16 & 255}.{idx >> 8 & 255}.{idx & 255}/32",
+                    str(1650000000 + idx),
+                    str(1268777 + idx),
+                    str(3617587 + idx),
+                    "off",
+                ]
+            )
+        )
+    return "\n".join(lines)
@@ -0,0 +1,36 @@
+"""
+Compare the legacy `wg show all` TextParser path with the `wg show all dump` parser.
+
+    python3 dev/benchmarks/bench_wg_status.py --peers 10000
+"""
+from argparse import ArgumentParser
+
+from bench_utils import best_of, fake_wg_key, wg_dump_text, wg_show_text
+from vpntools.parsers import TextParser, parse_wg_dump
+
+
+def main() -> None:
+    cli = ArgumentParser()
+    cli.add_argument("--peers", type=int, default=10000)
+    cli.add_argument("--repeat", type=int, default=5)
+    args = cli.parse_args()
+
+    peer_keys = [fake_wg_key() for _ in range(args.peers)]
+    show_text = wg_show_text(peer_keys)
+    dump_text = wg_dump_text(peer_keys)
+
+    text_parser = TextParser([r"peer: (?P<pub_key>.*)", r"(?P<key>.*?):(?P<value>.*)"])
+    assert set(text_parser.parse_text(show_text)) == {
+        public_key for _, public_key in parse_wg_dump(dump_text)
+    }
+
+    t_text = best_of(lambda: text_parser.parse_text(show_text), args.repeat)
+    t_dump = best_of(lambda: parse_wg_dump(dump_text), args.repeat)
+    print(f"peers: {args.peers}")
+    print(f"TextParser (wg show all):     {t_text * 1000:8.1f} ms")
+    print(f"parse_wg_dump (wg show dump): {t_dump * 1000:8.1f} ms")
+    print(f"speedup: {t_text / t_dump:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
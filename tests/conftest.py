@@ -0,0 +1,92 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from vpntools.fake_transport import FakeClient, FakeConnectionPool, fake_fleet
+from vpntools.keygen import generate_keypair
+from vpntools.wireguard import get_wg_from_host_cfg
+
+
+def make_host_config(peers: int = 3) -> Dict[str, Any]:
+    """One host with a wg0 interface and peers, all keys and addresses set"""
+    private_key, public_key = generate_keypair()
+    peer_list = []
+    for idx in range(peers):
+        peer_private_key, peer_public_key = generate_keypair()
+        peer_list.append(
+            {
+                f"peer_{idx}": {
+                    "private_key": peer_private_key,
+                    "public_key": peer_public_key,
+                    "peer_private_ip": f"10.0.0.{idx + 2}/24",
+                    "dns_servers": "1.1.1.1",
+                }
+            }
+        )
+    return {
+        "ssh_user": "test",
+        "ssh_private_key": "unused by the fake transport",
+        "app_config": {
+            "wireguard": {
+                "wg0": {
+                    "server_private_ip": "10.0.0.1/24",
+                    "server_port": 52101,
+                    "endpoint": "203.0.113.1",
+                    "private_key": private_key,
+                    "public_key": public_key,
+                    "peers": peer_list,
+                }
+            }
+        },
+    }
+
+
+@pytest.fixture
+def hostname() -> str:
+    return "vpn0.example.net"
+
+
+@pytest.fixture
+def config(hostname: str) -> Dict[str, Any]:
+    return {hostname: make_host_config()}
+
+
+@pytest.fixture
+def wg0(config: Dict[str, Any], hostname: str) -> Dict[str, Any]:
+    """wg0 interface of the config fixture"""
+    return get_wg_from_host_cfg(config[hostname])["wg0"]
+
+
+@pytest.fixture
+def fake_pool(config: Dict[str, Any]) -> FakeConnectionPool:
+    return fake_fleet(config)
+
+
+@pytest.fixture
+def flaky_pool(fake_pool: FakeConnectionPool, monkeypatch) -> FakeConnectionPool:
+    """fake_pool refusing the first connection to every host"""
+    refused = set()
+    new_connection = fake_pool._new_connection
+
+    def refuse_first(hostname: str, user: str, private_key: str) -> Any:
+        if hostname not in refused:
+            refused.add(hostname)
+            raise OSError(f"{hostname}: connection refused")
+        return new_connection(hostname, user, private_key)
+
+    monkeypatch.setattr(fake_pool, "_new_connection", refuse_first)
+    return fake_pool
+
+
+@pytest.fixture
+def sftp_sessions(monkeypatch) -> List[str]:
+    """Hostnames of the SFTP sessions opened on fake hosts, one entry each"""
+    sessions = []
+    open_sftp = FakeClient.open_sftp
+
+    def recorded(client: FakeClient) -> Any:
+        sessions.append(client.server.hostname)
+        return open_sftp(client)
+
+    monkeypatch.setattr(FakeClient, "open_sftp", recorded)
+    return sessions
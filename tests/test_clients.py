@@ -0,0 +1,84 @@
+import os
+import zipfile
+
+import pytest
+
+from vpntools import clients
+from vpntools.clients import (
+    build_client_artifacts,
+    iter_client_jobs,
+    write_client_artifacts,
+)
+from vpntools.wireguard import build_peer_registries
+
+
+@pytest.fixture
+def jobs(config, hostname):
+    return list(iter_client_jobs(config, build_peer_registries(config), [hostname]))
+
+
+def test_iter_client_jobs(config, wg0, hostname):
+    del wg0["peers"][1]["peer_1"]["private_key"]
+    wg0["endpoint"] = "vpn.example.net"
+
+    jobs = list(iter_client_jobs(config, build_peer_registries(config), [hostname]))
+
+    # peer_1 made its own keys
+    assert [job.peer_name for job in jobs] == ["peer_0", "peer_2"]
+    assert {job.srv_cfg["endpoint"] for job in jobs} == {"vpn.example.net"}
+    assert "peers" not in jobs[0].srv_cfg
+    assert jobs[0].peer_cfg["private_key"] == wg0["peers"][0]["peer_0"]["private_key"]
+
+
+def test_build_client_artifacts(jobs):
+    artifacts = build_client_artifacts(jobs, "svg")
+
+    assert [artifact.peer_name for artifact in artifacts] == [
+        "peer_0",
+        "peer_1",
+        "peer_2",
+    ]
+    assert jobs[0].peer_cfg["private_key"] in artifacts[0].config
+    assert b"<svg" in artifacts[0].qr_code
+    assert build_client_artifacts(jobs)[0].qr_code is None
+    with pytest.raises(ValueError, match="Unknown QR code format"):
+        build_client_artifacts(jobs, "gif")
+
+
+def test_build_client_artifacts_single_cpu_in_process(jobs, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("process pool started")
+
+    monkeypatch.setattr(clients, "ProcessPoolExecutor", no_pool)
+    monkeypatch.setattr(clients, "MIN_PARALLEL_JOBS", 1)
+    monkeypatch.setattr(clients.os, "cpu_count", lambda: 1)
+    assert len(build_client_artifacts(jobs)) == 3
+    assert len(build_client_artifacts(jobs[:1], processes=4)) == 1
+
+
+@pytest.mark.parametrize("bundle", [False, True])
+def test_write_client_artifacts(jobs, hostname, tmp_path, bundle):
+    artifacts = build_client_artifacts(jobs, "png")
+    output_dir = str(tmp_path / "clients")
+
+    path = write_client_artifacts(artifacts, output_dir, bundle)
+
+    expected = {
+        f"{hostname}/peer_{idx}.{ext}" for idx in range(3) for ext in ("conf", "png")
+    }
+    if bundle:
+        assert path == os.path.join(output_dir, "wg_clients.zip")
+        with zipfile.ZipFile(path) as zip_file:
+            assert set(zip_file.namelist()) == expected
+            config_name = f"{hostname}/peer_0.conf"
+            assert zip_file.read(config_name).decode() == artifacts[0].config
+        written = [path]
+    else:
+        assert path == output_dir
+        written = [os.path.join(output_dir, name) for name in expected]
+        with open(written[0], "rb") as f:
+            assert f.read() in {artifact.qr_code for artifact in artifacts} | {
+                artifact.config.encode() for artifact in artifacts
+            }
+    # configs carry private keys
+    assert {os.stat(name).st_mode & 0o777 for name in written} == {0o600}
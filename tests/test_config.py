@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from vpntools import config as config_module
+from vpntools.config import ConfigCache, load_config, parse_hostnames
+from vpntools.helpers import dict_to_yaml
+
+
+@pytest.fixture
+def vpn_yaml(tmp_path):
+    path = tmp_path / "vpn.yaml"
+    path.write_text(
+        dict_to_yaml({"a": {"description": "A"}, "b": {"description": "B"}})
+    )
+    return str(path)
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Number of yaml parses"""
+    count = [0]
+    yaml_to_dict = config_module.yaml_to_dict
+
+    def counting_yaml_to_dict(yaml_str):
+        count[0] += 1
+        return yaml_to_dict(yaml_str)
+
+    monkeypatch.setattr(config_module, "yaml_to_dict", counting_yaml_to_dict)
+    return count
+
+
+def test_config_cache_selected_hosts(vpn_yaml, tmp_path, parses):
+    cache = ConfigCache(str(tmp_path / "cache"))
+
+    assert cache.load(vpn_yaml) == {
+        "a": {"description": "A"},
+        "b": {"description": "B"},
+    }
+    assert cache.load(vpn_yaml, ["b"]) == {"b": {"description": "B"}}
+    assert parses[0] == 1
+    with pytest.raises(KeyError, match="c not found"):
+        cache.load(vpn_yaml, ["a", "c"])
+    (sidecar,) = os.listdir(tmp_path / "cache")
+    assert os.stat(tmp_path / "cache" / sidecar).st_mode & 0o777 == 0o600
+
+
+def test_config_cache_invalidation(vpn_yaml, tmp_path, parses):
+    cache = ConfigCache(str(tmp_path / "cache"))
+    cache.load(vpn_yaml)
+
+    # same content, new mtime: checked by hash, not parsed again
+    stat = os.stat(vpn_yaml)
+    os.utime(vpn_yaml, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.load(vpn_yaml, ["a"]) == {"a": {"description": "A"}}
+    assert parses[0] == 1
+
+    with open(vpn_yaml, "w", encoding="utf-8") as f:
+        f.write(dict_to_yaml({"a": {"description": "changed"}}))
+    os.utime(vpn_yaml, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+    assert cache.load(vpn_yaml) == {"a": {"description": "changed"}}
+    assert parses[0] == 2
+    assert cache.load(vpn_yaml) == {"a": {"description": "changed"}}
+    assert parses[0] == 2
+
+
+def test_config_cache_ignores_broken_sidecar(vpn_yaml, tmp_path, parses):
+    cache = ConfigCache(str(tmp_path / "cache"))
+    cache.load(vpn_yaml)
+    for name in os.listdir(tmp_path / "cache"):
+        (tmp_path / "cache" / name).write_bytes(b"not a pickle")
+    assert cache.load(vpn_yaml, ["a"]) == {"a": {"description": "A"}}
+    assert parses[0] == 2
+
+
+def test_load_config_without_cache(vpn_yaml):
+    assert load_config(vpn_yaml, ["a"], use_cache=False) == {"a": {"description": "A"}}
+    assert parse_hostnames(" a, ,b ") == ["a", "b"]
+    assert parse_hostnames("") is None
@@ -0,0 +1,70 @@
+import shutil
+import subprocess
+
+import pytest
+
+from vpntools.cmds import LINUX_COMMANDS
+from vpntools.deploy_cache import (
+    DeployStateCache,
+    config_hash,
+    get_deploy_versions,
+    interface_hash,
+    make_deploy_entry,
+)
+from vpntools.wireguard import WG_CONFIG_DIR, build_wg_server_cfg
+
+
+@pytest.fixture
+def wg_cfg_str(wg0, hostname):
+    return build_wg_server_cfg(wg0, hostname, "wg0")
+
+
+def test_config_hash_ignores_comments(wg_cfg_str):
+    assert config_hash(wg_cfg_str) == config_hash(f"# rendered again\n{wg_cfg_str}")
+    assert config_hash(wg_cfg_str) != config_hash(wg_cfg_str + "\n# x\nMTU = 1280\n")
+    assert interface_hash(wg_cfg_str) == interface_hash(
+        wg_cfg_str + "\n[Peer]\nPublicKey = x\n"
+    )
+
+
+@pytest.mark.skipif(
+    not shutil.which("sh") or not shutil.which("sha256sum"),
+    reason="needs sh and sha256sum",
+)
+def test_config_hash_matches_checksum_probe(wg_cfg_str, tmp_path):
+    (tmp_path / "wg0.conf").write_text(wg_cfg_str)
+    (tmp_path / "wg1.conf").write_text("[Interface]\n# comment\nListenPort = 1\n")
+    cmd_bundle = LINUX_COMMANDS["WG_CONFIG_CHECKSUMS"]
+    # the probe as run on a host, without sudo and against tmp_path
+    cmd = (
+        cmd_bundle["cmd"].replace("sudo ", "", 1).replace(WG_CONFIG_DIR, str(tmp_path))
+    )
+
+    stdout = subprocess.run(
+        cmd, shell=True, check=True, capture_output=True, text=True
+    ).stdout
+
+    assert cmd_bundle["parser"](stdout) == {
+        "wg0": config_hash(wg_cfg_str),
+        "wg1": config_hash("[Interface]\nListenPort = 1\n"),
+    }
+
+
+def test_deploy_state_cache(wg_cfg_str, tmp_path):
+    path = str(tmp_path / "state" / "deploy_state.json")
+    versions = get_deploy_versions()
+    entry = make_deploy_entry(wg_cfg_str, {"a": ["10.0.0.2/32"]}, versions)
+    deploy_state = DeployStateCache(path)
+    assert not deploy_state.is_unchanged("host", "wg0", entry)
+
+    deploy_state.set("host", "wg0", entry)
+    deploy_state.save()
+    reloaded = DeployStateCache(path)
+
+    assert reloaded.is_unchanged("host", "wg0", entry)
+    assert reloaded.get("host", "wg0")["peers"] == {"a": ["10.0.0.2/32"]}
+    assert list(reloaded.get_host("host")) == ["wg0"]
+    changed = make_deploy_entry(wg_cfg_str + "MTU = 1280\n", {}, versions)
+    assert not reloaded.is_unchanged("host", "wg0", changed)
+    outdated = {**entry, "script_version": "old"}
+    assert not reloaded.is_unchanged("host", "wg0", outdated)
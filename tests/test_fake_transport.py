@@ -0,0 +1,56 @@
+from vpntools.deploy_cache import config_hash
+from vpntools.fake_transport import RUNSCRIPT_RE
+from vpntools.helpers import dict_to_yaml
+from vpntools.workflow import ExecutionContext, Workflow
+
+
+DEPLOY_WF = {
+    "instructions": [
+        {"LOAD_CONFIG": {}},
+        {"CONNECT_HOSTS": {}},
+        {"DEPLOY_WIREGUARD": {}},
+    ]
+}
+
+
+def run_deploy(config, fake_pool, tmp_path):
+    vpn_yaml = tmp_path / "vpn.yaml"
+    vpn_yaml.write_text(dict_to_yaml(config))
+    args = {
+        "vpn_yaml": str(vpn_yaml),
+        "no_config_cache": True,
+        "state_file": str(tmp_path / "deploy_state.json"),
+    }
+    ctx = Workflow.from_dict(DEPLOY_WF).run(ExecutionContext(args, pool=fake_pool))
+    assert not ctx.errors
+
+
+def deployments(server):
+    """Scripts run on the fake server, one per deployment"""
+    return [cmd for cmd in server.history if RUNSCRIPT_RE.match(cmd)]
+
+
+def test_deploy_installs_configs(config, fake_pool, hostname, tmp_path, sftp_sessions):
+    server = fake_pool.servers[hostname]
+    run_deploy(config, fake_pool, tmp_path)
+
+    installed = server.files["/etc/wireguard/wg0.conf"].decode()
+    assert server.modes["/etc/wireguard/wg0.conf"] == 0o600
+    # configs and script are uploaded together
+    assert sftp_sessions == [hostname]
+    assert "[Interface]" in installed
+    assert server.config_checksums() == f"wg0 {config_hash(installed)}  -\n"
+    assert len(deployments(server)) == 1
+    # no leftovers of the run in the remote temporary directory
+    assert [path for path in server.files if path.startswith("/tmp/")] == []
+
+
+def test_deploy_skips_unchanged_hosts(config, fake_pool, hostname, tmp_path):
+    server = fake_pool.servers[hostname]
+    run_deploy(config, fake_pool, tmp_path)
+    run_deploy(config, fake_pool, tmp_path)
+    assert len(deployments(server)) == 1
+
+    server.files["/etc/wireguard/wg0.conf"] += b"MTU = 1280\n"
+    run_deploy(config, fake_pool, tmp_path)
+    assert len(deployments(server)) == 2
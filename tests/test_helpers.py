@@ -0,0 +1,17 @@
+import os
+
+from vpntools.helpers import write_private_file
+
+
+def test_write_private_file(tmp_path):
+    path = tmp_path / "private" / "key.conf"
+
+    write_private_file(str(path), "secret")
+    assert path.read_text() == "secret"
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.stat(path.parent).st_mode & 0o777 == 0o700
+
+    write_private_file(str(path), b"other", atomic=False)
+    assert path.read_bytes() == b"other"
+    # no temporary files left behind
+    assert os.listdir(path.parent) == ["key.conf"]
@@ -0,0 +1,111 @@
+import io
+
+import pytest
+
+from vpntools.cmds import LINUX_COMMANDS
+from vpntools.fake_transport import FakeSFTPFile
+from vpntools.host import Host, RemoteFile, split_batch_output
+from vpntools.result_cache import ResultCache
+
+
+MARKER = "__VPNTOOLS_test__"
+
+
+def test_split_batch_output():
+    stdout = (
+        f"{MARKER} WG_INTERFACES\nwg0 wg1\n\n{MARKER} 0\n"
+        f"{MARKER} GET_UPTIME\n\n{MARKER} 1\n"
+    )
+    assert split_batch_output(stdout, MARKER) == {
+        "WG_INTERFACES": (0, "wg0 wg1\n"),
+        "GET_UPTIME": (1, ""),
+    }
+
+
+def test_split_batch_output_keeps_marker_like_lines():
+    stdout = f"{MARKER} WG_INTERFACES\n{MARKER}x\nwg0\n\n{MARKER} 0"
+    assert split_batch_output(stdout, MARKER) == {
+        "WG_INTERFACES": (0, f"{MARKER}x\nwg0\n")
+    }
+
+
+def test_run_linux_cmds_single_round_trip(config, fake_pool, hostname):
+    host = Host(hostname, config[hostname], pool=fake_pool)
+    results = host.run_linux_cmds(["WG_INTERFACES", "WIREGUARD_SVC_STATUS"])
+
+    assert results == {
+        "WG_INTERFACES": ["wg0"],
+        "WIREGUARD_SVC_STATUS": {"wg0": "active"},
+    }
+    assert len(fake_pool.servers[hostname].history) == 1
+    assert results["WG_INTERFACES"] == host.run_linux_cmd("WG_INTERFACES")
+
+
+def test_run_linux_cmds_failed_command(config, fake_pool, hostname):
+    fake_pool.servers[hostname].set_response("GET_UPTIME", "", exit_code=1)
+    host = Host(hostname, config[hostname], pool=fake_pool)
+    with pytest.raises(RuntimeError, match="GET_UPTIME failed with exit code 1"):
+        host.run_linux_cmds(["WG_INTERFACES", "GET_UPTIME"])
+
+
+def test_run_linux_cmds_cached(config, fake_pool, hostname, tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite"))
+    host = Host(hostname, config[hostname], pool=fake_pool, result_cache=cache)
+    history = fake_pool.servers[hostname].history
+
+    first = host.run_linux_cmds(["WG_STATUS", "WG_CONFIG_CHECKSUMS"])
+    second = host.run_linux_cmds(["WG_STATUS", "WG_CONFIG_CHECKSUMS"])
+    cache.close()
+
+    assert first == second
+    assert len(history) == 2
+    # WG_CONFIG_CHECKSUMS has no ttl, it is the only command run again
+    assert LINUX_COMMANDS["WG_STATUS"]["cmd"] not in history[1]
+    assert LINUX_COMMANDS["WG_CONFIG_CHECKSUMS"]["cmd"] in history[1]
+
+
+def test_put_files_sets_mode_before_writing(
+    config, fake_pool, hostname, sftp_sessions, monkeypatch
+):
+    written = []
+    write = FakeSFTPFile.write
+
+    def recorded(sftp_file, data):
+        written.append(sftp_file.mode)
+        write(sftp_file, data)
+
+    monkeypatch.setattr(FakeSFTPFile, "write", recorded)
+    host = Host(hostname, config[hostname], pool=fake_pool)
+    host.put_files(
+        [
+            RemoteFile(host.tmp_path("wg0.conf"), "[Interface]\n"),
+            RemoteFile(host.tmp_path("run.sh"), b"true\n", 0o700),
+        ]
+    )
+
+    server = fake_pool.servers[hostname]
+    assert written == [0o600, 0o700]
+    assert server.modes == {
+        host.tmp_path("wg0.conf"): 0o600,
+        host.tmp_path("run.sh"): 0o700,
+    }
+    assert server.files[host.tmp_path("wg0.conf")] == b"[Interface]\n"
+    assert host.tmp_dir in server.dirs
+    assert sftp_sessions == [hostname]
+
+
+def test_run_uploaded_script(config, fake_pool, hostname, sftp_sessions):
+    host = Host(hostname, config[hostname], pool=fake_pool)
+    script = host.script_file(io.BytesIO(b"#!/bin/sh\n"))
+    assert script.mode == 0o700 and script.path.startswith(f"{host.tmp_dir}/")
+
+    host.put_files([script])
+    assert host.run_uploaded_script(script.path, root=True, args=["a b"]).ok
+
+    server = fake_pool.servers[hostname]
+    assert server.history[-1].startswith(
+        f"sudo su -c '{script.path} '\"'\"'a b'\"'\"'' root; rc=$?; rm -f"
+    )
+    # removed by the cleanup of the run
+    assert script.path not in server.files
+    assert sftp_sessions == [hostname]
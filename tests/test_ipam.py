@@ -0,0 +1,85 @@
+import ipaddress
+
+import pytest
+
+from vpntools.ipam import AddressError, AddressPool, allocate_peer_ips
+
+
+def get_peers(wg_if_dict):
+    return [peer_cfg for peer in wg_if_dict["peers"] for peer_cfg in peer.values()]
+
+
+def test_allocate_peer_ips_fills_free_addresses(config, wg0):
+    peers = get_peers(wg0)
+    del peers[0]["peer_private_ip"]
+    peers.append({"public_key": "new"})
+    wg0["peers"].append({"peer_new": peers[-1]})
+
+    assert allocate_peer_ips(config) == 2
+    # .1 is the server, .3 and .4 are taken
+    assert [peer["peer_private_ip"] for peer in peers] == [
+        "10.0.0.2/24",
+        "10.0.0.3/24",
+        "10.0.0.4/24",
+        "10.0.0.5/24",
+    ]
+    assert allocate_peer_ips(config) == 0
+
+
+@pytest.mark.parametrize(
+    "peer_ip,error",
+    [
+        ("10.0.1.2/24", "is outside of 10.0.0.0/24"),
+        ("10.0.0.1/24", "is already used by wg0/server"),
+        ("10.0.0.3/24", "peer_1 address 10.0.0.3/24 is already used by wg0/peer_0"),
+        ("10.0.0.255/24", "is reserved in 10.0.0.0/24"),
+        ("fd00::2/64", "is outside of 10.0.0.0/24"),
+    ],
+)
+def test_allocate_peer_ips_errors(config, wg0, peer_ip, error):
+    get_peers(wg0)[0]["peer_private_ip"] = peer_ip
+    with pytest.raises(AddressError, match=error):
+        allocate_peer_ips(config)
+
+
+def test_address_pool_exhausted():
+    pool = AddressPool(ipaddress.ip_network("10.0.0.0/30"))
+    assert [str(ipaddress.ip_address(pool.allocate())) for _ in range(2)] == [
+        "10.0.0.1",
+        "10.0.0.2",
+    ]
+    with pytest.raises(AddressError):
+        pool.allocate()
+
+
+def test_address_pool_large_ipv6_subnet():
+    network = ipaddress.ip_network("fd00::/64")
+    base = int(network.network_address)
+    pool = AddressPool(network)
+    assert pool.mark(base + 1)
+    assert not pool.mark(base + 1)
+    # fd00:: is the Subnet-Router anycast address
+    assert not pool.mark(base)
+    assert pool.allocate() == base + 2
+    assert pool.allocate() == base + 3
+
+
+def test_address_pool_point_to_point():
+    assert AddressPool(ipaddress.ip_network("10.0.0.0/31")).allocate() == int(
+        ipaddress.ip_address("10.0.0.0")
+    )
+    pool = AddressPool(ipaddress.ip_network("fd00::/127"))
+    assert pool.allocate() == int(ipaddress.ip_address("fd00::"))
+
+
+def test_allocate_peer_ips_ipv6(config, wg0):
+    wg0["server_private_ip"] = "fd00::1/64"
+    for peer_cfg in get_peers(wg0):
+        del peer_cfg["peer_private_ip"]
+
+    assert allocate_peer_ips(config) == 3
+    assert [peer["peer_private_ip"] for peer in get_peers(wg0)] == [
+        "fd00::2/64",
+        "fd00::3/64",
+        "fd00::4/64",
+    ]
@@ -0,0 +1,81 @@
+import base64
+
+import pytest
+
+from vpntools import keygen
+from vpntools.helpers import dict_to_yaml, yaml_to_dict
+from vpntools.keygen import derive_public_key, fill_missing_keys, generate_keypairs
+from vpntools.workflow import ExecutionContext, Workflow
+
+
+def test_generate_keypairs():
+    keypairs = generate_keypairs(3, processes=1)
+    assert len({private_key for private_key, _ in keypairs}) == 3
+    for private_key, public_key in keypairs:
+        raw_key = base64.b64decode(private_key)
+        assert len(raw_key) == 32
+        assert raw_key[0] & 7 == 0 and raw_key[31] & 192 == 64
+        assert derive_public_key(private_key) == public_key
+
+
+def test_fill_missing_keys(config, wg0):
+    missing, derived, public_only = (
+        peer_cfg for peer in wg0["peers"] for peer_cfg in peer.values()
+    )
+    del missing["private_key"], missing["public_key"]
+    expected_public_key = derived.pop("public_key")
+    del public_only["private_key"]
+
+    assert fill_missing_keys(config) == 1
+    assert derive_public_key(missing["private_key"]) == missing["public_key"]
+    assert derived["public_key"] == expected_public_key
+    assert "private_key" not in public_only
+    assert fill_missing_keys(config) == 0
+
+
+def test_generate_keypairs_single_cpu_in_process(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("process pool started")
+
+    monkeypatch.setattr(keygen, "ProcessPoolExecutor", no_pool)
+    monkeypatch.setattr(keygen, "MIN_PARALLEL_KEYS", 1)
+    monkeypatch.setattr(keygen.os, "cpu_count", lambda: 1)
+    assert len(generate_keypairs(4)) == 4
+    assert len(generate_keypairs(4, processes=1)) == 4
+
+
+def test_fill_missing_keys_server(config, wg0):
+    del wg0["private_key"], wg0["public_key"]
+    assert fill_missing_keys(config) == 1
+    assert derive_public_key(wg0["private_key"]) == wg0["public_key"]
+
+
+@pytest.mark.parametrize("write_config", [False, True])
+def test_deploy_refuses_unsaved_keys(config, wg0, fake_pool, tmp_path, write_config):
+    del wg0["private_key"], wg0["public_key"]
+    vpn_yaml = tmp_path / "vpn.yaml"
+    vpn_yaml.write_text(dict_to_yaml(config))
+    args = {
+        "vpn_yaml": str(vpn_yaml),
+        "no_config_cache": True,
+        "state_file": str(tmp_path / "deploy_state.json"),
+        "write_config": write_config,
+    }
+    workflow = Workflow.from_dict(
+        {
+            "instructions": [
+                {"LOAD_CONFIG": {}},
+                {"CONNECT_HOSTS": {}},
+                {"DEPLOY_WIREGUARD": {}},
+            ]
+        }
+    )
+
+    if not write_config:
+        with pytest.raises(RuntimeError, match="generated but not saved"):
+            workflow.run(ExecutionContext(args, pool=fake_pool))
+        return
+    workflow.run(ExecutionContext(args, pool=fake_pool))
+    saved = yaml_to_dict(vpn_yaml.read_text())
+    (host_cfg,) = saved.values()
+    assert host_cfg["app_config"]["wireguard"]["wg0"]["private_key"]
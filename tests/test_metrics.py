@@ -0,0 +1,89 @@
+import urllib.request
+
+from vpntools import workflow
+from vpntools.metrics import CONTENT_TYPE, MetricsServer, MetricsText, format_value
+from vpntools.workflow import ExecutionContext, Workflow
+
+
+def test_metrics_text_groups_samples():
+    metrics = MetricsText()
+    metrics.add("up", "gauge", "Host is up", 1, host="a")
+    metrics.add("rx_total", "counter", "Bytes received", 2.5, host="a")
+    metrics.add("up", "gauge", "Host is up", 0, host='b"\\\n')
+    metrics.add("duration", "gauge", "Duration", float("nan"))
+
+    assert metrics.render() == (
+        "# HELP up Host is up\n"
+        "# TYPE up gauge\n"
+        'up{host="a"} 1\n'
+        'up{host="b\\"\\\\\\n"} 0\n'
+        "# HELP rx_total Bytes received\n"
+        "# TYPE rx_total counter\n"
+        'rx_total{host="a"} 2.5\n'
+        "# HELP duration Duration\n"
+        "# TYPE duration gauge\n"
+        "duration NaN\n"
+    )
+
+
+def test_format_value():
+    assert format_value(3) == "3"
+    assert format_value(3.0) == "3"
+    assert format_value(0.25) == "0.25"
+
+
+def test_metrics_server():
+    server = MetricsServer(lambda: b"up 1\n", port=0)
+    server.start()
+    try:
+        url = "http://%s:%d" % server.address
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            assert response.read() == b"up 1\n"
+        try:
+            urllib.request.urlopen(f"{url}/other")
+        except urllib.error.HTTPError as err:
+            assert err.code == 404
+        else:
+            raise AssertionError("expected a 404")
+    finally:
+        server.close()
+
+
+class FakeMetricsServer:
+    def __init__(self, get_payload, listen, port):
+        self.get_payload = get_payload
+        FakeMetricsServer.last = self
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_serve_metrics_retries_failed_hosts(config, flaky_pool, hostname, monkeypatch):
+    polls = []
+    real_sleep = workflow.time.sleep
+
+    def sleep(seconds):
+        # the fake transport sleeps too, only the poll interval counts: one
+        # more poll, then stop
+        if seconds != 60:
+            return real_sleep(seconds)
+        if polls:
+            raise KeyboardInterrupt
+        polls.append(seconds)
+        return None
+
+    monkeypatch.setattr(workflow, "MetricsServer", FakeMetricsServer)
+    monkeypatch.setattr(workflow.time, "sleep", sleep)
+    ctx = ExecutionContext({}, pool=flaky_pool)
+    ctx.config = config
+    Workflow.from_dict({"instructions": [{"SERVE_METRICS": {"interval": 60}}]}).run(ctx)
+
+    payload = FakeMetricsServer.last.get_payload().decode()
+    # the first poll could not connect, the second one did
+    assert f'vpntools_host_up{{host="{hostname}"}} 1' in payload
+    assert f'vpntools_host_errors_total{{host="{hostname}"}} 1' in payload
+    assert f'host="{hostname}",interface="wg0",peer="peer_0"' in payload
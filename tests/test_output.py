@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+
+import pytest
+
+from vpntools.output import PLAN_FIELDS, get_record_writer
+from vpntools.workflow import ExecutionContext, Workflow
+
+
+HOST_RECORD = {
+    "type": "host",
+    "hostname": "vpn0",
+    "uptime_seconds": 60,
+    "interfaces": {"wg0": "active"},
+}
+PEER_RECORD = {
+    "type": "peer",
+    "hostname": "vpn0",
+    "interface": "wg0",
+    "peer": "laptop",
+    "allowed_ips": ["10.0.0.2/32", "fd00::2/128"],
+    "transfer_rx": 10,
+}
+
+
+def write_records(output_format, **kwargs):
+    stream = io.StringIO()
+    writer = get_record_writer(output_format, stream, **kwargs)
+    writer.write(HOST_RECORD)
+    writer.write(PEER_RECORD)
+    writer.close()
+    return stream.getvalue()
+
+
+def test_json_writer():
+    document = json.loads(write_records("json"))
+    assert document == {
+        "hosts": [{key: val for key, val in HOST_RECORD.items() if key != "type"}],
+        "peers": [{key: val for key, val in PEER_RECORD.items() if key != "type"}],
+    }
+    # records passed in are not modified
+    assert HOST_RECORD["type"] == "host"
+
+
+def test_ndjson_writer():
+    lines = write_records("ndjson").splitlines()
+    assert [json.loads(line) for line in lines] == [HOST_RECORD, PEER_RECORD]
+
+
+def test_csv_writer():
+    rows = list(csv.DictReader(io.StringIO(write_records("csv"))))
+    assert rows[0]["interfaces"] == "wg0=active"
+    assert rows[0]["peer"] == ""
+    assert rows[1]["allowed_ips"] == "10.0.0.2/32 fd00::2/128"
+    assert rows[1]["transfer_rx"] == "10"
+
+
+def test_csv_writer_fields():
+    output = write_records("csv", fields=PLAN_FIELDS)
+    assert output.splitlines()[0] == ",".join(PLAN_FIELDS)
+
+
+def test_unknown_format():
+    with pytest.raises(KeyError):
+        get_record_writer("xml")
+
+
+def test_status_ndjson(config, fake_pool, hostname, capsys):
+    ctx = ExecutionContext({"format": "ndjson"}, pool=fake_pool)
+    ctx.config = config
+    Workflow.from_dict(
+        {"instructions": [{"CONNECT_HOSTS": {}}, {"GET_WIREGUARD_STATUS": {}}]}
+    ).run(ctx)
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [record["type"] for record in records] == ["host"] + ["peer"] * 3
+    assert {record["hostname"] for record in records} == {hostname}
+    assert [record["peer"] for record in records[1:]] == [
+        "peer_0",
+        "peer_1",
+        "peer_2",
+    ]
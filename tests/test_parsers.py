@@ -0,0 +1,61 @@
+import pytest
+
+from vpntools.parsers import parse_wg_dump, parse_wg_units
+
+
+WG_DUMP = (
+    "wg0\tc2VydmVyIHByaXZhdGU=\tc2VydmVy\t52101\toff\n"
+    "wg0\tcGVlcjA=\t(none)\t203.0.113.1:1024\t10.0.0.2/32\t1700000000\t10\t20\t25\n"
+    "wg0\tcGVlcjE=\t(none)\t(none)\t(none)\t0\t0\t0\toff\n"
+    "wg1\tcGVlcjA=\tcHNr\t(none)\t10.1.0.2/32,fd00::2/128\t0\t0\t0\toff\n"
+)
+
+
+def test_parse_wg_dump():
+    records = parse_wg_dump(WG_DUMP)
+
+    assert set(records) == {
+        ("wg0", "cGVlcjA="),
+        ("wg0", "cGVlcjE="),
+        ("wg1", "cGVlcjA="),
+    }
+    peer = records[("wg0", "cGVlcjA=")]
+    assert peer.endpoint == "203.0.113.1:1024"
+    assert peer.allowed_ips == ["10.0.0.2/32"]
+    assert (peer.latest_handshake, peer.transfer_rx, peer.transfer_tx) == (
+        1700000000,
+        10,
+        20,
+    )
+    assert peer.persistent_keepalive == 25
+    idle = records[("wg0", "cGVlcjE=")]
+    assert idle.endpoint is None and idle.preshared_key is None
+    assert idle.allowed_ips == [] and idle.persistent_keepalive is None
+    assert records[("wg1", "cGVlcjA=")].allowed_ips == ["10.1.0.2/32", "fd00::2/128"]
+
+
+def test_parse_wg_dump_single_interface():
+    text = "".join(
+        line.split("\t", 1)[1] + "\n"
+        for line in WG_DUMP.splitlines()
+        if line.startswith("wg0")
+    )
+    assert parse_wg_dump(text, "wg0") == {
+        key: record for key, record in parse_wg_dump(WG_DUMP).items() if key[0] == "wg0"
+    }
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("", {}),
+        (
+            "wg-quick@wg0.service loaded active exited WireGuard via wg-quick(8)\n"
+            "wg-quick@wg1.service loaded failed failed WireGuard via wg-quick(8)\n"
+            "other.service loaded active running Other\n",
+            {"wg0": "active", "wg1": "failed"},
+        ),
+    ],
+)
+def test_parse_wg_units(text, expected):
+    assert parse_wg_units(text) == expected
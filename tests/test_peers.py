@@ -0,0 +1,60 @@
+from vpntools.host import Host
+from vpntools.parsers import parse_wg_dump
+from vpntools.peers import PeerRegistry
+from vpntools.wireguard import WireguardServer, get_wg_from_host_cfg
+
+
+WG_APP_CONFIG = {
+    "wg0": {
+        "peers": [
+            {"laptop": {"public_key": "a", "peer_private_ip": "10.0.0.2/24"}},
+            {"phone": {"public_key": "b"}},
+        ]
+    },
+    "wg1": {
+        "peers": [{"laptop": {"public_key": "a", "peer_private_ip": "10.1.0.2/24"}}]
+    },
+}
+
+
+def test_peer_registry_lookups():
+    registry = PeerRegistry.from_wg_config("host", WG_APP_CONFIG)
+
+    assert len(registry) == 3
+    assert [peer.name for peer in registry.by_interface("wg0")] == ["laptop", "phone"]
+    assert list(registry.by_interface("wg9")) == []
+    assert registry.by_public_key("a").wg_if_name == "wg0"
+    assert registry.by_public_key("a", "wg1").private_ip == "10.1.0.2"
+    assert registry.by_public_key("b", "wg1") is None
+    assert registry.by_name("phone").private_ip is None
+    assert registry.by_ip("10.1.0.2/24").wg_if_name == "wg1"
+    assert (
+        registry.by_ip("10.0.0.2").config is WG_APP_CONFIG["wg0"]["peers"][0]["laptop"]
+    )
+    assert registry.by_ip("10.0.0.9") is None
+
+
+def test_peer_registry_duplicate_names_warn(caplog):
+    PeerRegistry.from_wg_config("host", WG_APP_CONFIG)
+    assert "peer name laptop is used more than once" in caplog.text
+
+
+def test_get_peer_stats_maps_names(config, hostname, fake_pool):
+    host = Host(hostname, config[hostname], pool=fake_pool)
+    wg_srv = WireguardServer(host, get_wg_from_host_cfg(config[hostname]))
+    wg_status = parse_wg_dump(
+        "wg0\t"
+        + "\t".join(["unknown-key", "(none)", "(none)", "(none)"])
+        + "\t0\t0\t0\toff\n"
+    )
+
+    stats = wg_srv.get_peer_stats()
+    assert sorted(stats.peers["wg0"]) == ["peer_0", "peer_1", "peer_2"]
+    assert stats.unknown_peers == {}
+
+    stats = wg_srv.get_peer_stats(wg_status, {"wg1": "active"})
+    assert list(stats.unknown_peers["wg0"]) == ["unknown-key"]
+    assert stats.interfaces == {"wg0": "missing"}
+    assert [name for name, _ in stats.iter_peers()] == [None]
+    assert list(stats.filter_peers(["unknown-key"]).iter_peers())
+    assert not list(stats.filter_peers(["peer_0"]).iter_peers())
@@ -0,0 +1,159 @@
+import pytest
+
+from vpntools import plan
+from vpntools.deploy_cache import (
+    DeployStateCache,
+    get_deploy_versions,
+    make_deploy_entry,
+)
+from vpntools.helpers import dict_to_yaml
+from vpntools.plan import (
+    SFTP_FILE_ROUND_TRIPS,
+    HostPlan,
+    InterfacePlan,
+    plan_host,
+    render_server_configs,
+)
+from vpntools.wireguard import build_peer_registries, get_desired_peers
+from vpntools.workflow import ExecutionContext, Workflow
+
+
+@pytest.fixture
+def planned(config, hostname, tmp_path):
+    """(rendered wg configs, peers, deploy state, versions) of the config fixture"""
+    rendered, errors = render_server_configs(config)
+    assert not errors
+    peers = build_peer_registries(config)[hostname]
+    deploy_state = DeployStateCache(str(tmp_path / "deploy_state.json"))
+    return rendered[hostname], peers, deploy_state, get_deploy_versions()
+
+
+def record_deploy(hostname, wg_cfgs, peers, deploy_state, versions):
+    for wg_if_name, wg_cfg_str in wg_cfgs.items():
+        deploy_state.set(
+            hostname,
+            wg_if_name,
+            make_deploy_entry(
+                wg_cfg_str,
+                get_desired_peers(peers.by_interface(wg_if_name)),
+                versions,
+            ),
+        )
+
+
+def test_plan_host_new_interface(planned, hostname):
+    host_plan = plan_host(hostname, *planned)
+    (if_plan,) = host_plan.interfaces
+    assert (if_plan.wg_if_name, if_plan.action) == ("wg0", "create")
+    assert len(if_plan.peers.add) == 3
+    assert host_plan.changed and not host_plan.syncable
+
+
+def test_plan_host_unchanged(planned, hostname):
+    record_deploy(hostname, *planned)
+    host_plan = plan_host(hostname, *planned)
+    assert [if_plan.action for if_plan in host_plan.interfaces] == ["unchanged"]
+    assert not host_plan.changed
+
+
+def test_plan_host_peer_changes(config, planned, hostname):
+    wg_cfgs, peers, deploy_state, versions = planned
+    record_deploy(hostname, *planned)
+    wg0 = config[hostname]["app_config"]["wireguard"]["wg0"]
+    wg0["peers"].pop()
+    rendered, _ = render_server_configs(config)
+
+    host_plan = plan_host(
+        hostname,
+        rendered[hostname],
+        build_peer_registries(config)[hostname],
+        deploy_state,
+        versions,
+    )
+    (if_plan,) = host_plan.interfaces
+    assert (if_plan.action, if_plan.reason) == ("update", "peers")
+    assert str(if_plan.peers) == "+0 ~0 -1"
+    assert host_plan.syncable
+
+
+def test_plan_host_script_and_removed_interfaces(planned, hostname):
+    wg_cfgs, peers, deploy_state, versions = planned
+    record_deploy(hostname, {**wg_cfgs, "wg1": "[Interface]\n"}, *planned[1:])
+
+    host_plan = plan_host(
+        hostname, wg_cfgs, peers, deploy_state, {**versions, "script_version": "new"}
+    )
+    assert [
+        (if_plan.wg_if_name, if_plan.action, if_plan.reason)
+        for if_plan in host_plan.interfaces
+    ] == [
+        ("wg0", "update", "deploy script"),
+        ("wg1", "remove", "not declared, left running"),
+    ]
+
+
+def test_estimate_cost():
+    host_plan = HostPlan(
+        "host",
+        [
+            InterfacePlan("wg0", "update", "peers", config_size=100),
+            InterfacePlan("wg1", "create", config_size=50),
+            InterfacePlan("wg2", "remove"),
+        ],
+    )
+    unchanged = HostPlan("host", [InterfacePlan("wg0", "unchanged")])
+
+    cost = host_plan.estimate_cost(script_size=10, rtt=0.1)
+    base = unchanged.estimate_cost(script_size=10, rtt=0.1)
+    assert cost["restarts"] == ["wg-quick@wg0", "wg-quick@wg1"]
+    assert cost["upload_bytes"] == 160
+    assert base["upload_bytes"] == 0 and base["restarts"] == []
+    # one SFTP session with both configs and the script
+    assert (
+        cost["round_trips"]
+        == base["round_trips"]
+        + plan.SFTP_SESSION_ROUND_TRIPS
+        + 3 * SFTP_FILE_ROUND_TRIPS
+    )
+    assert cost["estimated_seconds"] == round(cost["round_trips"] * 0.1, 3)
+
+
+def test_render_server_configs_serial_below_threshold(config, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("small fleets render in-process")
+
+    monkeypatch.setattr(plan, "ProcessPoolExecutor", no_pool)
+    config = {
+        f"host{idx}": host_cfg for idx, host_cfg in enumerate([*config.values()] * 4)
+    }
+    rendered, errors = render_server_configs(config, processes=4)
+    assert list(rendered) == list(config) and not errors
+
+    # above the threshold, but a single process
+    monkeypatch.setattr(plan, "MIN_PARALLEL_SERVER_PEERS", 0)
+    rendered, errors = render_server_configs(config, processes=1)
+    assert len(rendered) == 4
+
+
+def test_render_server_configs_errors(config, hostname):
+    broken = {"broken": {"app_config": {"wireguard": {"wg0": {}}}}}
+    rendered, errors = render_server_configs({**config, **broken})
+    assert list(rendered) == [hostname]
+    assert list(errors) == ["broken"]
+
+
+def test_plan_warns_about_unsaved_keys(config, wg0, hostname, tmp_path, caplog, capsys):
+    del wg0["private_key"], wg0["public_key"]
+    vpn_yaml = tmp_path / "vpn.yaml"
+    vpn_yaml.write_text(dict_to_yaml(config))
+    args = {
+        "vpn_yaml": str(vpn_yaml),
+        "no_config_cache": True,
+        "state_file": str(tmp_path / "deploy_state.json"),
+    }
+    Workflow.from_dict(
+        {"instructions": [{"LOAD_CONFIG": {}}, {"PLAN_WIREGUARD": {}}]}
+    ).run(ExecutionContext(args))
+
+    assert "1 Wireguard key pair(s) were generated for this run only" in caplog.text
+    assert hostname in capsys.readouterr().out
@@ -0,0 +1,86 @@
+import socket
+
+import pytest
+
+from vpntools import resolver
+from vpntools.clients import get_server_endpoint
+from vpntools.resolver import RESOLVER, Resolver, format_endpoint
+
+
+ADDR_INFOS = {
+    "dual.example.net": [
+        (socket.AF_INET6, socket.SOCK_DGRAM, 17, "", ("2001:db8::1", 0, 0, 0)),
+        (socket.AF_INET, socket.SOCK_DGRAM, 17, "", ("192.0.2.1", 0)),
+    ],
+    "v6.example.net": [
+        (socket.AF_INET6, socket.SOCK_DGRAM, 17, "", ("2001:db8::2", 0, 0, 0)),
+    ],
+}
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Hostnames passed to getaddrinfo, in call order"""
+    calls = []
+
+    def getaddrinfo(hostname, *args, **kwargs):
+        calls.append(hostname)
+        if hostname not in ADDR_INFOS:
+            raise socket.gaierror(f"unknown host {hostname}")
+        return list(ADDR_INFOS[hostname])
+
+    monkeypatch.setattr(resolver.socket, "getaddrinfo", getaddrinfo)
+    yield calls
+    RESOLVER.clear()
+
+
+def test_resolve_prefers_ipv4_falls_back_to_ipv6(lookups):
+    dns = Resolver()
+    assert dns.resolve("dual.example.net") == "192.0.2.1"
+    assert dns.resolve("v6.example.net") == "2001:db8::2"
+    assert dns.resolve("dual.example.net", prefer_ipv6=True) == "2001:db8::1"
+    assert Resolver(prefer_ipv6=True).resolve("dual.example.net") == "2001:db8::1"
+    assert dns.resolve("192.0.2.7") == "192.0.2.7"
+    assert "192.0.2.7" not in lookups
+
+
+def test_resolve_ttl(lookups, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resolver.time, "monotonic", lambda: now[0])
+    dns = Resolver(ttl=30)
+
+    dns.resolve("dual.example.net")
+    now[0] += 29
+    dns.resolve("dual.example.net")
+    assert lookups == ["dual.example.net"]
+    # the other preference is a separate entry
+    dns.resolve("dual.example.net", prefer_ipv6=True)
+    now[0] += 2
+    dns.resolve("dual.example.net")
+    assert lookups == ["dual.example.net"] * 3
+
+    dns.clear()
+    dns.resolve("dual.example.net")
+    assert len(lookups) == 4
+
+
+def test_prefetch_logs_failures(lookups, caplog):
+    dns = Resolver()
+    dns.prefetch(["dual.example.net", "missing.example.net", "192.0.2.7"])
+    assert sorted(lookups) == ["dual.example.net", "missing.example.net"]
+    assert "Failed to resolve missing.example.net" in caplog.text
+
+    dns.resolve("dual.example.net")
+    assert len(lookups) == 2
+    with pytest.raises(socket.gaierror):
+        dns.resolve("missing.example.net")
+
+
+def test_server_endpoint_prefer_ipv6(lookups):
+    assert get_server_endpoint("dual.example.net", {}, {}) == "192.0.2.1"
+    assert get_server_endpoint("dual.example.net", {}, {}, True) == "2001:db8::1"
+    host_cfg = {"prefer_ipv6": True}
+    assert get_server_endpoint("dual.example.net", host_cfg, {}) == "2001:db8::1"
+    host_cfg["endpoint"] = "vpn.example.net"
+    assert get_server_endpoint("dual.example.net", host_cfg, {}) == "vpn.example.net"
+    assert format_endpoint("2001:db8::1", 51820) == "[2001:db8::1]:51820"
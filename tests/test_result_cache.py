@@ -0,0 +1,87 @@
+import pytest
+
+from vpntools import result_cache
+from vpntools.cmds import LINUX_COMMANDS
+from vpntools.parsers import parse_wg_dump, redact_wg_dump
+from vpntools.result_cache import ResultCache, get_max_age
+from vpntools.workflow import ExecutionContext, Workflow
+
+WG_DUMP = (
+    "wg0\tPRIVATE=\tPUBLIC=\t52101\toff\n"
+    "wg0\tpeer_a=\t(none)\t203.0.113.7:4500\t10.0.0.2/32\t1650000000\t10\t20\toff\n"
+    "wg0\tpeer_b=\tPSK=\t(none)\t10.0.0.3/32\t0\t0\t0\t25\n"
+)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_get_max_age():
+    assert get_max_age("WG_STATUS") == LINUX_COMMANDS["WG_STATUS"]["ttl"]
+    assert get_max_age("WG_STATUS", 60) == 60
+    # commands without a ttl are never cached
+    assert get_max_age("WG_CONFIG_CHECKSUMS") == 0
+    assert get_max_age("WG_CONFIG_CHECKSUMS", 60) == 0
+
+
+def test_result_cache_ttl(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    cache.set("host", "wg show all dump", "dump")
+
+    now[0] += 10
+    assert cache.get("host", "wg show all dump", 10) == "dump"
+    assert cache.get("other", "wg show all dump", 10) is None
+    now[0] += 0.5
+    assert cache.get("host", "wg show all dump", 10) is None
+    assert cache.get("host", "wg show all dump", 0) is None
+
+    cache.set("host", "wg show all dump", "newer")
+    assert cache.get("host", "wg show all dump", 10) == "newer"
+
+
+def test_result_cache_private_and_shared(tmp_path, cache):
+    cache.set("host", "uptime -s", "2024-01-01 00:00:00")
+    assert (tmp_path / "results.sqlite").stat().st_mode & 0o777 == 0o600
+    other = ResultCache(str(tmp_path / "results.sqlite"))
+    assert other.get("host", "uptime -s", 3600) == "2024-01-01 00:00:00"
+    other.close()
+
+
+def test_redact_wg_dump():
+    redacted = redact_wg_dump(WG_DUMP)
+    assert "PRIVATE=" not in redacted and "PSK=" not in redacted
+    assert redacted.count("\n") == 2
+
+    records = parse_wg_dump(WG_DUMP)
+    redacted_records = parse_wg_dump(redacted)
+    assert redacted_records[("wg0", "peer_a=")] == records[("wg0", "peer_a=")]
+    assert redacted_records[("wg0", "peer_b=")].preshared_key == "(hidden)"
+    assert redact_wg_dump(redacted) == redacted
+
+
+def test_status_caches_no_private_keys(config, fake_pool, hostname, wg0, tmp_path):
+    db = tmp_path / "results.sqlite"
+    ctx = ExecutionContext({"result_cache_db": str(db)}, pool=fake_pool)
+    ctx.config = config
+    workflow = Workflow.from_dict(
+        {
+            "instructions": [
+                {"CONNECT_HOSTS": {"result_cache": True}},
+                {"GET_WIREGUARD_STATUS": {"format": "ndjson"}},
+            ]
+        }
+    )
+    workflow.run(ctx)
+
+    # closed with the run
+    assert ctx.result_cache is None
+    cache = ResultCache(str(db))
+    dump = cache.get(hostname, LINUX_COMMANDS["WG_STATUS"]["cmd"], 3600)
+    cache.close()
+    assert wg0["peers"][0]["peer_0"]["public_key"] in dump
+    assert wg0["private_key"] not in dump
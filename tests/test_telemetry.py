@@ -0,0 +1,78 @@
+from vpntools.parsers import WgPeerRecord
+from vpntools.telemetry import PeerSample, RateTracker, TelemetryStore
+from vpntools.workflow import ExecutionContext, Workflow
+
+
+def make_record(rx: int, tx: int) -> WgPeerRecord:
+    return WgPeerRecord("wg0", "key", None, None, [], 0, rx, tx, None)
+
+
+def make_sample(ts: int, rx_rate: float) -> PeerSample:
+    return PeerSample(ts, "host", "wg0", "laptop", ts, ts, rx_rate, rx_rate, ts)
+
+
+def test_rate_tracker():
+    rates = RateTracker()
+    assert rates.sample(100, "host", "laptop", make_record(1000, 10)).rx_rate is None
+
+    sample = rates.sample(110, "host", "laptop", make_record(3000, 110))
+    assert (sample.rx_rate, sample.tx_rate) == (200, 10)
+    # counters restarted with the interface
+    sample = rates.sample(120, "host", "laptop", make_record(500, 20))
+    assert (sample.rx_rate, sample.tx_rate) == (50, 2)
+
+
+def test_compact_rolls_up_old_samples(tmp_path):
+    store = TelemetryStore(
+        str(tmp_path / "telemetry.sqlite"),
+        retention=1000,
+        raw_retention=100,
+        rollup_interval=100,
+    )
+    store.add_samples(make_sample(ts, ts / 10) for ts in range(0, 200, 10))
+    store.compact(now=215)
+
+    samples = store.get_samples("host", "laptop")
+    # 0..99 is one complete bucket older than raw_retention, the rest stays raw
+    assert samples[0] == (0, 90, 90, 4.5, 4.5)
+    assert [sample[0] for sample in samples[1:]] == list(range(100, 200, 10))
+    assert store.get_samples("host", "laptop", since=150)[0][0] == 150
+    assert store.get_samples("host", "phone") == []
+    store.close()
+
+
+def test_compact_drops_expired_rollups(tmp_path):
+    store = TelemetryStore(
+        str(tmp_path / "telemetry.sqlite"),
+        retention=1000,
+        raw_retention=100,
+        rollup_interval=100,
+    )
+    store.add_samples(make_sample(ts, 1.0) for ts in range(0, 200, 10))
+    store.compact(now=500)
+    assert [sample[0] for sample in store.get_samples("host", "laptop")] == [0, 100]
+
+    store.compact(now=1050)
+    assert [sample[0] for sample in store.get_samples("host", "laptop")] == [100]
+    store.close()
+
+
+def test_monitor_retries_failed_hosts(config, flaky_pool, hostname, tmp_path):
+    db = str(tmp_path / "telemetry.sqlite")
+    workflow = Workflow.from_dict(
+        {
+            "instructions": [
+                {"CONNECT_HOSTS": {}},
+                {"MONITOR_WIREGUARD": {"count": 1, "db": db}},
+            ]
+        }
+    )
+    ctx = ExecutionContext({}, pool=flaky_pool)
+    ctx.config = config
+    ctx = workflow.run(ctx)
+
+    # CONNECT_HOSTS failed, the poll connected
+    assert list(ctx.errors) == [hostname]
+    store = TelemetryStore(db)
+    assert len(store.get_samples(hostname, "peer_0")) == 1
+    store.close()
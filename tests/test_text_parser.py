@@ -0,0 +1,90 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from vpntools.parsers import TextParser
+
+
+WG_SHOW_PATTERNS = [
+    r"interface: (?P<if_name>.*)",
+    r"peer: (?P<pub_key>.*)",
+    r"(?P<key>.*?):(?P<value>.*)",
+]
+
+WG_SHOW_TEXT = """\
+interface: wg0
+  public key: c2VydmVyMA==
+  listening port: 52101
+
+peer: cGVlcjA=
+  endpoint: 203.0.113.1:1024
+  allowed ips: 10.0.0.2/32
+  latest handshake: 1 minute, 2 seconds ago
+
+peer: cGVlcjE=
+  allowed ips: 10.0.0.3/32
+interface: wg1
+  public key: c2VydmVyMQ==
+  listening port: 52102
+
+peer: cGVlcjA=
+  allowed ips: 10.1.0.2/32
+"""
+
+
+def parse_per_pattern(regexp_lst: List[str], text: str) -> Dict[Any, Any]:
+    """Reference parser: every pattern matched in turn with re.match"""
+    root: Dict[Any, Any] = {}
+    stack: List[Dict[Any, Any]] = [root]
+    cur_obj = root
+    last_idx = len(regexp_lst) - 1
+    for line in text.splitlines():
+        line = line.strip()
+        match: Optional[re.Match] = None
+        for idx, pattern in enumerate(regexp_lst):
+            match = re.match(pattern, line)
+            if match:
+                break
+        if not line or not match:
+            continue
+        if idx == last_idx:
+            if len(stack) == last_idx and stack[-1]:
+                cur_obj[match.group(1).strip()] = match.group(2).strip()
+            continue
+        key = match.group(1).strip()
+        if idx > len(stack) - 1:
+            cur_obj[key] = {}
+            stack.append(cur_obj)
+        else:
+            del stack[idx + 1 :]
+            stack[-1].setdefault(key, {})
+        cur_obj = stack[-1][key]
+    return root
+
+
+def test_text_parser_matches_per_pattern_parsing():
+    expected = parse_per_pattern(WG_SHOW_PATTERNS, WG_SHOW_TEXT)
+    assert TextParser(WG_SHOW_PATTERNS).parse_text(WG_SHOW_TEXT) == expected
+    assert expected["wg0"]["cGVlcjA="]["allowed ips"] == "10.0.0.2/32"
+    assert expected["wg1"]["cGVlcjA="] == {"allowed ips": "10.1.0.2/32"}
+
+
+def test_text_parser_lines_and_reuse():
+    parser = TextParser(WG_SHOW_PATTERNS)
+    first = parser.parse_lines(iter(WG_SHOW_TEXT.splitlines()))
+    assert parser.parse_text(WG_SHOW_TEXT) == first
+
+
+def test_text_parser_line_parser_gets_original_groups():
+    seen = []
+
+    def line_parser(match):
+        seen.append((match.group(1), match["value"], match.groupdict()))
+        return match.group("key").strip().upper(), match.group(2).strip()
+
+    result = TextParser(WG_SHOW_PATTERNS, line_parser=line_parser).parse_text(
+        WG_SHOW_TEXT
+    )
+    assert result["wg0"]["cGVlcjE="] == {"ALLOWED IPS": "10.0.0.3/32"}
+    key, value, groups = seen[0]
+    assert (key, value) == ("endpoint", " 203.0.113.1:1024")
+    assert groups == {"key": "endpoint", "value": " 203.0.113.1:1024"}
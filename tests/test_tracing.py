@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from vpntools.tracing import TRACER, Tracer
+from vpntools.workflow import ExecutionContext, Workflow
+
+
+def make_tracer():
+    tracer = Tracer()
+    tracer.enable()
+    with tracer.span("run", "ssh", hostname="a", command="uptime") as span:
+        span.bytes_received = 10
+        span.exit_code = 0
+    with pytest.raises(OSError):
+        with tracer.span("run", "ssh", hostname="b"):
+            raise OSError("unreachable")
+    return tracer
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    with tracer.span("run", "ssh"):
+        pass
+    assert tracer.spans == []
+
+
+def test_summary():
+    tracer = make_tracer()
+    row = tracer.summary()[("ssh", "run")]
+    assert (row["count"], row["bytes_received"], row["failed"]) == (2, 10, 1)
+    assert row["max"] <= row["total"]
+    assert tracer.spans[1].error == "OSError"
+
+
+def test_export_chrome(tmp_path):
+    path = tmp_path / "trace.json"
+    make_tracer().export(str(path))
+
+    trace = json.loads(path.read_text())
+    assert trace["displayTimeUnit"] == "ms"
+    events = trace["traceEvents"]
+    assert [event["ph"] for event in events] == ["X", "X"]
+    assert events[0]["args"] == {
+        "hostname": "a",
+        "command": "uptime",
+        "bytes_received": 10,
+    }
+    assert events[1]["args"] == {"hostname": "b", "error": "OSError"}
+    assert events[0]["ts"] <= events[1]["ts"]
+
+
+def test_export_json(tmp_path):
+    path = tmp_path / "trace.json"
+    make_tracer().export(str(path), "json")
+
+    spans = json.loads(path.read_text())
+    assert [span["hostname"] for span in spans] == ["a", "b"]
+    assert set(spans[0]) >= {"name", "category", "start", "duration", "thread_id"}
+
+
+def test_export_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        make_tracer().export(str(tmp_path / "trace.txt"), "xml")
+
+
+def test_workflow_trace_file(config, fake_pool, hostname, tmp_path, capsys):
+    path = tmp_path / "trace.json"
+    ctx = ExecutionContext({"trace_file": str(path)}, pool=fake_pool)
+    ctx.config = config
+    workflow = Workflow.from_dict(
+        {"instructions": [{"CONNECT_HOSTS": {}}, {"GET_WIREGUARD_STATUS": {}}]}
+    )
+    try:
+        workflow.run(ctx)
+    finally:
+        TRACER.disable()
+
+    events = json.loads(path.read_text())["traceEvents"]
+    categories = {(event["cat"], event["name"]) for event in events}
+    assert {("workflow", "Workflow"), ("ssh", "connect"), ("ssh", "run")} <= categories
+    assert any(event["args"].get("hostname") == hostname for event in events)
+    # the summary table goes to stderr
+    assert "ConnectHosts" in capsys.readouterr().err
@@ -0,0 +1,75 @@
+from vpntools.helpers import dict_to_yaml
+from vpntools.wireguard import WgPeerDiff, build_wg_sync_cmds, diff_wg_peers
+from vpntools.workflow import ExecutionContext, Workflow
+
+
+def test_diff_wg_peers():
+    desired = {"a": ["10.0.0.2/32"], "b": ["10.0.0.3/32"], "c": ["10.0.0.4/32"]}
+    current = {"b": ["10.0.0.3/32"], "c": ["10.0.0.9/32"], "d": ["10.0.0.5/32"]}
+
+    diff = diff_wg_peers(desired, current)
+
+    assert diff == WgPeerDiff(
+        add={"a": ["10.0.0.2/32"]}, update={"c": ["10.0.0.4/32"]}, remove=["d"]
+    )
+    assert str(diff) == "+1 ~1 -1"
+
+
+def test_diff_wg_peers_ignores_allowed_ips_order():
+    desired = {"a": ["10.0.0.2/32", "fd00::2/128"]}
+    diff = diff_wg_peers(desired, {"a": ["fd00::2/128", "10.0.0.2/32"]})
+    assert not diff
+    assert diff_wg_peers(desired, {}).add == desired
+    assert diff_wg_peers({}, desired).remove == ["a"]
+
+
+def test_build_wg_sync_cmds():
+    diff = WgPeerDiff(
+        add={"a": ["10.0.0.2/32", "fd00::2/128"]},
+        update={"c": ["10.0.0.4/32"]},
+        remove=["d"],
+    )
+    assert build_wg_sync_cmds("wg0", diff) == [
+        "wg set wg0 peer a allowed-ips 10.0.0.2/32,fd00::2/128",
+        "wg set wg0 peer c allowed-ips 10.0.0.4/32",
+        "wg set wg0 peer d remove",
+    ]
+    assert build_wg_sync_cmds("wg0", WgPeerDiff()) == []
+
+
+def test_build_wg_sync_cmds_quotes_yaml_values():
+    diff = WgPeerDiff(add={"a;reboot": ["10.0.0.2/32 $(id)"]}, remove=["b c"])
+    assert build_wg_sync_cmds("wg0;id", diff) == [
+        "wg set 'wg0;id' peer 'a;reboot' allowed-ips '10.0.0.2/32 $(id)'",
+        "wg set 'wg0;id' peer 'b c' remove",
+    ]
+
+
+def test_sync_installs_config_of_changed_interface(
+    config, wg0, fake_pool, hostname, tmp_path, sftp_sessions
+):
+    removed = wg0["peers"].pop()
+    (removed_peer,) = removed.values()
+    vpn_yaml = tmp_path / "vpn.yaml"
+    vpn_yaml.write_text(dict_to_yaml(config))
+    args = {
+        "vpn_yaml": str(vpn_yaml),
+        "no_config_cache": True,
+        "state_file": str(tmp_path / "deploy_state.json"),
+    }
+    workflow = {
+        "instructions": [
+            {"LOAD_CONFIG": {}},
+            {"CONNECT_HOSTS": {}},
+            {"SYNC_WIREGUARD": {}},
+        ]
+    }
+
+    ctx = Workflow.from_dict(workflow).run(ExecutionContext(args, pool=fake_pool))
+
+    assert not ctx.errors
+    installed = fake_pool.servers[hostname].files["/etc/wireguard/wg0.conf"].decode()
+    assert wg0["peers"][0]["peer_0"]["public_key"] in installed
+    assert removed_peer["public_key"] not in installed
+    # configs and script are uploaded together
+    assert sftp_sessions == [hostname]
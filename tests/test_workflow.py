@@ -0,0 +1,209 @@
+import os
+import threading
+import time
+
+import pytest
+
+from vpntools import workflow
+from vpntools.step_cache import StepCache
+from vpntools.workflow import ExecutionContext, Instruction, Workflow
+
+
+class Noop(Instruction):
+    def run(self, ctx):
+        return ctx
+
+
+class Record(Instruction):
+    """Appends its "name" to the "log" list, raises when "fail" is set"""
+
+    CACHEABLE = True
+
+    def get_result(self, ctx):
+        return self._attr["name"]
+
+    def restore_result(self, ctx, result):
+        self._attr["log"].append(f"restored {result}")
+
+    def run(self, ctx):
+        if self._attr.get("fail"):
+            raise RuntimeError(f"{self._attr['name']} failed")
+        self._attr["log"].append(self._attr["name"])
+        return ctx
+
+
+@pytest.fixture
+def record_workflow(monkeypatch):
+    monkeypatch.setitem(workflow.INSTRUCTIONS, "RECORD", Record)
+
+    def build(log, needs, fail=()):
+        return Workflow.from_dict(
+            {
+                "steps": {
+                    name: {
+                        "instruction": "RECORD",
+                        "needs": step_needs,
+                        "attr": {"name": name, "log": log, "fail": name in fail},
+                    }
+                    for name, step_needs in needs.items()
+                }
+            }
+        )
+
+    return build
+
+
+DIAMOND = {"load": [], "left": ["load"], "right": "load", "join": ["left", "right"]}
+
+
+def test_run_per_host_keeps_host_order():
+    hostnames = [f"host{idx}" for idx in range(8)]
+    seen = []
+
+    def func(hostname):
+        # later hosts finish first
+        time.sleep(0.001 * (8 - int(hostname[4:])))
+        return hostname.upper()
+
+    results = Noop(workers=4).run_per_host(
+        ExecutionContext(), func, hostnames, on_result=lambda *item: seen.append(item)
+    )
+
+    assert list(results.items()) == [
+        (hostname, hostname.upper()) for hostname in hostnames
+    ]
+    assert sorted(seen) == sorted(results.items())
+
+
+def test_run_per_host_records_errors():
+    ctx = ExecutionContext()
+
+    def func(hostname):
+        if hostname == "bad":
+            raise OSError("unreachable")
+        return hostname
+
+    results = Noop().run_per_host(ctx, func, ["good", "bad", "other"])
+
+    assert results == {"good": "good", "other": "other"}
+    assert list(ctx.errors) == ["bad"]
+    assert str(ctx.errors["bad"][0]) == "unreachable"
+
+
+def test_run_per_host_bounded_workers():
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def func(hostname):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    ctx = ExecutionContext({"workers": 2})
+    Noop().run_per_host(ctx, func, [f"host{idx}" for idx in range(6)])
+    assert running[1] == 2
+    assert Noop(workers=3).get_workers(ctx) == 3
+
+
+def test_run_per_host_defaults_to_connected_hosts():
+    ctx = ExecutionContext()
+    ctx.hosts = {"a": None, "b": None}
+    assert Noop().run_per_host(ctx, str.upper) == {"a": "A", "b": "B"}
+    ctx.hosts = {}
+    assert Noop().run_per_host(ctx, str.upper) == {}
+
+
+def test_trim_errors():
+    ctx = ExecutionContext()
+    for idx in range(3):
+        ctx.add_error("a", OSError(idx))
+    ctx.add_error("b", OSError("b"))
+
+    ctx.trim_errors()
+
+    assert {
+        hostname: [str(err) for err in errs] for hostname, errs in ctx.errors.items()
+    } == {
+        "a": ["2"],
+        "b": ["b"],
+    }
+
+
+def test_workflow_runs_steps_after_their_needs(record_workflow):
+    log = []
+    record_workflow(log, DIAMOND).run(ExecutionContext())
+
+    assert log[0] == "load"
+    assert sorted(log[1:3]) == ["left", "right"]
+    assert log[3] == "join"
+
+
+def test_workflow_linear_instructions():
+    steps = Workflow.from_dict(
+        {"instructions": [{"LOAD_CONFIG": {}}, {"CONNECT_HOSTS": {}}]}
+    ).steps
+    assert [(step.name, step.needs) for step in steps] == [
+        ("LOAD_CONFIG", []),
+        ("CONNECT_HOSTS", ["LOAD_CONFIG"]),
+    ]
+
+
+def test_workflow_failed_step_skips_dependents(record_workflow):
+    log = []
+    with pytest.raises(RuntimeError, match="left failed"):
+        record_workflow(log, DIAMOND, fail=["left"]).run(ExecutionContext())
+
+    # right does not depend on left, join does
+    assert sorted(log) == ["load", "right"]
+
+
+@pytest.mark.parametrize(
+    "needs, message",
+    [
+        ({"a": ["b"], "b": ["a"]}, "depend on each other"),
+        ({"a": ["missing"]}, "needs unknown steps"),
+    ],
+)
+def test_workflow_rejects_bad_needs(record_workflow, needs, message):
+    with pytest.raises(ValueError, match=message):
+        record_workflow([], needs)
+
+
+def test_workflow_resumes_completed_steps(record_workflow, tmp_path):
+    vpn_yaml = tmp_path / "vpn.yaml"
+    vpn_yaml.write_text("{}")
+    needs = {"load": [], "deploy": ["load"]}
+
+    def run(log, fail=()):
+        step_cache = StepCache("run", str(tmp_path), files=[str(vpn_yaml)])
+        record_workflow(log, needs, fail).run(ExecutionContext(), step_cache=step_cache)
+        return step_cache
+
+    log = []
+    with pytest.raises(RuntimeError):
+        run(log, fail=["deploy"])
+    assert log == ["load"]
+
+    log = []
+    step_cache = run(log)
+    assert log == ["restored load", "deploy"]
+    # a successful run starts over next time
+    assert not os.path.exists(step_cache.path)
+
+
+def test_step_cache_discarded_when_files_change(tmp_path):
+    vpn_yaml = tmp_path / "vpn.yaml"
+    vpn_yaml.write_text("{}")
+    StepCache("run", str(tmp_path), files=[str(vpn_yaml)]).set("load", 1)
+
+    step_cache = StepCache("run", str(tmp_path), files=[str(vpn_yaml)])
+    assert step_cache.completed == ["load"] and step_cache.get("load") == 1
+    assert os.stat(step_cache.path).st_mode & 0o777 == 0o600
+
+    vpn_yaml.write_text("{a: 1}")
+    step_cache = StepCache("run", str(tmp_path), files=[str(vpn_yaml)])
+    assert "load" not in step_cache
+    assert not os.path.exists(step_cache.path)
@@ -1,8 +1,14 @@
 #! /root/env/env/bin/python3
+import sys
+import logging
 from argparse import ArgumentParser
 from typing import Any, Dict, Union
 
-from vpntools.workflows import DEPLOY_WIREGUARD_WF, STATUS_WF
+# only light modules here, the workflows and their dependencies (fabric,
+# jinja2, ...) are imported by the subcommand that runs them
+from vpntools.output import OUTPUT_FORMATS, QR_FORMATS
+from vpntools.tracing import TRACE_FORMATS
+from vpntools.workflows import get_workflow
 
 cli = ArgumentParser()
 subparsers = cli.add_subparsers(dest="subcommand")
@@ -22,25 +28,198 @@ def subcommand(*subparser_args, parent=subparsers):
     return decorator
 
 
-@subcommand(argument("vpn_yaml"), argument("--hostname"))
+HOSTNAME_ARG = argument(
+    "--hostname", help="Only work on these hosts (comma separated list)"
+)
+WORKERS_ARG = argument(
+    "--workers", type=int, help="Max number of hosts processed concurrently"
+)
+WRITE_CONFIG_ARG = argument(
+    "--write-config",
+    action="store_true",
+    help="Write generated keys and allocated addresses back to vpn_yaml",
+)
+CLIENT_ARGS = (
+    argument("--output-dir", help="Write client configs and QR codes there"),
+    argument("--qr-format", choices=QR_FORMATS, help="QR code format (default: png)"),
+    argument("--bundle", action="store_true", help="Write a single zip bundle"),
+    argument("--processes", type=int, help="Processes rendering client configs"),
+    argument(
+        "--prefer-ipv6",
+        action="store_true",
+        help="Resolve server hostnames to IPv6 addresses when they have one",
+    ),
+)
+
+TRACE_ARGS = (
+    argument("--trace", action="store_true", help="Print a timing summary"),
+    argument("--trace-file", help="Write the collected spans there"),
+    argument(
+        "--trace-format",
+        choices=TRACE_FORMATS,
+        help="Trace file format (default: chrome)",
+    ),
+)
+
+
+@subcommand(
+    argument("vpn_yaml"),
+    HOSTNAME_ARG,
+    WORKERS_ARG,
+    *TRACE_ARGS,
+    argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        help="Output format, ndjson and csv stream records as hosts respond",
+    ),
+    argument("--peer", help="Only show these peers (comma separated list)"),
+    argument(
+        "--max-age",
+        type=float,
+        help="Seconds a cached command result stays usable (default: per command)",
+    ),
+    argument(
+        "--refresh",
+        action="store_true",
+        help="Query every host, ignoring cached results",
+    ),
+)
 def status(args: Dict[str, Any]):
     """Get status"""
-    STATUS_WF.run(args=args)
-
-
-@subcommand(argument("vpn_yaml"), argument("--hostname"))
+    return get_workflow("STATUS_WF").run(args=args)
+
+
+@subcommand(
+    argument("vpn_yaml"),
+    HOSTNAME_ARG,
+    WORKERS_ARG,
+    *TRACE_ARGS,
+    argument("--force", action="store_true", help="Redeploy unchanged hosts too"),
+    argument("--state-file", help="Local deploy state file"),
+    WRITE_CONFIG_ARG,
+    *CLIENT_ARGS,
+)
 def deploy_wg(args: Dict[str, Any]):
     """Deploy Wireguard"""
-    DEPLOY_WIREGUARD_WF.run(args=args)
+    return get_workflow("DEPLOY_WIREGUARD_WF").run(args=args)
+
+
+@subcommand(
+    argument("vpn_yaml"),
+    HOSTNAME_ARG,
+    WORKERS_ARG,
+    *TRACE_ARGS,
+    argument("--state-file", help="Local deploy state file"),
+    argument("--format", choices=OUTPUT_FORMATS, help="Output format"),
+    argument(
+        "--rtt-ms",
+        type=float,
+        help="SSH round-trip time the estimates assume (default: 50)",
+    ),
+    argument("--output-dir", help="Also compare client configs written there"),
+    argument("--bundle", action="store_true", help="Client configs are a zip bundle"),
+    argument("--processes", type=int, help="Processes rendering configs"),
+    argument(
+        "--prefer-ipv6",
+        action="store_true",
+        help="Resolve server hostnames to IPv6 addresses when they have one",
+    ),
+)
+def plan(args: Dict[str, Any]):
+    """Show what deploy_wg would change, without connecting to the hosts"""
+    return get_workflow("PLAN_WIREGUARD_WF").run(args=args)
+
+
+@subcommand(
+    argument("vpn_yaml"),
+    HOSTNAME_ARG,
+    WORKERS_ARG,
+    *TRACE_ARGS,
+    argument("--state-file", help="Local deploy state file"),
+    WRITE_CONFIG_ARG,
+    *CLIENT_ARGS,
+)
+def sync_wg(args: Dict[str, Any]):
+    """Sync Wireguard peers without restarting the interfaces"""
+    return get_workflow("SYNC_WIREGUARD_WF").run(args=args)
+
+
+@subcommand(
+    argument("vpn_yaml"),
+    HOSTNAME_ARG,
+    WORKERS_ARG,
+    *TRACE_ARGS,
+    argument("--interval", type=float, help="Seconds between polls (default: 10)"),
+    argument("--count", type=int, help="Stop after this many polls"),
+    argument("--db", help="Telemetry database (SQLite)"),
+    argument(
+        "--retention", type=int, help="Seconds of history to keep (default: 7 days)"
+    ),
+)
+def monitor(args: Dict[str, Any]):
+    """Collect Wireguard peer traffic and handshakes into a local database"""
+    return get_workflow("MONITOR_WIREGUARD_WF").run(args=args)
+
+
+@subcommand(
+    argument("vpn_yaml"),
+    HOSTNAME_ARG,
+    WORKERS_ARG,
+    *TRACE_ARGS,
+    argument("--listen", help="Address to listen on (default: 127.0.0.1)"),
+    argument("--port", type=int, help="Port to listen on (default: 9586)"),
+    argument("--interval", type=float, help="Seconds between polls (default: 15)"),
+)
+def serve_metrics(args: Dict[str, Any]):
+    """Serve Wireguard host and peer metrics in the Prometheus text format"""
+    return get_workflow("SERVE_METRICS_WF").run(args=args)
+
+
+@subcommand(
+    argument("workflow_file", help="Workflow yaml, see README"),
+    argument("vpn_yaml"),
+    HOSTNAME_ARG,
+    WORKERS_ARG,
+    *TRACE_ARGS,
+    WRITE_CONFIG_ARG,
+    *CLIENT_ARGS,
+    argument(
+        "--no-resume",
+        action="store_true",
+        help="Run all steps, even those that completed in a failed previous run",
+    ),
+)
+def run_workflow(args: Dict[str, Any]):
+    """Run a workflow file, steps run concurrently where dependencies allow"""
+    # pylint: disable=import-outside-toplevel
+    from vpntools.workflow import run_workflow_file
+
+    return run_workflow_file(
+        args["workflow_file"], args, resume=not args.get("no_resume")
+    )
+
+
+@subcommand(argument("target", help="Path of the zip bundle to create"))
+def compile_templates(args: Dict[str, Any]):
+    """Precompile Jinja templates, export VPNTOOLS_TEMPLATE_BUNDLE=<target> to use them"""
+    # pylint: disable=import-outside-toplevel
+    from vpntools.jinja_render import compile_template_bundle
+
+    compile_template_bundle(args["target"])
 
 
 def main() -> None:
     args = cli.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s:%(message)s"
+    )
 
     if args.subcommand is None:
         cli.print_help()
     else:
-        args.func(vars(args))
+        ctx = args.func(vars(args))
+        if ctx is not None and ctx.errors:
+            sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+import io
+import os
+import logging
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from vpntools.helpers import (
+    filter_dict,
+    get_process_pool_context,
+    write_private_file,
+)
+from vpntools.output import QR_FILE_EXT, QR_FORMATS
+from vpntools.peers import PeerRegistry
+from vpntools.resolver import RESOLVER
+from vpntools.wireguard import build_wg_peer_cfg, get_wg_from_host_cfg
+
+
+logger = logging.getLogger(__name__)
+
+
+# server interface fields used by wg_client_cfg.j2, the peer list is not shipped
+# to the worker processes
+CLIENT_SRV_CFG_KEYS = ("public_key", "server_port", "endpoint")
+
+# below this number of peers a process pool costs more than it saves: a job
+# (config + PNG QR code) takes ~15 ms, starting 2 forkserver workers ~450 ms,
+# see dev/benchmarks/bench_clients.py
+MIN_PARALLEL_JOBS = 64
+
+
+@dataclass
+class ClientJob:
+    hostname: str
+    wg_if_name: str
+    peer_name: str
+    peer_cfg: Dict[str, Any]
+    srv_cfg: Dict[str, Any]
+
+
+@dataclass
+class ClientArtifact:
+    hostname: str
+    wg_if_name: str
+    peer_name: str
+    config: str
+    qr_format: Optional[str] = None
+    qr_code: Union[bytes, str, None] = None
+
+
+def get_server_endpoint(
+    hostname: str,
+    host_cfg: Dict[str, Any],
+    wg_if_dict: Dict[str, Any],
+    prefer_ipv6: bool = False,
+) -> str:
+    """
+    Interface "endpoint", host "endpoint" or the resolved hostname, in that
+    order. The host's "prefer_ipv6" (prefer_ipv6 if unset) picks an AAAA
+    record over an A record.
+    """
+    return (
+        wg_if_dict.get("endpoint")
+        or host_cfg.get("endpoint")
+        or RESOLVER.resolve(hostname, host_cfg.get("prefer_ipv6", prefer_ipv6))
+    )
+
+
+def iter_client_jobs(
+    config: Dict[str, Any],
+    peers: Dict[str, PeerRegistry],
+    hostnames: List[str],
+    prefer_ipv6: bool = False,
+) -> Iterator[ClientJob]:
+    """
+    Yield a job per peer, with the server endpoint already resolved so worker
+    processes never hit DNS. Peers with only a public key are skipped.
+    """
+    unresolved: Dict[bool, List[str]] = {}
+    for hostname in hostnames:
+        host_cfg = config[hostname]
+        if not host_cfg.get("endpoint") and not all(
+            wg_if_dict.get("endpoint")
+            for wg_if_dict in get_wg_from_host_cfg(host_cfg).values()
+        ):
+            unresolved.setdefault(
+                bool(host_cfg.get("prefer_ipv6", prefer_ipv6)), []
+            ).append(hostname)
+    for family_ipv6, family_hostnames in unresolved.items():
+        RESOLVER.prefetch(family_hostnames, prefer_ipv6=family_ipv6)
+
+    for hostname in hostnames:
+        host_cfg = config[hostname]
+        for wg_if_name, wg_if_dict in get_wg_from_host_cfg(host_cfg).items():
+            srv_cfg = filter_dict(wg_if_dict, CLIENT_SRV_CFG_KEYS)
+            srv_cfg["endpoint"] = get_server_endpoint(
+                hostname, host_cfg, wg_if_dict, prefer_ipv6
+            )
+            for peer in peers[hostname].by_interface(wg_if_name):
+                if not peer.config.get("private_key"):
+                    logger.warning(
+                        "%s: %s/%s has no private_key, client keeps its own "
+                        "config, skipping",
+                        hostname,
+                        wg_if_name,
+                        peer.name,
+                    )
+                    continue
+                yield ClientJob(hostname, wg_if_name, peer.name, peer.config, srv_cfg)
+
+
+def make_qr_code(data: str, qr_format: str) -> Union[bytes, str]:
+    # only client generation needs segno, keep it out of the other workflows
+    import segno  # pylint: disable=import-outside-toplevel
+
+    qr_code = segno.make(data, error="l")
+    if qr_format == "ansi":
+        out = io.StringIO()
+        qr_code.terminal(out=out, compact=True)
+        return out.getvalue()
+
+    out = io.BytesIO()
+    qr_code.save(out, kind=qr_format, scale=4)
+    return out.getvalue()
+
+
+def build_client_artifact(
+    job: ClientJob, qr_format: Optional[str] = None
+) -> ClientArtifact:
+    wg_peer_cfg_str = build_wg_peer_cfg(job.peer_cfg, job.srv_cfg, job.hostname)
+    return ClientArtifact(
+        job.hostname,
+        job.wg_if_name,
+        job.peer_name,
+        wg_peer_cfg_str,
+        qr_format,
+        make_qr_code(wg_peer_cfg_str, qr_format) if qr_format else None,
+    )
+
+
+def _build_client_artifact_star(args) -> ClientArtifact:
+    return build_client_artifact(*args)
+
+
+def build_client_artifacts(
+    jobs: List[ClientJob],
+    qr_format: Optional[str] = None,
+    processes: Optional[int] = None,
+) -> List[ClientArtifact]:
+    """
+    Render client configs and QR codes, in a process pool for large batches
+    when more than one worker process is available (processes, the CPU count
+    by default).
+
+    Artifacts are returned in the order of jobs. The pool workers come from a
+    forkserver, which imports the __main__ module of the caller again: scripts
+    using this have to keep their entry point under `if __name__ == "__main__":`.
+    """
+    if qr_format is not None and qr_format not in QR_FORMATS:
+        raise ValueError(f"Unknown QR code format {qr_format}, expected {QR_FORMATS}")
+
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    if processes == 1 or len(jobs) < MIN_PARALLEL_JOBS:
+        return [build_client_artifact(job, qr_format) for job in jobs]
+
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=get_process_pool_context()
+    ) as executor:
+        return list(
+            executor.map(
+                _build_client_artifact_star,
+                [(job, qr_format) for job in jobs],
+                chunksize=max(1, len(jobs) // (processes * 4)),
+            )
+        )
+
+
+def get_artifact_paths(artifact: ClientArtifact) -> Dict[str, str]:
+    """Paths relative to the output dir: {"config": ..., "qr_code": ...}"""
+    base_path = os.path.join(artifact.hostname, artifact.peer_name)
+    paths = {"config": f"{base_path}.conf"}
+    if artifact.qr_format:
+        paths["qr_code"] = f"{base_path}.{QR_FILE_EXT[artifact.qr_format]}"
+    return paths
+
+
+def write_client_artifacts(
+    artifacts: List[ClientArtifact], output_dir: str, bundle: bool = False
+) -> str:
+    """
+    Write artifacts as <output_dir>/<hostname>/<peer_name>.<ext> files, or into
+    a single <output_dir>/wg_clients.zip with the same layout if bundle is set.
+
+    Configs carry private keys, so files are created readable by the owner only.
+    Returns the path of the written directory or zip bundle.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if bundle:
+        bundle_path = os.path.join(output_dir, "wg_clients.zip")
+        zip_data = io.BytesIO()
+        with zipfile.ZipFile(zip_data, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for artifact in artifacts:
+                paths = get_artifact_paths(artifact)
+                zip_file.writestr(paths["config"], artifact.config)
+                if artifact.qr_code is not None:
+                    zip_file.writestr(paths["qr_code"], artifact.qr_code)
+        write_private_file(bundle_path, zip_data.getvalue())
+        return bundle_path
+
+    for artifact in artifacts:
+        paths = get_artifact_paths(artifact)
+        write_private_file(os.path.join(output_dir, paths["config"]), artifact.config)
+        if artifact.qr_code is not None:
+            write_private_file(
+                os.path.join(output_dir, paths["qr_code"]), artifact.qr_code
+            )
+    return output_dir
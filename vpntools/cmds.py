@@ -1,18 +1,36 @@
 from datetime import datetime
 
-from vpntools.parsers import TextParser
+from vpntools.parsers import parse_wg_dump, parse_wg_units, redact_wg_dump
 
+# "ttl": seconds a result may be served from the ResultCache when the workflow
+# uses one, commands without a ttl always run. "redact" strips secrets from
+# the stdout before it is cached, the parser has to accept both.
 LINUX_COMMANDS = {
-    "WIREGUARD_SVC_STATUS": {"cmd": "systemctl status wg-quick@wg0", "parser": None},
+    # {interface: active state} of every wg-quick unit
+    "WIREGUARD_SVC_STATUS": {
+        "cmd": "systemctl list-units --all --plain --no-legend 'wg-quick@*'",
+        "parser": parse_wg_units,
+        "ttl": 10,
+    },
+    # boot time, only changes on reboot
     "GET_UPTIME": {
         "cmd": "uptime -s",
         "parser": lambda x: datetime.strptime(x.strip(), "%Y-%m-%d %H:%M:%S"),
+        "ttl": 3600,
     },
     "WG_STATUS": {
-        "cmd": "wg show all",
-        "parser": TextParser(
-            [r"peer: (?P<pub_key>.*)", r"(?P<key>.*?):(?P<value>.*)"]
-        ).parse_text,
+        "cmd": "wg show all dump",
+        "parser": parse_wg_dump,
+        "ttl": 10,
+        "redact": redact_wg_dump,
+    },
+    "WG_INTERFACES": {"cmd": "wg show interfaces", "parser": str.split, "ttl": 10},
+    # sha256 of every /etc/wireguard/*.conf without comment lines, see config_hash
+    "WG_CONFIG_CHECKSUMS": {
+        "cmd": "sudo sh -c 'cd /etc/wireguard && for f in *.conf; do "
+        '[ -e "$f" ] || continue; echo "${f%.conf} $(grep -v ^# "$f" | sha256sum)"; '
+        "done'",
+        "parser": lambda x: dict(line.split()[:2] for line in x.splitlines() if line),
     },
     "APTGET_UPD&UPG": {"cmd": "apt-get update && apt-get -y upgrade", "parser": None},
 }
@@ -0,0 +1,125 @@
+import os
+import pickle
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from vpntools.helpers import DEFAULT_CACHE_DIR, write_private_file, yaml_to_dict
+
+
+logger = logging.getLogger(__name__)
+
+CONFIG_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, "configs")
+CONFIG_CACHE_VERSION = 1
+
+
+def parse_hostnames(hostnames: Optional[str]) -> Optional[Iterable[str]]:
+    """--hostname value, a comma separated list of hosts"""
+    if not hostnames:
+        return None
+    return [hostname.strip() for hostname in hostnames.split(",") if hostname.strip()]
+
+
+def check_hostnames(
+    hostnames: Iterable[str], known: Iterable[str], vpn_yaml: str
+) -> None:
+    missing = [hostname for hostname in hostnames if hostname not in known]
+    if missing:
+        raise KeyError(f"{', '.join(missing)} not found in {vpn_yaml}")
+
+
+class ConfigCache:
+    """
+    Parsed VPN yaml cache, a pickle sidecar per yaml file in CONFIG_CACHE_DIR.
+
+    The sidecar stores every host config pickled separately, so only the
+    selected hosts are unpickled. It is valid while the yaml has the same
+    mtime and size, or failing that, the same sha256.
+    """
+
+    def __init__(self, cache_dir: str = CONFIG_CACHE_DIR) -> None:
+        self.cache_dir = cache_dir
+
+    def _sidecar_path(self, vpn_yaml: str) -> str:
+        path_hash = hashlib.sha256(os.path.abspath(vpn_yaml).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{path_hash}.pickle")
+
+    def load(
+        self, vpn_yaml: str, hostnames: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        stat = os.stat(vpn_yaml)
+        sidecar_path = self._sidecar_path(vpn_yaml)
+        sidecar = self._read_sidecar(sidecar_path)
+
+        if not self._matches_stat(sidecar, stat):
+            with open(vpn_yaml, "rb") as f:
+                yaml_bytes = f.read()
+            yaml_hash = hashlib.sha256(yaml_bytes).hexdigest()
+            if sidecar is None or sidecar["sha256"] != yaml_hash:
+                logger.debug("Parsing %s", vpn_yaml)
+                sidecar = {
+                    "hosts": {
+                        hostname: pickle.dumps(host_cfg, pickle.HIGHEST_PROTOCOL)
+                        for hostname, host_cfg in (
+                            yaml_to_dict(yaml_bytes) or {}
+                        ).items()
+                    }
+                }
+            sidecar.update(
+                version=CONFIG_CACHE_VERSION,
+                sha256=yaml_hash,
+                mtime_ns=stat.st_mtime_ns,
+                size=stat.st_size,
+            )
+            self._write_sidecar(sidecar_path, sidecar)
+        else:
+            logger.debug("Using cached %s", vpn_yaml)
+
+        host_blobs = sidecar["hosts"]
+        hostnames = list(host_blobs if hostnames is None else hostnames)
+        check_hostnames(hostnames, host_blobs, vpn_yaml)
+        return {hostname: pickle.loads(host_blobs[hostname]) for hostname in hostnames}
+
+    @staticmethod
+    def _matches_stat(sidecar: Optional[Dict[str, Any]], stat: os.stat_result) -> bool:
+        return (
+            sidecar is not None
+            and sidecar["mtime_ns"] == stat.st_mtime_ns
+            and sidecar["size"] == stat.st_size
+        )
+
+    @staticmethod
+    def _read_sidecar(sidecar_path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(sidecar_path, "rb") as f:
+                sidecar = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if sidecar.get("version") != CONFIG_CACHE_VERSION:
+            return None
+        return sidecar
+
+    @staticmethod
+    def _write_sidecar(sidecar_path: str, sidecar: Dict[str, Any]) -> None:
+        # host configs carry private keys
+        write_private_file(sidecar_path, pickle.dumps(sidecar, pickle.HIGHEST_PROTOCOL))
+
+
+CONFIG_CACHE = ConfigCache()
+
+
+def load_config(
+    vpn_yaml: str,
+    hostnames: Optional[Iterable[str]] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """Load the VPN yaml, only the given hosts if hostnames is set"""
+    if use_cache:
+        return CONFIG_CACHE.load(vpn_yaml, hostnames)
+
+    with open(vpn_yaml, "rb") as f:
+        config = yaml_to_dict(f.read()) or {}
+    if hostnames is None:
+        return config
+    check_hostnames(hostnames, config, vpn_yaml)
+    return {hostname: config[hostname] for hostname in hostnames}
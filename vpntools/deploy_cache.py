@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from vpntools.helpers import DEFAULT_CACHE_DIR, get_resource_path
+from vpntools.resources import scripts, templates
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEPLOY_STATE_PATH = os.path.join(DEFAULT_CACHE_DIR, "deploy_state.json")
+
+# entry fields that have to match for a deployment to be considered unchanged
+VERSION_KEYS = ("config_hash", "script_version", "template_version")
+
+
+def config_hash(cfg_str: str) -> str:
+    """
+    sha256 of a rendered config with comment lines dropped.
+
+    Comments carry the render timestamp, so they are left out. The digest is the
+    same as `grep -v '^#' <file> | sha256sum` on the uploaded file.
+    """
+    content = "".join(
+        f"{line}\n" for line in cfg_str.splitlines() if not line.startswith("#")
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def interface_hash(cfg_str: str) -> str:
+    """config_hash of the [Interface] section only, peers left out"""
+    return config_hash(cfg_str.split("\n[Peer]", 1)[0])
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def get_deploy_versions() -> Dict[str, str]:
+    """Versions of the deploy script and server config template, see VERSION_KEYS"""
+    return {
+        "script_version": file_hash(get_resource_path("deploy_wireguard.sh", scripts)),
+        "template_version": file_hash(get_resource_path("wg_server_cfg.j2", templates)),
+    }
+
+
+def make_deploy_entry(
+    cfg_str: str, peers: Dict[str, List[str]], versions: Dict[str, str]
+) -> Dict[str, Any]:
+    """
+    Deploy state entry of an interface rendered as cfg_str. peers ({public key:
+    allowed ips}) and the interface hash are kept for `plan`, to tell peer
+    changes from interface changes.
+    """
+    return {
+        "config_hash": config_hash(cfg_str),
+        "interface_hash": interface_hash(cfg_str),
+        "peers": peers,
+        **versions,
+    }
+
+
+class DeployStateCache:
+    """
+    Local record of what was deployed, keyed by hostname and interface name.
+
+    Stored as JSON, one entry per interface:
+    {hostname: {wg_if_name: {"config_hash": ..., "interface_hash": ...,
+                             "peers": {public_key: allowed_ips},
+                             "script_version": ..., "template_version": ...,
+                             "deployed_at": ...}}}
+    """
+
+    def __init__(self, path: str = DEFAULT_DEPLOY_STATE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._state = json.load(f)
+
+    def get(self, hostname: str, wg_if_name: str) -> Optional[Dict[str, Any]]:
+        return self._state.get(hostname, {}).get(wg_if_name)
+
+    def get_host(self, hostname: str) -> Dict[str, Dict[str, Any]]:
+        return self._state.get(hostname, {})
+
+    def is_unchanged(
+        self, hostname: str, wg_if_name: str, entry: Dict[str, Any]
+    ) -> bool:
+        cached = self.get(hostname, wg_if_name)
+        return cached is not None and all(
+            cached.get(key) == entry[key] for key in VERSION_KEYS
+        )
+
+    def set(self, hostname: str, wg_if_name: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._state.setdefault(hostname, {})[wg_if_name] = {
+                **entry,
+                "deployed_at": datetime.utcnow().isoformat(),
+            }
+
+    def save(self) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        logger.debug("Deploy state saved to %s", self.path)
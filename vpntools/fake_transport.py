@@ -0,0 +1,318 @@
+"""
+In-process stand-in for the SSH transport of Host.
+
+FakeConnectionPool hands out FakeConnections instead of fabric Connections.
+Each fake host (FakeServer) replays canned output of the LINUX_COMMANDS
+(`wg show all dump`, `uptime -s`, ...) generated from its config, keeps
+uploaded files in memory and adds a configurable latency to every round-trip.
+Uploaded scripts run by Host are emulated as far as the installed Wireguard
+configs go, which the config checksum probe then answers from.
+Used by dev/benchmarks/bench_fleet.py to measure workflows on large fleets.
+"""
+import io
+import re
+import time
+import shlex
+import posixpath
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from invoke.exceptions import UnexpectedExit
+from invoke.runners import Result
+
+from vpntools.cmds import LINUX_COMMANDS
+from vpntools.deploy_cache import config_hash
+from vpntools.helpers import load_resource
+from vpntools.resources import scripts
+from vpntools.sshpool import DEFAULT_MAX_CHANNELS, ConnectionPool
+from vpntools.wireguard import WG_CONFIG_DIR, get_wg_from_host_cfg
+
+
+# the framing lines of Host.run_linux_cmds
+BATCH_ECHO_RE = re.compile(r"^echo '(?P<text>.*)'$")
+BATCH_CMD_RE = re.compile(r"^\( (?P<cmd>.*) \)$")
+BATCH_RC_RE = re.compile(r"""^printf '\\n%s %s\\n' '(?P<marker>.*)' "\$\?"$""")
+# Host.run_uploaded_script: `<script> <args>; rc=$?; <cleanup>; exit $rc`
+RUNSCRIPT_RE = re.compile(r"^(?P<cmd>.*); rc=\$\?; (?P<cleanup>.*); exit \$rc$")
+INSTALL_RE = re.compile(r"^install -m (?P<mode>\S+) (?P<src>\S+) (?P<dst>\S+)$")
+
+
+class FakeServer:
+    """Canned command output and in-memory files of one fake host"""
+
+    def __init__(self, hostname: str, latency: float = 0.0) -> None:
+        self.hostname = hostname
+        # seconds added to every command and file upload
+        self.latency = latency
+        # {command: (exit code, stdout)}, other commands succeed silently
+        # unless respond emulates them
+        self.responses: Dict[str, Tuple[int, str]] = {}
+        self.files: Dict[str, bytes] = {}
+        # mode of each file when its content was written
+        self.modes: Dict[str, int] = {}
+        self.dirs: Set[str] = {"/", "/tmp"}
+        self.history: List[str] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_host_config(
+        cls,
+        hostname: str,
+        host_cfg: Dict[str, Any],
+        latency: float = 0.0,
+        now: Optional[datetime] = None,
+    ) -> "FakeServer":
+        """A server running every configured interface with all its peers"""
+        server = cls(hostname, latency)
+        now = now or datetime.utcnow()
+        wg_app_config = get_wg_from_host_cfg(host_cfg)
+        dump_lines = []
+        for wg_if_name, wg_if_dict in wg_app_config.items():
+            dump_lines.append(
+                "\t".join(
+                    [
+                        wg_if_name,
+                        wg_if_dict.get("private_key") or "(none)",
+                        wg_if_dict.get("public_key") or "(none)",
+                        str(wg_if_dict.get("server_port", 51820)),
+                        "off",
+                    ]
+                )
+            )
+            for idx, peer in enumerate(wg_if_dict.get("peers", [])):
+                for peer_cfg in peer.values():
+                    peer_ip = peer_cfg.get("peer_private_ip")
+                    dump_lines.append(
+                        "\t".join(
+                            [
+                                wg_if_name,
+                                peer_cfg["public_key"],
+                                "(none)",
+                                f"203.0.113.{idx % 250 + 1}:{1024 + idx % 60000}",
+                                f"{peer_ip.split('/', 1)[0]}/32"
+                                if peer_ip
+                                else "(none)",
+                                str(int(now.timestamp()) - idx % 3600),
+                                str(1000 * idx),
+                                str(2000 * idx),
+                                "off",
+                            ]
+                        )
+                    )
+        server.set_response("WG_STATUS", "\n".join(dump_lines) + "\n")
+        server.set_response("WG_INTERFACES", " ".join(wg_app_config) + "\n")
+        server.set_response(
+            "WIREGUARD_SVC_STATUS",
+            "".join(
+                f"wg-quick@{wg_if_name}.service loaded active exited "
+                f"WireGuard via wg-quick(8) for {wg_if_name}\n"
+                for wg_if_name in wg_app_config
+            ),
+        )
+        server.set_response(
+            "GET_UPTIME", f"{(now - timedelta(days=3)):%Y-%m-%d %H:%M:%S}\n"
+        )
+        return server
+
+    def set_response(self, cmd_name: str, stdout: str, exit_code: int = 0) -> None:
+        """Canned output of a LINUX_COMMANDS entry"""
+        self.responses[LINUX_COMMANDS[cmd_name]["cmd"]] = (exit_code, stdout)
+
+    def install(self, src: str, dst: str, mode: int = 0o600) -> None:
+        self.files[dst] = self.files[src]
+        self.modes[dst] = mode
+
+    def run_script(self, script_path: str, args: List[str]) -> int:
+        """
+        Emulate an uploaded script: deploy_wireguard.sh installs the uploaded
+        configs, other scripts have their `install -m` lines applied.
+        """
+        script = self.files.get(script_path)
+        if script is None:
+            return 127
+        if script.decode() == load_resource("deploy_wireguard.sh", scripts):
+            tmp_dir, wg_if_names = args[0], args[1:]
+            if not wg_if_names:
+                wg_if_names = [
+                    posixpath.basename(path)[: -len(".conf")]
+                    for path in self.files
+                    if posixpath.dirname(path) == tmp_dir and path.endswith(".conf")
+                ]
+            for wg_if_name in wg_if_names:
+                src = posixpath.join(tmp_dir, f"{wg_if_name}.conf")
+                self.install(src, posixpath.join(WG_CONFIG_DIR, f"{wg_if_name}.conf"))
+                del self.files[src]
+                del self.modes[src]
+            return 0
+        for line in script.decode().splitlines():
+            if match := INSTALL_RE.match(line):
+                self.install(match["src"], match["dst"], int(match["mode"], 8))
+        return 0
+
+    def config_checksums(self) -> str:
+        """WG_CONFIG_CHECKSUMS output for the installed configs"""
+        return "".join(
+            f"{posixpath.basename(path)[: -len('.conf')]} "
+            f"{config_hash(data.decode())}  -\n"
+            for path, data in sorted(self.files.items())
+            if posixpath.dirname(path) == WG_CONFIG_DIR and path.endswith(".conf")
+        )
+
+    def respond(self, cmd: str) -> Tuple[int, str]:
+        with self._lock:
+            self.history.append(cmd)
+        if cmd in self.responses:
+            return self.responses[cmd]
+        if cmd == LINUX_COMMANDS["WG_CONFIG_CHECKSUMS"]["cmd"]:
+            return 0, self.config_checksums()
+        if match := RUNSCRIPT_RE.match(cmd):
+            args = shlex.split(match["cmd"])
+            if args[:2] == ["sudo", "su"]:
+                args = shlex.split(args[3])
+            exit_code = self.run_script(args[0], args[1:])
+            self.files.pop(args[0], None)
+            self.modes.pop(args[0], None)
+            return exit_code, ""
+
+        # a Host.run_linux_cmds batch
+        lines = cmd.split("\n")
+        if not BATCH_ECHO_RE.match(lines[0]):
+            return 0, ""
+        out = io.StringIO()
+        exit_code = 0
+        for line in lines:
+            if match := BATCH_ECHO_RE.match(line):
+                out.write(f"{match['text']}\n")
+            elif match := BATCH_CMD_RE.match(line):
+                exit_code, stdout = self.responses.get(match["cmd"], (0, ""))
+                out.write(stdout)
+            elif match := BATCH_RC_RE.match(line):
+                out.write(f"\n{match['marker']} {exit_code}\n")
+        return 0, out.getvalue()
+
+
+class FakeSFTPFile:
+    def __init__(self, server: FakeServer, path: str) -> None:
+        self.server = server
+        self.path = path
+        # created with the usual umask
+        self.mode = 0o644
+        self._written_mode: Optional[int] = None
+        self._buf = io.BytesIO()
+
+    def chmod(self, mode: int) -> None:
+        self.mode = mode
+
+    def set_pipelined(self, pipelined: bool = True) -> None:
+        pass
+
+    def write(self, data: bytes) -> None:
+        if self._written_mode is None:
+            self._written_mode = self.mode
+        self._buf.write(data)
+
+    def __enter__(self) -> "FakeSFTPFile":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.server.files[self.path] = self._buf.getvalue()
+        self.server.modes[self.path] = (
+            self.mode if self._written_mode is None else self._written_mode
+        )
+
+
+class FakeSFTPClient:
+    """The subset of paramiko.SFTPClient used by Host.put_files"""
+
+    def __init__(self, server: FakeServer) -> None:
+        self.server = server
+
+    def stat(self, path: str) -> None:
+        if path not in self.server.dirs and path not in self.server.files:
+            raise FileNotFoundError(path)
+
+    def mkdir(self, path: str, mode: int = 0o777) -> None:
+        self.server.dirs.add(path)
+
+    def open(self, path: str, mode: str = "r") -> FakeSFTPFile:
+        time.sleep(self.server.latency)
+        if posixpath.dirname(path) not in self.server.dirs:
+            raise FileNotFoundError(path)
+        return FakeSFTPFile(self.server, path)
+
+    def posix_rename(self, old_path: str, new_path: str) -> None:
+        self.server.files[new_path] = self.server.files.pop(old_path)
+        self.server.modes[new_path] = self.server.modes.pop(old_path)
+
+    def close(self) -> None:
+        pass
+
+
+class FakeClient:
+    def __init__(self, server: FakeServer) -> None:
+        self.server = server
+
+    def open_sftp(self) -> FakeSFTPClient:
+        return FakeSFTPClient(self.server)
+
+
+class FakeConnection:
+    """The subset of fabric.Connection used by Host"""
+
+    def __init__(self, server: FakeServer, connect_latency: float = 0.0) -> None:
+        self.server = server
+        self.host = server.hostname
+        self.client = FakeClient(server)
+        self.connect_latency = connect_latency
+        self.is_connected = False
+
+    def open(self) -> None:
+        time.sleep(self.connect_latency)
+        self.is_connected = True
+
+    def close(self) -> None:
+        self.is_connected = False
+
+    def run(self, cmd: str, hide: Any = None, warn: bool = False) -> Result:
+        time.sleep(self.server.latency)
+        exit_code, stdout = self.server.respond(cmd)
+        result = Result(stdout=stdout, command=cmd, exited=exit_code)
+        if exit_code and not warn:
+            raise UnexpectedExit(result)
+        return result
+
+
+class FakeConnectionPool(ConnectionPool):
+    def __init__(
+        self,
+        servers: Dict[str, FakeServer],
+        connect_latency: float = 0.0,
+        max_channels: int = DEFAULT_MAX_CHANNELS,
+    ) -> None:
+        super().__init__(max_channels=max_channels)
+        self.servers = servers
+        self.connect_latency = connect_latency
+
+    def _new_connection(self, hostname: str, user: str, private_key: str) -> Any:
+        if hostname not in self.servers:
+            raise OSError(f"{hostname}: no such fake host")
+        return FakeConnection(self.servers[hostname], self.connect_latency)
+
+    def _open(self, connection: Any) -> None:
+        connection.close()
+        connection.open()
+
+
+def fake_fleet(
+    config: Dict[str, Any], latency: float = 0.0, connect_latency: float = 0.0
+) -> FakeConnectionPool:
+    """Pool of fake servers for every host of a loaded VPN config"""
+    now = datetime.utcnow()
+    return FakeConnectionPool(
+        {
+            hostname: FakeServer.from_host_config(hostname, host_cfg, latency, now)
+            for hostname, host_cfg in config.items()
+        },
+        connect_latency,
+    )
@@ -1,7 +1,9 @@
+import os
 import logging
 import inspect
+import multiprocessing
 from os import path
-from typing import Any, Callable, Dict, Iterable
+from typing import Any, Callable, Dict, Iterable, Union
 from types import ModuleType
 
 import yaml
@@ -9,6 +11,41 @@ import yaml
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CACHE_DIR = path.join(path.expanduser("~"), ".cache", "vpntools")
+
+# libyaml based loader is an order of magnitude faster than the pure Python one
+YAML_SAFE_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def get_process_pool_context() -> multiprocessing.context.BaseContext:
+    """
+    Start method for process pools: forking after CONNECT_HOSTS would copy the
+    locks of live paramiko and worker threads into the children, so workers
+    come from a forkserver (spawn where there is none).
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def write_private_file(
+    file_path: str, data: Union[bytes, str], atomic: bool = True
+) -> None:
+    """
+    Write data to a file readable by the owner only, creating missing parent
+    directories (0700). With atomic set the data goes to a temporary file first
+    and is renamed over file_path, readers never see a partial file.
+    """
+    dir_path = path.dirname(file_path)
+    if dir_path:
+        os.makedirs(dir_path, mode=0o700, exist_ok=True)
+    tmp_path = f"{file_path}.{os.getpid()}.tmp" if atomic else file_path
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data.encode() if isinstance(data, str) else data)
+    if atomic:
+        os.replace(tmp_path, file_path)
+
 
 def load_resource(filename: str, resource_module: ModuleType) -> str:
     logger.debug("Loading a resource file %r.%s", resource_module, filename)
@@ -23,8 +60,26 @@ def get_resource_path(filename: str, resource_module: ModuleType) -> str:
     return path.join(path.dirname(resource_module.__file__), filename)
 
 
-def yaml_to_dict(yaml_str: str) -> Dict:
-    return yaml.safe_load(yaml_str)
+def yaml_to_dict(yaml_str: Union[str, bytes]) -> Dict:
+    return yaml.load(yaml_str, Loader=YAML_SAFE_LOADER)
+
+
+class _BlockStyleDumper(yaml.SafeDumper):
+    """Keeps multiline strings (e.g. ssh_private_key) as literal blocks"""
+
+
+_BlockStyleDumper.add_representer(
+    str,
+    lambda dumper, data: dumper.represent_scalar(
+        "tag:yaml.org,2002:str", data, style="|" if "\n" in data else None
+    ),
+)
+
+
+def dict_to_yaml(data: Dict) -> str:
+    return yaml.dump(
+        data, Dumper=_BlockStyleDumper, sort_keys=False, default_flow_style=False
+    )
 
 
 def filter_dict(old_dict: Dict[Any, Any], keys: Iterable[Any]) -> Dict[Any, Any]:
@@ -1,86 +1,282 @@
-import io
+import shlex
 import logging
-from typing import Any, Dict, Optional, Union, IO
+import posixpath
+import threading
+import uuid
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    IO,
+)
 from datetime import datetime
-from tempfile import TemporaryFile
 
 from fabric import Connection
-from paramiko.ed25519key import Ed25519Key
 
 from vpntools.cmds import LINUX_COMMANDS
+from vpntools.result_cache import ResultCache, get_max_age
+from vpntools.sshpool import CONNECTION_POOL, ConnectionPool, PoolEntry
+from vpntools.tracing import TRACER
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s:%(message)s"
-)
 logger = logging.getLogger(__name__)
 
 
+class RemoteFile(NamedTuple):
+    path: str
+    data: Union[bytes, str]
+    mode: int = 0o600
+
+
 class Host:
-    TMP_SCRIPT_PATH = "/tmp/tmp_script.sh"
     TMP_DATA_DIR = "/tmp"
 
     def __init__(
-        self, hostname: str, config: Dict[str, Union[str, int, float]]
+        self,
+        hostname: str,
+        config: Dict[str, Union[str, int, float]],
+        pool: ConnectionPool = CONNECTION_POOL,
+        result_cache: Optional[ResultCache] = None,
+        max_age: Optional[float] = None,
+        refresh: bool = False,
     ) -> None:
         self.hostname: str = hostname
         self.config: Dict[str, Union[str, int, float]] = config
+        self.pool: ConnectionPool = pool
+        # LINUX_COMMANDS results are served from result_cache while younger
+        # than max_age (the command's ttl by default); refresh only stores them
+        self.result_cache: Optional[ResultCache] = result_cache
+        self.max_age: Optional[float] = max_age
+        self.refresh: bool = refresh
         self.connection: Optional[Connection] = None
+        self._channels: Optional[threading.BoundedSemaphore] = None
+        # remote temporary files of this run go there, see tmp_path
+        self.tmp_dir: str = posixpath.join(
+            self.TMP_DATA_DIR, f"vpntools-{uuid.uuid4().hex[:12]}"
+        )
 
-    def connect(self) -> None:
-        connect_kwargs = {
-            "pkey": Ed25519Key.from_private_key(
-                file_obj=io.StringIO(self.config["ssh_private_key"])
-            )
-        }
+    def _use_entry(self, entry: PoolEntry) -> None:
+        self.connection = entry.connection
+        self._channels = entry.channels
 
+    def connect(self) -> None:
         if not self.connection or not self.connection.is_connected:
-            self.connection = Connection(
-                self.hostname,
-                user=self.config["ssh_user"],
-                connect_kwargs=connect_kwargs,
-            )
-            logger.info("Connected: %s", self.hostname)
+            with TRACER.span("connect", "ssh", hostname=self.hostname):
+                self._use_entry(
+                    self.pool.acquire(
+                        self.hostname,
+                        self.config["ssh_user"],
+                        self.config["ssh_private_key"],
+                    )
+                )
 
     def reconnect(self) -> None:
-        if self.connection and self.connection.is_connected:
-            self.connection.close()
-        self.connection.open()
+        self._use_entry(
+            self.pool.reconnect(
+                self.hostname,
+                self.config["ssh_user"],
+                self.config["ssh_private_key"],
+            )
+        )
         logger.info("Reconnected: %s", self.hostname)
 
     def run(self, cmd: str, hide: str = "both", warn: bool = False) -> Any:
-        res = self.connection.run(cmd, hide=hide, warn=warn)
+        self.connect()
+        with TRACER.span("run", "ssh", hostname=self.hostname, command=cmd) as span:
+            with self._channels:
+                res = self.connection.run(cmd, hide=hide, warn=warn)
+            span.bytes_sent = len(cmd.encode())
+            span.bytes_received = len(res.stdout.encode()) + len(res.stderr.encode())
+            span.exit_code = res.exited
         return res
 
+    def _get_cached(self, cmd_name: str) -> Optional[str]:
+        if self.result_cache is None or self.refresh:
+            return None
+        return self.result_cache.get(
+            self.hostname,
+            LINUX_COMMANDS[cmd_name]["cmd"],
+            get_max_age(cmd_name, self.max_age),
+        )
+
+    def _set_cached(self, cmd_name: str, stdout: str) -> None:
+        cmd_bundle = LINUX_COMMANDS[cmd_name]
+        if self.result_cache is None or not cmd_bundle.get("ttl"):
+            return
+        redact = cmd_bundle.get("redact")
+        self.result_cache.set(
+            self.hostname, cmd_bundle["cmd"], redact(stdout) if redact else stdout
+        )
+
     def run_linux_cmd(self, cmd_name: str) -> Any:
         cmd_bundle = LINUX_COMMANDS[cmd_name]
-        res = self.run(cmd_bundle["cmd"])
+        with TRACER.span(
+            "run_linux_cmd", "host", hostname=self.hostname, command=cmd_name
+        ):
+            stdout = self._get_cached(cmd_name)
+            if stdout is None:
+                stdout = self.run(cmd_bundle["cmd"]).stdout
+                self._set_cached(cmd_name, stdout)
         if cmd_bundle["parser"]:
-            return cmd_bundle["parser"](res.stdout)
-        return res.stdout
+            return cmd_bundle["parser"](stdout)
+        return stdout
+
+    def run_linux_cmds(self, cmd_names: Iterable[str]) -> Dict[str, Any]:
+        """
+        Run several LINUX_COMMANDS in a single remote invocation.
+
+        Each command runs in its own subshell, its stdout is framed by a random
+        marker and passed to the registered parser after the round-trip.
+        Commands with a usable cached result are left out of the invocation,
+        there is none at all when every result is cached.
+        """
+        cmd_names = list(cmd_names)
+        outputs: Dict[str, str] = {}
+        for cmd_name in cmd_names:
+            stdout = self._get_cached(cmd_name)
+            if stdout is not None:
+                outputs[cmd_name] = stdout
+        missing = [cmd_name for cmd_name in cmd_names if cmd_name not in outputs]
+
+        if missing:
+            marker = f"__VPNTOOLS_{uuid.uuid4().hex}__"
+            script_lines: List[str] = []
+            for cmd_name in missing:
+                script_lines.append(f"echo '{marker} {cmd_name}'")
+                script_lines.append(f"( {LINUX_COMMANDS[cmd_name]['cmd']} )")
+                script_lines.append(f"printf '\\n%s %s\\n' '{marker}' \"$?\"")
+
+            with TRACER.span(
+                "run_linux_cmds",
+                "host",
+                hostname=self.hostname,
+                command=",".join(missing),
+            ):
+                res = self.run("\n".join(script_lines), warn=True)
+            sections = split_batch_output(res.stdout, marker)
+
+            for cmd_name in missing:
+                if cmd_name not in sections:
+                    raise RuntimeError(
+                        f"{self.hostname}: no output for {cmd_name}, "
+                        f"exit code {res.exited}"
+                    )
+                exit_code, stdout = sections[cmd_name]
+                if exit_code:
+                    raise RuntimeError(
+                        f"{self.hostname}: {cmd_name} failed with exit code {exit_code}"
+                    )
+                outputs[cmd_name] = stdout
+                self._set_cached(cmd_name, stdout)
+
+        ret = {}
+        for cmd_name in cmd_names:
+            parser = LINUX_COMMANDS[cmd_name]["parser"]
+            ret[cmd_name] = parser(outputs[cmd_name]) if parser else outputs[cmd_name]
+        return ret
+
+    def put_files(self, files: Iterable[RemoteFile]) -> None:
+        """
+        Upload in-memory files over a single SFTP session.
+
+        Each file is written to a temporary name next to its target, which gets
+        its mode before any data is written, and is renamed over the target, so
+        readers never see a partial file. Missing parent directories are
+        created (0700).
+        """
+        files = list(files)
+        self.connect()
+        with TRACER.span(
+            "put_files",
+            "ssh",
+            hostname=self.hostname,
+            command=",".join(remote_file.path for remote_file in files),
+        ) as span, self._channels:
+            sftp = self.connection.client.open_sftp()
+            try:
+                dirs: Set[str] = set()
+                for remote_file in files:
+                    logger.info(
+                        "%s: Uploading file %s", self.hostname, remote_file.path
+                    )
+                    parent = posixpath.dirname(remote_file.path)
+                    if parent not in dirs:
+                        try:
+                            sftp.stat(parent)
+                        except FileNotFoundError:
+                            sftp.mkdir(parent, mode=0o700)
+                        dirs.add(parent)
+
+                    data = remote_file.data
+                    if isinstance(data, str):
+                        data = data.encode()
+                    tmp_path = f"{remote_file.path}.{uuid.uuid4().hex[:8]}.tmp"
+                    with sftp.open(tmp_path, "wb") as f:
+                        # still empty, the umask mode never covers any data
+                        f.chmod(remote_file.mode)
+                        f.set_pipelined(True)
+                        f.write(data)
+                    sftp.posix_rename(tmp_path, remote_file.path)
+                    span.bytes_sent += len(data)
+            finally:
+                sftp.close()
+
+    def tmp_path(self, name: str) -> str:
+        """Path in the remote temporary directory of this run"""
+        return posixpath.join(self.tmp_dir, name)
 
     def transfer_file(
-        self, local_path: Union[str, IO], remote_path: str, chmod: Optional[str] = None
+        self, local_path: Union[str, IO], remote_path: str, mode: int = 0o600
     ) -> None:
-        logger.info("%s: Uploading file %s", self.hostname, remote_path)
-        self.connection.put(local_path, remote_path, preserve_mode=False)
+        self.put_files([RemoteFile(remote_path, read_local_file(local_path), mode)])
 
-        if chmod:
-            self.run(f"chmod {chmod} {remote_path}")
+    def script_file(
+        self, local_path: Union[str, IO], remote_path: Optional[str] = None
+    ) -> RemoteFile:
+        """
+        RemoteFile of an executable script. By default it goes under a unique
+        name in the run's temporary directory, so concurrent runs on one host
+        do not overwrite each other's scripts.
+        """
+        if remote_path is None:
+            remote_path = self.tmp_path(f"script-{uuid.uuid4().hex[:8]}.sh")
+        return RemoteFile(remote_path, read_local_file(local_path), 0o700)
 
     def runscript(
         self,
         local_path: Union[str, IO],
         remote_path: Optional[str] = None,
         root: bool = False,
+        args: Iterable[str] = (),
     ) -> Any:
-        if remote_path is None:
-            remote_path = type(self).TMP_SCRIPT_PATH
-        self.transfer_file(local_path, remote_path, chmod="+x")
+        """
+        Upload and run a script with args, see script_file and
+        run_uploaded_script. To upload it along other files in one SFTP
+        session, pass its script_file to put_files and run it with
+        run_uploaded_script instead.
+        """
+        script = self.script_file(local_path, remote_path)
+        self.put_files([script])
+        return self.run_uploaded_script(script.path, root=root, args=args)
+
+    def run_uploaded_script(
+        self, remote_path: str, root: bool = False, args: Iterable[str] = ()
+    ) -> Any:
+        """Run an already uploaded script with args, removing it afterwards"""
         logger.info("%s: Executing script %s", self.hostname, remote_path)
+        cmd = " ".join(shlex.quote(arg) for arg in (remote_path, *args))
         if root:
-            res = self.run(f"sudo su -c {remote_path} root")
-        else:
-            res = self.run(remote_path)
+            cmd = f"sudo su -c {shlex.quote(cmd)} root"
+        # the temporary directory goes away with its last file
+        cleanup = f"rm -f {shlex.quote(remote_path)}"
+        if posixpath.dirname(remote_path) == self.tmp_dir:
+            cleanup += f"; rmdir --ignore-fail-on-non-empty {shlex.quote(self.tmp_dir)}"
+        res = self.run(f"{cmd}; rc=$?; {cleanup}; exit $rc")
 
         if res.ok:
             logger.info("%s: Returned OK from %s", self.hostname, remote_path)
@@ -88,11 +284,41 @@ class Host:
             logger.error("%s: Returned Fail from %s", self.hostname, remote_path)
         return res
 
-    def put_data_into_file(self, data_str: str, remote_path: str) -> None:
-        with TemporaryFile() as f:
-            logger.info("%s: Writing data to a tmp file", self.hostname)
-            f.write(data_str.encode())
-            self.transfer_file(f, remote_path)
+    def put_data_into_file(
+        self, data_str: str, remote_path: str, mode: int = 0o600
+    ) -> None:
+        self.put_files([RemoteFile(remote_path, data_str, mode)])
 
     def get_uptime(self) -> datetime:
         return self.run_linux_cmd("GET_UPTIME")
+
+
+def read_local_file(local_path: Union[str, IO]) -> bytes:
+    """Content of a local path or of an already open (binary) file"""
+    if isinstance(local_path, str):
+        with open(local_path, "rb") as f:
+            return f.read()
+    return local_path.read()
+
+
+def split_batch_output(stdout: str, marker: str) -> Dict[str, Tuple[int, str]]:
+    """
+    Split the stdout of Host.run_linux_cmds into {cmd_name: (exit_code, stdout)}.
+    """
+    sections = {}
+    begin_tag = f"{marker} "
+    end_tag = f"\n{marker} "
+    pos = stdout.find(begin_tag)
+    while pos != -1:
+        name_end = stdout.index("\n", pos)
+        cmd_name = stdout[pos + len(begin_tag) : name_end]
+        end = stdout.index(end_tag, name_end)
+        rc_end = stdout.find("\n", end + len(end_tag))
+        if rc_end == -1:
+            rc_end = len(stdout)
+        sections[cmd_name] = (
+            int(stdout[end + len(end_tag) : rc_end]),
+            stdout[name_end + 1 : end],
+        )
+        pos = stdout.find(begin_tag, rc_end)
+    return sections
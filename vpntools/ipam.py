@@ -0,0 +1,171 @@
+import logging
+import ipaddress
+from typing import Any, Dict, List, Set, Tuple, Union
+
+from vpntools.wireguard import get_wg_from_host_cfg
+
+
+logger = logging.getLogger(__name__)
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class AddressError(ValueError):
+    pass
+
+
+class AddressPool:
+    """
+    Free list of an interface subnet: the set of used offsets into the subnet
+    plus a cursor below which every address is taken.
+
+    Memory grows with the addresses in use, not with the subnet size, so an
+    IPv6 /64 costs as much as an IPv4 /24. Lookups are O(1) and allocations
+    move the cursor forward, filling tens of thousands of peers in one pass.
+    """
+
+    def __init__(self, network: IPNetwork) -> None:
+        self.network = network
+        self._base = int(network.network_address)
+        self._size = network.num_addresses
+        self._used: Set[int] = set()
+        self._next_free = 0
+        if network.version == 4 and network.prefixlen < 31:
+            # network and broadcast addresses
+            self._used.update((0, self._size - 1))
+        elif network.version == 6 and network.prefixlen < 127:
+            # Subnet-Router anycast address (RFC 4291), /127 links use both
+            self._used.add(0)
+
+    def __contains__(self, ip_int: int) -> bool:
+        return 0 <= ip_int - self._base < self._size
+
+    def mark(self, ip_int: int) -> bool:
+        """Mark an address used, False if it already was"""
+        offset = ip_int - self._base
+        if offset in self._used:
+            return False
+        self._used.add(offset)
+        return True
+
+    def allocate(self) -> int:
+        offset = self._next_free
+        while offset in self._used:
+            offset += 1
+        if offset >= self._size:
+            raise AddressError(f"No free addresses left in {self.network}")
+        self._used.add(offset)
+        self._next_free = offset + 1
+        return self._base + offset
+
+
+def parse_ip_int(ip_with_prefix: str) -> Tuple[int, int]:
+    """Parse "192.168.1.2/24" into (int address, ip version)"""
+    ip = ipaddress.ip_address(ip_with_prefix.split("/", 1)[0].strip())
+    return int(ip), ip.version
+
+
+def allocate_peer_ips(config: Dict[str, Any]) -> int:
+    """
+    Validate peer addresses of all hosts and fill in the missing ones.
+
+    Every address is checked in a single pass: it has to be inside the
+    interface's server_private_ip subnet and unique on its host, across all of
+    the host's interfaces. Peers without peer_private_ip get the next free
+    address of their interface subnet. Addresses reused on different hosts are
+    only counted, separate servers may legitimately share private ranges.
+
+    Raises AddressError listing every problem found. Returns the number of
+    addresses allocated.
+    """
+    errors: List[str] = []
+    fleet_owners: Dict[Tuple[int, int], str] = {}
+    shared = 0
+    missing: List[Tuple[AddressPool, Dict[str, Any]]] = []
+
+    for hostname, host_cfg in config.items():
+        host_owners: Dict[Tuple[int, int], str] = {}
+        networks: Dict[str, IPNetwork] = {}
+
+        for wg_if_name, wg_if_dict in get_wg_from_host_cfg(host_cfg).items():
+            server_if = ipaddress.ip_interface(wg_if_dict["server_private_ip"])
+            for other_if_name, other_network in networks.items():
+                if server_if.network.overlaps(other_network):
+                    errors.append(
+                        f"{hostname}: {wg_if_name} subnet {server_if.network} "
+                        f"overlaps {other_if_name} subnet {other_network}"
+                    )
+            networks[wg_if_name] = server_if.network
+
+            pool = AddressPool(server_if.network)
+            entries = [
+                (
+                    f"{wg_if_name}/server",
+                    int(server_if.ip),
+                    server_if.version,
+                    wg_if_dict["server_private_ip"],
+                )
+            ]
+            for peer in wg_if_dict.get("peers", []):
+                for peer_name, peer_cfg in peer.items():
+                    if not peer_cfg.get("peer_private_ip"):
+                        missing.append((pool, peer_cfg))
+                        continue
+                    try:
+                        ip_int, version = parse_ip_int(peer_cfg["peer_private_ip"])
+                    except ValueError as err:
+                        errors.append(f"{hostname}: {wg_if_name}/{peer_name}: {err}")
+                        continue
+                    entries.append(
+                        (
+                            f"{wg_if_name}/{peer_name}",
+                            ip_int,
+                            version,
+                            peer_cfg["peer_private_ip"],
+                        )
+                    )
+
+            for owner, ip_int, version, ip_str in entries:
+                if version != server_if.version or ip_int not in pool:
+                    errors.append(
+                        f"{hostname}: {owner} address {ip_str} "
+                        f"is outside of {pool.network}"
+                    )
+                    continue
+                key = (version, ip_int)
+                if key in host_owners:
+                    errors.append(
+                        f"{hostname}: {owner} address {ip_str} "
+                        f"is already used by {host_owners[key]}"
+                    )
+                    continue
+                if not pool.mark(ip_int):
+                    errors.append(
+                        f"{hostname}: {owner} address {ip_str} is reserved "
+                        f"in {pool.network}"
+                    )
+                    continue
+                host_owners[key] = owner
+                if key in fleet_owners:
+                    shared += 1
+                    logger.debug(
+                        "%s: %s address %s is also used by %s",
+                        hostname,
+                        owner,
+                        ip_str,
+                        fleet_owners[key],
+                    )
+                else:
+                    fleet_owners[key] = f"{hostname}: {owner}"
+
+    if errors:
+        raise AddressError("Invalid peer addresses:\n" + "\n".join(errors))
+    if shared:
+        logger.info("%d address(es) are used on more than one host", shared)
+
+    for pool, peer_cfg in missing:
+        ip_address = ipaddress.ip_address(pool.allocate())
+        peer_cfg["peer_private_ip"] = f"{ip_address}/{pool.network.prefixlen}"
+    if missing:
+        logger.info("Allocated %d peer address(es)", len(missing))
+    return len(missing)
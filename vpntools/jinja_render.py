@@ -1,19 +1,48 @@
+import os
+from functools import lru_cache
 from typing import Any, Dict, Optional
 import jinja2
 from jinja2 import StrictUndefined
 
+from vpntools.tracing import TRACER
+
+# path to a bundle made by compile_template_bundle, used instead of the sources
+TEMPLATE_BUNDLE_ENV = "VPNTOOLS_TEMPLATE_BUNDLE"
+
+
+@lru_cache(maxsize=None)
+def get_environment(bundle_path: Optional[str] = None) -> jinja2.Environment:
+    """
+    Shared Jinja environment, templates are compiled once per process.
+
+    With bundle_path, precompiled templates are loaded from it and the package
+    templates are only used as a fallback.
+    """
+    loader: jinja2.BaseLoader = jinja2.PackageLoader("vpntools", "resources/templates")
+    if bundle_path:
+        loader = jinja2.ChoiceLoader([jinja2.ModuleLoader(bundle_path), loader])
+    return jinja2.Environment(
+        loader=loader,
+        undefined=StrictUndefined,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        # templates ship with the package, no need to stat them on every lookup
+        auto_reload=False,
+    )
+
+
+def compile_template_bundle(target: str) -> None:
+    """Compile all package templates into a zip bundle at target"""
+    get_environment().compile_templates(target, extensions=["j2"], zip="deflated")
+
 
 def render_from_template(
     template_name: str,
     context_dict: Optional[Dict[str, Any]] = None,
     globals_dict: Optional[Dict[str, Any]] = None,
 ) -> str:
-    env = jinja2.Environment(
-        loader=jinja2.PackageLoader("resources", "templates"),
-        undefined=StrictUndefined,
-        trim_blocks=True,
-        lstrip_blocks=True,
-    )
-    tmpl = env.get_template(template_name)
-    tmpl.globals.update(globals_dict)
-    return tmpl.render(context_dict or {})
+    with TRACER.span("render", "template", command=template_name):
+        env = get_environment(os.environ.get(TEMPLATE_BUNDLE_ENV))
+        tmpl = env.get_template(template_name)
+        # globals are passed per render, templates are shared between renders
+        return tmpl.render({**(globals_dict or {}), **(context_dict or {})})
@@ -0,0 +1,116 @@
+import os
+import base64
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+from vpntools.helpers import get_process_pool_context
+from vpntools.wireguard import get_wg_from_host_cfg
+
+
+logger = logging.getLogger(__name__)
+
+KEY_SIZE = 32
+
+# below this number of keys a process pool costs more than it saves
+MIN_PARALLEL_KEYS = 20000
+
+
+def clamp_private_key(raw_key: bytes) -> bytes:
+    """Curve25519 clamping, the same `wg genkey` applies"""
+    key = bytearray(raw_key)
+    key[0] &= 248
+    key[31] = (key[31] & 127) | 64
+    return bytes(key)
+
+
+def derive_public_key(private_key: str) -> str:
+    """`wg pubkey` equivalent, keys are base64 encoded"""
+    private = X25519PrivateKey.from_private_bytes(base64.b64decode(private_key))
+    return base64.b64encode(
+        private.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    ).decode()
+
+
+def generate_keypair() -> Tuple[str, str]:
+    """(private key, public key) like `wg genkey | tee privatekey | wg pubkey`"""
+    return _generate_keypairs(1)[0]
+
+
+def _generate_keypairs(count: int) -> List[Tuple[str, str]]:
+    random_bytes = os.urandom(KEY_SIZE * count)
+    keypairs = []
+    for offset in range(0, KEY_SIZE * count, KEY_SIZE):
+        raw_key = clamp_private_key(random_bytes[offset : offset + KEY_SIZE])
+        public_key = (
+            X25519PrivateKey.from_private_bytes(raw_key)
+            .public_key()
+            .public_bytes(Encoding.Raw, PublicFormat.Raw)
+        )
+        keypairs.append(
+            (base64.b64encode(raw_key).decode(), base64.b64encode(public_key).decode())
+        )
+    return keypairs
+
+
+def generate_keypairs(
+    count: int, processes: Optional[int] = None
+) -> List[Tuple[str, str]]:
+    """
+    Generate count key pairs, spread over a process pool for large batches when
+    more than one worker process is available (processes, the CPU count by
+    default). See clients.build_client_artifacts about the __main__ guard.
+    """
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or count < MIN_PARALLEL_KEYS:
+        return _generate_keypairs(count)
+
+    chunk_size, remainder = divmod(count, processes)
+    chunks = [chunk_size + (idx < remainder) for idx in range(processes)]
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=get_process_pool_context()
+    ) as executor:
+        return [
+            keypair
+            for keypairs in executor.map(_generate_keypairs, chunks)
+            for keypair in keypairs
+        ]
+
+
+def fill_missing_keys(config: Dict[str, Any], processes: Optional[int] = None) -> int:
+    """
+    Fill missing private_key/public_key of server interfaces and peers in place.
+
+    An entry without any key gets a new key pair, an entry with only the
+    private_key gets the matching public_key. An entry with only the public_key
+    (a client that made its own keys) is left alone. Returns the number of
+    generated key pairs.
+    """
+    missing: List[Dict[str, Any]] = []
+    for host_cfg in config.values():
+        for wg_if_dict in get_wg_from_host_cfg(host_cfg).values():
+            key_entries = [wg_if_dict] + [
+                peer_cfg
+                for peer in wg_if_dict.get("peers", [])
+                for peer_cfg in peer.values()
+            ]
+            for key_entry in key_entries:
+                if not key_entry.get("private_key"):
+                    if not key_entry.get("public_key"):
+                        missing.append(key_entry)
+                elif not key_entry.get("public_key"):
+                    key_entry["public_key"] = derive_public_key(
+                        key_entry["private_key"]
+                    )
+
+    for key_entry, (private_key, public_key) in zip(
+        missing, generate_keypairs(len(missing), processes)
+    ):
+        key_entry["private_key"] = private_key
+        key_entry["public_key"] = public_key
+    if missing:
+        logger.info("Generated %d Wireguard key pair(s)", len(missing))
+    return len(missing)
@@ -0,0 +1,104 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_LISTEN = "127.0.0.1"
+DEFAULT_PORT = 9586
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def format_value(value: float) -> str:
+    if value != value:  # NaN
+        return "NaN"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsText:
+    """
+    Builder of the Prometheus text exposition format.
+
+    Samples are grouped by metric name, so HELP and TYPE are written once per
+    metric however the samples were added.
+    """
+
+    def __init__(self) -> None:
+        self._families: Dict[str, Tuple[str, str, List[str]]] = {}
+
+    def add(
+        self, name: str, metric_type: str, help_text: str, value: float, **labels: str
+    ) -> None:
+        if name not in self._families:
+            self._families[name] = (metric_type, help_text, [])
+        if labels:
+            label_str = ",".join(
+                f'{key}="{escape_label_value(str(val))}"' for key, val in labels.items()
+            )
+            sample = f"{name}{{{label_str}}} {format_value(value)}"
+        else:
+            sample = f"{name} {format_value(value)}"
+        self._families[name][2].append(sample)
+
+    def render(self) -> str:
+        lines = []
+        for name, (metric_type, help_text, samples) in self._families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines += samples
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    HTTP endpoint serving /metrics from a payload callable.
+
+    The callable is expected to return an already rendered (cached) payload, a
+    scrape never waits for the hosts.
+    """
+
+    def __init__(
+        self,
+        get_payload: Callable[[], bytes],
+        listen: str = DEFAULT_LISTEN,
+        port: int = DEFAULT_PORT,
+    ) -> None:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                payload = get_payload()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format: str, *args) -> None:
+                # pylint: disable=redefined-builtin
+                logger.debug("%s %s", self.address_string(), format % args)
+
+        self.httpd = ThreadingHTTPServer((listen, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    def start(self) -> None:
+        self._thread.start()
+        logger.info("Serving metrics on http://%s:%d/metrics", *self.address)
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
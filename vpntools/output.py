@@ -0,0 +1,130 @@
+import csv
+import sys
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, IO, List, Optional, Sequence
+
+
+OUTPUT_FORMATS = ("table", "json", "ndjson", "csv")
+QR_FORMATS = ("png", "svg", "ansi")
+QR_FILE_EXT = {"png": "png", "svg": "svg", "ansi": "txt"}
+
+# union of host and peer record fields, the CSV header
+STATUS_FIELDS = (
+    "type",
+    "hostname",
+    "description",
+    "uptime_seconds",
+    "interfaces",
+    "interface",
+    "peer",
+    "known",
+    "public_key",
+    "endpoint",
+    "allowed_ips",
+    "latest_handshake",
+    "transfer_rx",
+    "transfer_tx",
+)
+
+# host and interface records of `plan`
+PLAN_FIELDS = (
+    "type",
+    "hostname",
+    "interface",
+    "action",
+    "reason",
+    "peers_added",
+    "peers_updated",
+    "peers_removed",
+    "restarts",
+    "upload_bytes",
+    "round_trips",
+    "estimated_seconds",
+    "clients_new",
+    "clients_changed",
+    "clients_removed",
+)
+
+
+class RecordWriter(ABC):
+    """Writes flat dict records to a stream, see get_record_writer"""
+
+    def __init__(self, stream: Optional[IO[str]] = None) -> None:
+        self.stream = stream or sys.stdout
+
+    @abstractmethod
+    def write(self, record: Dict[str, Any]) -> None:
+        pass
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+class JsonWriter(RecordWriter):
+    """A single JSON document with records grouped by type, written on close"""
+
+    def __init__(self, stream: Optional[IO[str]] = None) -> None:
+        super().__init__(stream)
+        self._records: Dict[str, List[Dict[str, Any]]] = {}
+
+    def write(self, record: Dict[str, Any]) -> None:
+        record = dict(record)
+        self._records.setdefault(f"{record.pop('type')}s", []).append(record)
+
+    def close(self) -> None:
+        json.dump(self._records, self.stream, indent=2)
+        self.stream.write("\n")
+        super().close()
+
+
+class NdjsonWriter(RecordWriter):
+    """One JSON object per line, flushed right away for streaming consumers"""
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.stream.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.stream.flush()
+
+
+class CsvWriter(RecordWriter):
+    def __init__(
+        self, stream: Optional[IO[str]] = None, fields: Sequence[str] = STATUS_FIELDS
+    ) -> None:
+        super().__init__(stream)
+        self._writer = csv.DictWriter(
+            self.stream, fieldnames=fields, extrasaction="ignore"
+        )
+        self._writer.writeheader()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if isinstance(record.get("allowed_ips"), list):
+            record = {**record, "allowed_ips": " ".join(record["allowed_ips"])}
+        if isinstance(record.get("interfaces"), dict):
+            record = {
+                **record,
+                "interfaces": " ".join(
+                    f"{name}={state}" for name, state in record["interfaces"].items()
+                ),
+            }
+        if isinstance(record.get("restarts"), list):
+            record = {**record, "restarts": " ".join(record["restarts"])}
+        self._writer.writerow(record)
+        self.stream.flush()
+
+
+RECORD_WRITERS = {
+    "json": JsonWriter,
+    "ndjson": NdjsonWriter,
+    "csv": CsvWriter,
+}
+
+
+def get_record_writer(
+    output_format: str,
+    stream: Optional[IO[str]] = None,
+    fields: Sequence[str] = STATUS_FIELDS,
+) -> RecordWriter:
+    """fields are the CSV columns, the other formats write records as they are"""
+    if output_format == "csv":
+        return CsvWriter(stream, fields)
+    return RECORD_WRITERS[output_format](stream)
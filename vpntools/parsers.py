@@ -1,12 +1,73 @@
 import re
 import logging
-from typing import Any, Dict, List, Callable, Tuple, Optional, Union, Match
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Callable,
+    Tuple,
+    Optional,
+    Union,
+    Match,
+)
 
 
 logger: logging.Logger = logging.getLogger()
 
 
+GROUP_NAME_RE = re.compile(r"\(\?P([<=])(\w+)([>)])")
+
+
+class SubMatch:
+    """
+    View of one alternative of a combined TextParser pattern.
+
+    Group numbers and names are the ones of the original (not combined) pattern,
+    so line parsers can treat it like a re.Match of that pattern.
+    """
+
+    __slots__ = ("_match", "_offset", "_prefix")
+
+    def __init__(self, match: Match, offset: int, prefix: str) -> None:
+        self._match = match
+        self._offset = offset
+        self._prefix = prefix
+
+    def _group_ref(self, group: Union[int, str]) -> Union[int, str]:
+        if isinstance(group, int):
+            return self._offset + group
+        return self._prefix + group
+
+    def group(self, *groups: Union[int, str]) -> Any:
+        if not groups:
+            groups = (0,)
+        if len(groups) == 1:
+            return self._match.group(self._group_ref(groups[0]))
+        return tuple(self._match.group(self._group_ref(group)) for group in groups)
+
+    def __getitem__(self, group: Union[int, str]) -> Any:
+        return self.group(group)
+
+    def groupdict(self, default: Any = None) -> Dict[str, Any]:
+        return {
+            name[len(self._prefix) :]: value if value is not None else default
+            for name, value in self._match.groupdict().items()
+            if name.startswith(self._prefix)
+        }
+
+
 class TextParser:
+    """
+    Parses indented block-structured text (like `wg show`) into nested dicts.
+
+    regexp_lst holds one pattern per block level, the last one parses key/value
+    lines. All patterns are compiled into a single alternation, so every line
+    costs one match call no matter how many levels there are.
+    """
+
     def __init__(
         self,
         regexp_lst: List[str],
@@ -16,67 +77,212 @@ class TextParser:
         ] = None,
     ) -> None:
         self._regexp_lst = regexp_lst
-        self._line_proc = line_proc if line_proc else lambda x: x.strip()
-        self._line_parser = (
-            line_parser
-            if line_parser
-            else lambda x: (x.group(1).strip(), x.group(2).strip())
-        )
+        self._line_proc = line_proc if line_proc else str.strip
+        # None means the default "key: value" split, done inline in _parse_line
+        self._line_parser = line_parser
+        self._last_idx = len(regexp_lst) - 1
+        self._combined_re, self._alternatives = self._compile(regexp_lst)
         self._cur_obj: Dict[Any, Any] = {}
         self._stack: List[Dict[Any, Any]] = [self._cur_obj]
 
+    @staticmethod
+    def _compile(
+        regexp_lst: List[str],
+    ) -> Tuple["re.Pattern[str]", Dict[str, Tuple[int, int, str]]]:
+        """
+        Build "(?P<_p0>...)|(?P<_p1>...)|..." out of regexp_lst.
+
+        Named groups of every pattern get a "_<idx>_" prefix to keep them unique.
+        Returns the compiled pattern and {wrapper name: (idx, group offset, prefix)}.
+        """
+        parts = []
+        alternatives = {}
+        offset = 1
+        for idx, pattern in enumerate(regexp_lst):
+            prefix = f"_{idx}_"
+            pattern = GROUP_NAME_RE.sub(
+                lambda m, prefix=prefix: f"(?P{m[1]}{prefix}{m[2]}{m[3]}", pattern
+            )
+            wrapper = f"_p{idx}"
+            parts.append(f"(?P<{wrapper}>{pattern})")
+            alternatives[wrapper] = (idx, offset, prefix)
+            offset += re.compile(pattern).groups + 1
+        return re.compile("|".join(parts)), alternatives
+
     def _reset(self) -> None:
         self._cur_obj = {}
         self._stack = [self._cur_obj]
 
     def parse_text(self, text: str) -> Dict[Any, Any]:
+        return self.parse_lines(text.splitlines())
+
+    def parse_lines(self, lines: Iterable[str]) -> Dict[Any, Any]:
+        """Parse an iterable of lines, e.g. a file object or a command output stream"""
         self._reset()
+        line_proc = self._line_proc
+        parse_line = self._parse_line
 
-        for line in text.splitlines():
-            line = self._line_proc(line)
+        for line in lines:
+            line = line_proc(line)
             if line:
-                self._parse_line(line)
+                parse_line(line)
         return self._stack[0]
 
-    def _parse_line(self, line: str) -> None:
-        for idx, pattern in enumerate(self._regexp_lst):
+    def _match_line(self, line: str) -> Optional[Tuple[int, Match, int, str]]:
+        """Return (pattern idx, match, group offset, group name prefix)"""
+        match = self._combined_re.match(line)
+        if not match:
+            return None
+
+        idx, offset, prefix = self._alternatives[match.lastgroup]
+        if logger.isEnabledFor(logging.DEBUG):
             logger.debug(
-                "_parse_line:\nline: '%s'\npattern[%s]: '%s'", line, idx, pattern
+                "_match_line:\nline: '%s'\npattern[%s]: '%s'",
+                line,
+                idx,
+                self._regexp_lst[idx],
             )
-            match = re.match(pattern, line)
+        return idx, match, offset, prefix
 
-            if match:
-                logger.debug("_parse_line: Match!")
-
-                if idx == len(self._regexp_lst) - 1:
-                    # final level, parsing line
-                    if (
-                        len(self._stack) == len(self._regexp_lst) - 1
-                        and self._stack[-1]
-                    ):
-                        # block tags are populated
-                        key, value = self._line_parser(match)
-                        self._cur_obj[key] = value
+    def _parse_line(self, line: str) -> None:
+        matched = self._match_line(line)
+        if not matched:
+            return
+        idx, match, offset, prefix = matched
 
+        if idx == self._last_idx:
+            # final level, parsing line
+            if len(self._stack) == self._last_idx and self._stack[-1]:
+                # block tags are populated
+                if self._line_parser:
+                    key, value = self._line_parser(SubMatch(match, offset, prefix))
                 else:
-                    # not final yet, parsing a block tag
-                    key = match.group(1).strip()
-
-                    if idx == len(self._stack) - 1:
-                        # keeping block level
-                        self._stack[-1].setdefault(key, {})
-                        self._cur_obj = self._stack[-1][key]
-
-                    elif idx > len(self._stack) - 1:
-                        # increasing block level
-                        new_obj = {}
-                        self._cur_obj[key] = new_obj
-                        self._stack.append(self._cur_obj)
-                        self._cur_obj = new_obj
-
-                    elif idx < len(self._stack) - 1:
-                        # decreasing block level
-                        self._stack.pop()
-                        self._stack[-1].setdefault(key, {})
-                        self._cur_obj = self._stack[-1][key]
-                break
+                    key, value = match.group(offset + 1, offset + 2)
+                    key, value = key.strip(), value.strip()
+                self._cur_obj[key] = value
+
+        else:
+            # not final yet, parsing a block tag
+            key = match.group(offset + 1).strip()
+
+            if idx == len(self._stack) - 1:
+                # keeping block level
+                self._stack[-1].setdefault(key, {})
+                self._cur_obj = self._stack[-1][key]
+
+            elif idx > len(self._stack) - 1:
+                # increasing block level
+                new_obj = {}
+                self._cur_obj[key] = new_obj
+                self._stack.append(self._cur_obj)
+                self._cur_obj = new_obj
+
+            elif idx < len(self._stack) - 1:
+                # decreasing block level
+                self._stack.pop()
+                self._stack[-1].setdefault(key, {})
+                self._cur_obj = self._stack[-1][key]
+
+
+@dataclass
+class WgPeerRecord:
+    interface: Optional[str]
+    public_key: str
+    preshared_key: Optional[str]
+    endpoint: Optional[str]
+    allowed_ips: List[str]
+    latest_handshake: int  # epoch seconds, 0 if there was no handshake yet
+    transfer_rx: int
+    transfer_tx: int
+    persistent_keepalive: Optional[int]
+
+
+WG_DUMP_NONE = "(none)"
+WG_DUMP_HIDDEN = "(hidden)"
+
+
+def iter_wg_dump(
+    lines: Iterable[str], interface: Optional[str] = None
+) -> Iterator[WgPeerRecord]:
+    """
+    Stream peer records out of the tab-separated `wg show <if|all> dump` output.
+
+    `wg show all dump` prefixes every line with the interface name, for a single
+    interface dump the name has to be passed via the interface argument.
+    Interface lines (which carry the private key) are skipped.
+    """
+    peer_fields = 8 if interface else 9
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) != peer_fields:
+            continue
+        if interface:
+            fields.insert(0, interface)
+        (
+            if_name,
+            public_key,
+            preshared_key,
+            endpoint,
+            allowed_ips,
+            latest_handshake,
+            transfer_rx,
+            transfer_tx,
+            persistent_keepalive,
+        ) = fields
+        yield WgPeerRecord(
+            interface=if_name,
+            public_key=public_key,
+            preshared_key=None if preshared_key == WG_DUMP_NONE else preshared_key,
+            endpoint=None if endpoint == WG_DUMP_NONE else endpoint,
+            allowed_ips=[] if allowed_ips == WG_DUMP_NONE else allowed_ips.split(","),
+            latest_handshake=int(latest_handshake),
+            transfer_rx=int(transfer_rx),
+            transfer_tx=int(transfer_tx),
+            persistent_keepalive=None
+            if persistent_keepalive == "off"
+            else int(persistent_keepalive),
+        )
+
+
+def parse_wg_dump(
+    text: str, interface: Optional[str] = None
+) -> Dict[Tuple[Optional[str], str], WgPeerRecord]:
+    """
+    {(interface, public key): record}, one public key may be a peer of several
+    interfaces.
+    """
+    return {
+        (record.interface, record.public_key): record
+        for record in iter_wg_dump(text.splitlines(), interface)
+    }
+
+
+def redact_wg_dump(text: str) -> str:
+    """
+    `wg show all dump` without its secrets, to store it: interface lines (they
+    carry the private key) are dropped, preshared keys are replaced by
+    "(hidden)". parse_wg_dump reads the result like the original.
+    """
+    lines = []
+    for line in text.splitlines():
+        fields = line.split("\t")
+        if len(fields) != 9:
+            continue
+        if fields[2] != WG_DUMP_NONE:
+            fields[2] = WG_DUMP_HIDDEN
+        lines.append("\t".join(fields))
+    return "".join(f"{line}\n" for line in lines)
+
+
+def parse_wg_units(text: str) -> Dict[str, str]:
+    """
+    {interface: active state} out of
+    `systemctl list-units --all --plain --no-legend 'wg-quick@*'`
+    """
+    states = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 3 or not fields[0].startswith("wg-quick@"):
+            continue
+        states[fields[0][len("wg-quick@") :].rsplit(".service", 1)[0]] = fields[2]
+    return states
@@ -0,0 +1,105 @@
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class PeerRecord:
+    __slots__ = ("hostname", "wg_if_name", "name", "public_key", "private_ip", "config")
+
+    def __init__(
+        self,
+        hostname: str,
+        wg_if_name: str,
+        name: str,
+        public_key: str,
+        private_ip: Optional[str],
+        config: Dict[str, Any],
+    ) -> None:
+        self.hostname = hostname
+        self.wg_if_name = wg_if_name
+        self.name = name
+        self.public_key = public_key
+        # address without the prefix length
+        self.private_ip = private_ip
+        self.config = config
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.hostname}/{self.wg_if_name}/{self.name})"
+
+
+class PeerRegistry:
+    """
+    Peers of one host, indexed by public key (per interface and host-wide),
+    name and private IP.
+
+    Built once per config load and shared by status, deploy and client
+    generation instead of walking the nested peers lists again.
+    """
+
+    def __init__(self, hostname: str) -> None:
+        self.hostname = hostname
+        self._records: List[PeerRecord] = []
+        self._by_if: Dict[str, List[PeerRecord]] = {}
+        self._by_if_key: Dict[Tuple[str, str], PeerRecord] = {}
+        self._by_key: Dict[str, PeerRecord] = {}
+        self._by_name: Dict[str, PeerRecord] = {}
+        self._by_ip: Dict[str, PeerRecord] = {}
+
+    @classmethod
+    def from_wg_config(
+        cls, hostname: str, wg_app_config: Dict[str, Any]
+    ) -> "PeerRegistry":
+        registry = cls(hostname)
+        for wg_if_name, wg_if_dict in wg_app_config.items():
+            for peer in wg_if_dict.get("peers", []):
+                for peer_name, peer_cfg in peer.items():
+                    registry.add(wg_if_name, peer_name, peer_cfg)
+        return registry
+
+    def add(self, wg_if_name: str, name: str, peer_cfg: Dict[str, Any]) -> PeerRecord:
+        peer_ip = peer_cfg.get("peer_private_ip")
+        record = PeerRecord(
+            self.hostname,
+            wg_if_name,
+            name,
+            peer_cfg["public_key"],
+            peer_ip.split("/", 1)[0] if peer_ip else None,
+            peer_cfg,
+        )
+        if name in self._by_name:
+            logger.warning(
+                "%s: peer name %s is used more than once", self.hostname, name
+            )
+        self._records.append(record)
+        self._by_if.setdefault(wg_if_name, []).append(record)
+        self._by_if_key[(wg_if_name, record.public_key)] = record
+        self._by_key.setdefault(record.public_key, record)
+        self._by_name.setdefault(name, record)
+        if record.private_ip:
+            self._by_ip[record.private_ip] = record
+        return record
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[PeerRecord]:
+        return iter(self._records)
+
+    def by_interface(self, wg_if_name: str) -> Iterator[PeerRecord]:
+        return iter(self._by_if.get(wg_if_name, []))
+
+    def by_public_key(
+        self, public_key: str, wg_if_name: Optional[str] = None
+    ) -> Optional[PeerRecord]:
+        if wg_if_name is None:
+            return self._by_key.get(public_key)
+        return self._by_if_key.get((wg_if_name, public_key))
+
+    def by_name(self, name: str) -> Optional[PeerRecord]:
+        return self._by_name.get(name)
+
+    def by_ip(self, private_ip: str) -> Optional[PeerRecord]:
+        """Lookup by address, with or without the prefix length"""
+        return self._by_ip.get(private_ip.split("/", 1)[0])
@@ -0,0 +1,263 @@
+"""
+Offline preview of deploy_wg: renders server (and client) configs locally and
+compares them with the deploy state recorded by the last deployments, no host
+is contacted.
+"""
+import os
+import logging
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from vpntools.clients import ClientArtifact, get_artifact_paths
+from vpntools.deploy_cache import VERSION_KEYS, DeployStateCache, make_deploy_entry
+from vpntools.helpers import get_process_pool_context
+from vpntools.peers import PeerRegistry
+from vpntools.wireguard import (
+    WgPeerDiff,
+    build_wg_server_cfg,
+    diff_wg_peers,
+    get_desired_peers,
+    get_wg_from_host_cfg,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# rough SSH round-trips of DeployWireguard, see estimate_cost
+SSH_CONNECT_ROUND_TRIPS = 4
+SSH_EXEC_ROUND_TRIPS = 2
+SFTP_SESSION_ROUND_TRIPS = 5
+SFTP_FILE_ROUND_TRIPS = 4
+
+DEFAULT_RTT = 0.05
+
+# server configs render at ~20 us per peer while a pool of 2 workers takes
+# ~0.5 s to start, it pays off above ~60k peers (dev/benchmarks/bench_plan.py)
+MIN_PARALLEL_SERVER_PEERS = 100_000
+
+
+@dataclass
+class InterfacePlan:
+    wg_if_name: str
+    # "create", "update", "unchanged" or "remove" (deployed, no longer declared)
+    action: str
+    reason: str = ""
+    config_size: int = 0
+    # None when the deploy state has no peer list to compare with
+    peers: Optional[WgPeerDiff] = None
+
+
+@dataclass
+class ClientsPlan:
+    new: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+
+@dataclass
+class HostPlan:
+    hostname: str
+    interfaces: List[InterfacePlan] = field(default_factory=list)
+    clients: Optional[ClientsPlan] = None
+
+    @property
+    def changed(self) -> bool:
+        return any(
+            if_plan.action in ("create", "update") for if_plan in self.interfaces
+        )
+
+    @property
+    def syncable(self) -> bool:
+        """Only peers changed on running interfaces, sync_wg needs no restart"""
+        return self.changed and all(
+            if_plan.action != "create"
+            and (if_plan.action == "unchanged" or if_plan.reason == "peers")
+            for if_plan in self.interfaces
+            if if_plan.action != "remove"
+        )
+
+    def estimate_cost(
+        self, script_size: int, rtt: float = DEFAULT_RTT
+    ) -> Dict[str, Any]:
+        """
+        What deploy_wg would do to the host: changed hosts get all their configs
+        and the deploy script uploaded and every interface restarted, unchanged
+        ones are only connected to for the config checksums. The time is the
+        network part only, round-trips times rtt.
+        """
+        if not self.changed:
+            round_trips = SSH_CONNECT_ROUND_TRIPS + SSH_EXEC_ROUND_TRIPS
+            return {
+                "restarts": [],
+                "upload_bytes": 0,
+                "round_trips": round_trips,
+                "estimated_seconds": round(round_trips * rtt, 3),
+            }
+        configs = [if_plan for if_plan in self.interfaces if if_plan.action != "remove"]
+        round_trips = (
+            SSH_CONNECT_ROUND_TRIPS
+            # configs and script over one SFTP session
+            + SFTP_SESSION_ROUND_TRIPS
+            + SFTP_FILE_ROUND_TRIPS * (len(configs) + 1)
+            + SSH_EXEC_ROUND_TRIPS
+        )
+        return {
+            "restarts": [f"wg-quick@{if_plan.wg_if_name}" for if_plan in configs],
+            "upload_bytes": sum(if_plan.config_size for if_plan in configs)
+            + script_size,
+            "round_trips": round_trips,
+            "estimated_seconds": round(round_trips * rtt, 3),
+        }
+
+
+def render_host_configs(hostname: str, host_cfg: Dict[str, Any]) -> Dict[str, str]:
+    """{interface: rendered server config} of a host"""
+    return {
+        wg_if_name: build_wg_server_cfg(wg_if_dict, hostname, wg_if_name)
+        for wg_if_name, wg_if_dict in get_wg_from_host_cfg(host_cfg).items()
+    }
+
+
+def _render_host_configs_safe(
+    hostname: str, host_cfg: Dict[str, Any]
+) -> Tuple[str, Any]:
+    try:
+        return hostname, render_host_configs(hostname, host_cfg)
+    except Exception as err:  # pylint: disable=broad-except
+        return hostname, err
+
+
+def render_server_configs(
+    config: Dict[str, Any], processes: Optional[int] = None
+) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Exception]]:
+    """
+    Render the server configs of all hosts. Serially, unless there are at least
+    MIN_PARALLEL_SERVER_PEERS peers and more than one process to spread the
+    hosts on.
+
+    Returns ({hostname: {interface: config}}, {hostname: render error}).
+    """
+    processes = min(processes or os.cpu_count() or 1, len(config))
+    total_peers = sum(
+        len(wg_if_dict.get("peers", []))
+        for host_cfg in config.values()
+        for wg_if_dict in get_wg_from_host_cfg(host_cfg).values()
+    )
+    if processes <= 1 or total_peers < MIN_PARALLEL_SERVER_PEERS:
+        results = [
+            _render_host_configs_safe(hostname, host_cfg)
+            for hostname, host_cfg in config.items()
+        ]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=processes, mp_context=get_process_pool_context()
+        ) as executor:
+            results = list(
+                executor.map(
+                    _render_host_configs_safe,
+                    config,
+                    config.values(),
+                    chunksize=max(1, len(config) // (processes * 4)),
+                )
+            )
+
+    rendered, errors = {}, {}
+    for hostname, result in results:
+        if isinstance(result, Exception):
+            errors[hostname] = result
+        else:
+            rendered[hostname] = result
+    return rendered, errors
+
+
+def plan_host(
+    hostname: str,
+    wg_cfgs: Dict[str, str],
+    peers: PeerRegistry,
+    deploy_state: DeployStateCache,
+    versions: Dict[str, str],
+) -> HostPlan:
+    """Compare the rendered configs of a host with its deploy state entries"""
+    host_plan = HostPlan(hostname)
+    deployed = deploy_state.get_host(hostname)
+    for wg_if_name, wg_cfg_str in wg_cfgs.items():
+        entry = make_deploy_entry(
+            wg_cfg_str, get_desired_peers(peers.by_interface(wg_if_name)), versions
+        )
+        cached = deployed.get(wg_if_name)
+        if_plan = InterfacePlan(wg_if_name, "update", config_size=len(wg_cfg_str))
+        if cached is None:
+            if_plan.action = "create"
+            if_plan.peers = diff_wg_peers(entry["peers"], {})
+        elif all(cached.get(key) == entry[key] for key in VERSION_KEYS):
+            if_plan.action = "unchanged"
+        elif cached.get("script_version") != entry["script_version"]:
+            if_plan.reason = "deploy script"
+        elif cached.get("template_version") != entry["template_version"]:
+            if_plan.reason = "template"
+        elif cached.get("interface_hash") != entry["interface_hash"]:
+            # also entries written before peers and interface hashes were kept
+            if_plan.reason = "interface"
+        else:
+            if_plan.reason = "peers"
+        if if_plan.action == "update" and "peers" in cached:
+            if_plan.peers = diff_wg_peers(entry["peers"], cached["peers"])
+        host_plan.interfaces.append(if_plan)
+
+    for wg_if_name in deployed:
+        if wg_if_name not in wg_cfgs:
+            host_plan.interfaces.append(
+                InterfacePlan(wg_if_name, "remove", "not declared, left running")
+            )
+    return host_plan
+
+
+def read_client_configs(output_dir: str, bundle: bool = False) -> Dict[str, str]:
+    """{path relative to output_dir: config} written by write_client_artifacts"""
+    configs = {}
+    if bundle:
+        bundle_path = os.path.join(output_dir, "wg_clients.zip")
+        if not os.path.exists(bundle_path):
+            return configs
+        with zipfile.ZipFile(bundle_path) as zip_file:
+            for name in zip_file.namelist():
+                if name.endswith(".conf"):
+                    configs[name] = zip_file.read(name).decode()
+        return configs
+
+    if not os.path.isdir(output_dir):
+        return configs
+    for entry in os.scandir(output_dir):
+        if not entry.is_dir():
+            continue
+        for conf in os.scandir(entry.path):
+            if conf.name.endswith(".conf"):
+                with open(conf.path, encoding="utf-8") as f:
+                    configs[os.path.join(entry.name, conf.name)] = f.read()
+    return configs
+
+
+def plan_clients(
+    artifacts: List[ClientArtifact], existing: Dict[str, str]
+) -> Dict[str, ClientsPlan]:
+    """Compare rendered client configs with read_client_configs, per host"""
+    plans: Dict[str, ClientsPlan] = {}
+    seen = set()
+    for artifact in artifacts:
+        clients_plan = plans.setdefault(artifact.hostname, ClientsPlan())
+        path = get_artifact_paths(artifact)["config"]
+        seen.add(path)
+        if path not in existing:
+            clients_plan.new += 1
+        elif existing[path] != artifact.config:
+            clients_plan.changed += 1
+        else:
+            clients_plan.unchanged += 1
+    for path in existing:
+        hostname = os.path.dirname(path)
+        if path not in seen and hostname in plans:
+            plans[hostname].removed += 1
+    return plans
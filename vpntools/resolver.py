@@ -0,0 +1,96 @@
+import time
+import socket
+import logging
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from vpntools.tracing import TRACER
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+DEFAULT_WORKERS = 16
+
+
+def is_ip_address(address: str) -> bool:
+    try:
+        ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return True
+
+
+def format_endpoint(address: str, port: Union[str, int]) -> str:
+    if ":" in address:
+        # IPv6 literal
+        return f"[{address}]:{port}"
+    return f"{address}:{port}"
+
+
+class Resolver:
+    """
+    Thread-safe DNS cache on top of getaddrinfo, shared by all hosts and peers.
+
+    IPv4 addresses are preferred (like gethostbyname), set prefer_ipv6 to pick
+    an AAAA record when there is one. resolve and prefetch can override it per
+    call, results are cached per hostname and preference.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, prefer_ipv6: bool = False) -> None:
+        self.ttl = ttl
+        self.prefer_ipv6 = prefer_ipv6
+        self._cache: Dict[Tuple[str, bool], Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, hostname: str, prefer_ipv6: Optional[bool] = None) -> str:
+        if is_ip_address(hostname):
+            return hostname
+
+        key = (hostname, self.prefer_ipv6 if prefer_ipv6 is None else prefer_ipv6)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        address = self._lookup(*key)
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, address)
+        return address
+
+    def _lookup(self, hostname: str, prefer_ipv6: bool) -> str:
+        logger.debug("Resolving %s", hostname)
+        with TRACER.span("resolve", "dns", hostname=hostname):
+            addr_infos = socket.getaddrinfo(hostname, None, proto=socket.IPPROTO_UDP)
+        preferred = socket.AF_INET6 if prefer_ipv6 else socket.AF_INET
+        addr_infos.sort(key=lambda addr_info: addr_info[0] != preferred)
+        return addr_infos[0][4][0]
+
+    def prefetch(
+        self,
+        hostnames: Iterable[str],
+        workers: int = DEFAULT_WORKERS,
+        prefer_ipv6: Optional[bool] = None,
+    ) -> None:
+        """Resolve hostnames concurrently, failures are logged and left for resolve"""
+        hostnames = {hostname for hostname in hostnames if not is_ip_address(hostname)}
+        if not hostnames:
+            return
+
+        def prefetch_one(hostname: str) -> None:
+            try:
+                self.resolve(hostname, prefer_ipv6)
+            except OSError as err:
+                logger.warning("Failed to resolve %s: %s", hostname, err)
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(hostnames))) as executor:
+            list(executor.map(prefetch_one, hostnames))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+RESOLVER = Resolver()
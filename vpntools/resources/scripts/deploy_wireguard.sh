@@ -1,19 +1,40 @@
 #!/usr/bin/env bash
+# Usage: deploy_wireguard.sh <tmp folder> [interface ...]
+# Installs <tmp folder>/<interface>.conf of every interface (all uploaded
+# configs if none are given) and (re)starts all of them together.
 
 set -e
 
 WG_FOLDER="/etc/wireguard/"
-TMP_FOLDER="/tmp"
+# directory with the uploaded configs, passed by DeployWireguard
+TMP_FOLDER="${1:-/tmp}"
+shift || true
 DEBIAN_FRONTEND="noninteractive"
 
-apt-get update
-apt-get install -y wireguard
+if [ "$#" -eq 0 ]; then
+    for cfg in "$TMP_FOLDER"/*.conf; do
+        [ -e "$cfg" ] || continue
+        cfg_name=$(basename "$cfg")
+        set -- "$@" "${cfg_name%.conf}"
+    done
+fi
+
+if ! command -v wg > /dev/null; then
+    apt-get update
+    apt-get install -y wireguard
+fi
 
 mkdir -p -m 0700 $WG_FOLDER
-mv $TMP_FOLDER/wg0.conf $WG_FOLDER
+UNITS=()
+for wg_if in "$@"; do
+    install -m 0600 "$TMP_FOLDER/$wg_if.conf" $WG_FOLDER
+    rm "$TMP_FOLDER/$wg_if.conf"
+    UNITS+=("wg-quick@$wg_if")
+done
 
 sysctl -w net.ipv4.ip_forward=1
 
-systemctl enable wg-quick@wg0
-systemctl start wg-quick@wg0
-systemctl restart wg-quick@wg0
\ No newline at end of file
+if [ "${#UNITS[@]}" -gt 0 ]; then
+    systemctl enable "${UNITS[@]}"
+    systemctl restart "${UNITS[@]}"
+fi
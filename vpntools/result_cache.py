@@ -0,0 +1,80 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional
+
+from vpntools.cmds import LINUX_COMMANDS
+from vpntools.helpers import DEFAULT_CACHE_DIR
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_CACHE_DB = os.path.join(DEFAULT_CACHE_DIR, "results.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    host TEXT NOT NULL,
+    command TEXT NOT NULL,
+    stdout TEXT NOT NULL,
+    ts REAL NOT NULL,
+    PRIMARY KEY (host, command)
+);
+"""
+
+
+def get_max_age(cmd_name: str, max_age: Optional[float] = None) -> float:
+    """
+    Seconds a cached result of cmd_name stays usable: max_age if given,
+    otherwise the "ttl" of the command. Commands without a ttl are never
+    cached, whatever max_age says.
+    """
+    ttl = LINUX_COMMANDS[cmd_name].get("ttl") or 0
+    if not ttl:
+        return 0
+    return ttl if max_age is None else max_age
+
+
+class ResultCache:
+    """
+    Raw stdout of LINUX_COMMANDS per host in a local SQLite database (WAL mode,
+    shared by concurrent runs), so repeated runs within a command's ttl skip
+    the SSH round-trip. Results are parsed again on every read.
+
+    Secrets are stripped before results are stored (see "redact" of
+    LINUX_COMMANDS, e.g. the private keys of `wg show all dump`), the database
+    is still created readable by the owner only.
+    """
+
+    def __init__(self, path: str = DEFAULT_RESULT_CACHE_DB) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, host: str, command: str, max_age: float) -> Optional[str]:
+        """stdout of command on host if it is at most max_age seconds old"""
+        if max_age <= 0:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stdout FROM results WHERE host = ? AND command = ? AND ts >= ?",
+                (host, command, time.time() - max_age),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, host: str, command: str, stdout: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (host, command, stdout, time.time()),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,96 @@
+import io
+import atexit
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Tuple
+
+from fabric import Connection
+from paramiko.ed25519key import Ed25519Key
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEEPALIVE = 30
+DEFAULT_MAX_CHANNELS = 8
+
+
+@lru_cache(maxsize=None)
+def load_private_key(private_key: str) -> Ed25519Key:
+    return Ed25519Key.from_private_key(file_obj=io.StringIO(private_key))
+
+
+class PoolEntry:
+    __slots__ = ("connection", "lock", "channels")
+
+    def __init__(self, connection: Connection, max_channels: int) -> None:
+        self.connection = connection
+        self.lock = threading.Lock()
+        # OpenSSH allows MaxSessions (10 by default) channels per transport
+        self.channels = threading.BoundedSemaphore(max_channels)
+
+
+class ConnectionPool:
+    """
+    Keeps one SSH transport per (hostname, user) alive for the process lifetime.
+
+    Commands run concurrently on a pooled connection are multiplexed as separate
+    channels over the same transport, bounded by max_channels.
+    """
+
+    def __init__(
+        self,
+        keepalive: int = DEFAULT_KEEPALIVE,
+        max_channels: int = DEFAULT_MAX_CHANNELS,
+    ) -> None:
+        self.keepalive = keepalive
+        self.max_channels = max_channels
+        self._entries: Dict[Tuple[str, str], PoolEntry] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, hostname: str, user: str, private_key: str) -> PoolEntry:
+        key = (hostname, user)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                connection = self._new_connection(hostname, user, private_key)
+                entry = PoolEntry(connection, self.max_channels)
+                self._entries[key] = entry
+
+        # opening is done under the per-host lock so different hosts connect in parallel
+        with entry.lock:
+            if not entry.connection.is_connected:
+                self._open(entry.connection)
+        return entry
+
+    def reconnect(self, hostname: str, user: str, private_key: str) -> PoolEntry:
+        entry = self.acquire(hostname, user, private_key)
+        with entry.lock:
+            entry.connection.close()
+            self._open(entry.connection)
+        return entry
+
+    def _new_connection(self, hostname: str, user: str, private_key: str) -> Any:
+        """Unopened connection, the transport seam (see vpntools.fake_transport)"""
+        return Connection(
+            hostname,
+            user=user,
+            connect_kwargs={"pkey": load_private_key(private_key)},
+        )
+
+    def _open(self, connection: Connection) -> None:
+        # drops a stale SFTP session along with a dead transport
+        connection.close()
+        connection.open()
+        connection.transport.set_keepalive(self.keepalive)
+        logger.info("Connected: %s", connection.host)
+
+    def close(self) -> None:
+        with self._lock:
+            entries, self._entries = self._entries, {}
+        for entry in entries.values():
+            entry.connection.close()
+
+
+CONNECTION_POOL = ConnectionPool()
+atexit.register(CONNECTION_POOL.close)
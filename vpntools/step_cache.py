@@ -0,0 +1,92 @@
+import os
+import pickle
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from vpntools.helpers import DEFAULT_CACHE_DIR, write_private_file
+
+
+logger = logging.getLogger(__name__)
+
+STEP_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, "workflows")
+
+
+def run_key(*parts: Any) -> str:
+    """
+    Identity of a workflow run: sha256 over the given parts, e.g. workflow
+    file content, vpn yaml content and arguments. Bytes are hashed as is,
+    anything else through repr.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _file_digest(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class StepCache:
+    """
+    Results of completed workflow steps of one run, so a rerun of a failed run
+    resumes after the steps that already succeeded.
+
+    Pickled to STEP_CACHE_DIR/<run key>.pickle (0600, results may carry
+    private keys) after every completed step, removed once the run succeeds.
+    The content of files (e.g. the VPN yaml) is checked rather than put into
+    the run key: their digests are stored along the results, taken after each
+    step, so a step rewriting one (--write-config) does not orphan the cache,
+    while a file edited between runs discards it.
+    """
+
+    def __init__(
+        self, key: str, cache_dir: str = STEP_CACHE_DIR, files: Iterable[str] = ()
+    ) -> None:
+        self.path = os.path.join(cache_dir, f"{key}.pickle")
+        self.files = list(files)
+        self._lock = threading.Lock()
+        self._results: Dict[str, Any] = {}
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        if state.get("files") != self._digests():
+            logger.info("Files changed since the cached run, starting over")
+            self.clear()
+            return
+        self._results = state["results"]
+
+    def _digests(self) -> Dict[str, Optional[str]]:
+        return {path: _file_digest(path) for path in self.files}
+
+    def __contains__(self, step_name: str) -> bool:
+        return step_name in self._results
+
+    @property
+    def completed(self) -> Iterable[str]:
+        return list(self._results)
+
+    def get(self, step_name: str) -> Any:
+        return self._results[step_name]
+
+    def set(self, step_name: str, result: Any) -> None:
+        with self._lock:
+            self._results[step_name] = result
+            state = {"files": self._digests(), "results": self._results}
+            write_private_file(self.path, pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        logger.debug("Step cache %s cleared", self.path)
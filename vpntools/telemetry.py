@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from vpntools.helpers import DEFAULT_CACHE_DIR
+from vpntools.parsers import WgPeerRecord
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TELEMETRY_DB = os.path.join(DEFAULT_CACHE_DIR, "telemetry.sqlite")
+# raw samples are kept for RAW_RETENTION seconds, then rolled up into
+# ROLLUP_INTERVAL buckets that are kept for the retention period
+RAW_RETENTION = 3600
+ROLLUP_INTERVAL = 300
+DEFAULT_RETENTION = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS peer_samples (
+    ts INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    interface TEXT,
+    peer TEXT NOT NULL,
+    rx INTEGER NOT NULL,
+    tx INTEGER NOT NULL,
+    rx_rate REAL,
+    tx_rate REAL,
+    latest_handshake INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS peer_samples_ts ON peer_samples (ts);
+CREATE INDEX IF NOT EXISTS peer_samples_peer ON peer_samples (host, peer, ts);
+CREATE TABLE IF NOT EXISTS peer_rollups (
+    bucket INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    interface TEXT,
+    peer TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    rx INTEGER NOT NULL,
+    tx INTEGER NOT NULL,
+    rx_rate_avg REAL,
+    tx_rate_avg REAL,
+    rx_rate_max REAL,
+    tx_rate_max REAL,
+    latest_handshake INTEGER NOT NULL,
+    PRIMARY KEY (host, peer, bucket)
+);
+CREATE INDEX IF NOT EXISTS peer_rollups_bucket ON peer_rollups (bucket);
+"""
+
+
+class PeerSample(NamedTuple):
+    ts: int
+    host: str
+    interface: Optional[str]
+    peer: str
+    rx: int
+    tx: int
+    rx_rate: Optional[float]
+    tx_rate: Optional[float]
+    latest_handshake: int
+
+
+class RateTracker:
+    """Turns cumulative rx/tx counters into per-second rates between polls"""
+
+    def __init__(self) -> None:
+        self._last: Dict[Tuple[str, Optional[str], str], Tuple[int, int, int]] = {}
+
+    def sample(
+        self, ts: int, hostname: str, peer: str, record: WgPeerRecord
+    ) -> PeerSample:
+        key = (hostname, record.interface, record.public_key)
+        rx_rate = tx_rate = None
+        last = self._last.get(key)
+        if last and ts > last[0]:
+            elapsed = ts - last[0]
+            # counters restart from zero when the interface is restarted
+            rx_delta = record.transfer_rx - last[1]
+            tx_delta = record.transfer_tx - last[2]
+            rx_rate = (rx_delta if rx_delta >= 0 else record.transfer_rx) / elapsed
+            tx_rate = (tx_delta if tx_delta >= 0 else record.transfer_tx) / elapsed
+        self._last[key] = (ts, record.transfer_rx, record.transfer_tx)
+        return PeerSample(
+            ts,
+            hostname,
+            record.interface,
+            peer,
+            record.transfer_rx,
+            record.transfer_tx,
+            rx_rate,
+            tx_rate,
+            record.latest_handshake,
+        )
+
+
+class TelemetryStore:
+    """
+    Peer samples in a local SQLite database (WAL mode, so readers never block
+    the collector). Old raw samples are downsampled into ROLLUP_INTERVAL buckets,
+    rollups older than retention are dropped.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_TELEMETRY_DB,
+        retention: int = DEFAULT_RETENTION,
+        raw_retention: int = RAW_RETENTION,
+        rollup_interval: int = ROLLUP_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.retention = retention
+        self.raw_retention = raw_retention
+        self.rollup_interval = rollup_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def add_samples(self, samples: Iterable[PeerSample]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO peer_samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", samples
+            )
+
+    def compact(self, now: int) -> None:
+        """Roll raw samples older than raw_retention up, drop expired rollups"""
+        raw_cutoff = now - self.raw_retention
+        # only complete buckets are rolled up
+        raw_cutoff -= raw_cutoff % self.rollup_interval
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO peer_rollups
+                SELECT ts - ts % :interval AS bucket, host, interface, peer,
+                       COUNT(*), MAX(rx), MAX(tx), AVG(rx_rate), AVG(tx_rate),
+                       MAX(rx_rate), MAX(tx_rate), MAX(latest_handshake)
+                FROM peer_samples WHERE ts < :cutoff
+                GROUP BY bucket, host, peer
+                """,
+                {"interval": self.rollup_interval, "cutoff": raw_cutoff},
+            )
+            self._conn.execute("DELETE FROM peer_samples WHERE ts < ?", (raw_cutoff,))
+            self._conn.execute(
+                "DELETE FROM peer_rollups WHERE bucket < ?", (now - self.retention,)
+            )
+
+    def get_samples(
+        self, host: str, peer: str, since: int = 0
+    ) -> List[Tuple[int, int, int, Optional[float], Optional[float]]]:
+        """(ts, rx, tx, rx_rate, tx_rate) of one peer, rollups first, then raw"""
+        with self._lock:
+            rollups = self._conn.execute(
+                "SELECT bucket, rx, tx, rx_rate_avg, tx_rate_avg FROM peer_rollups "
+                "WHERE host = ? AND peer = ? AND bucket >= ? ORDER BY bucket",
+                (host, peer, since),
+            ).fetchall()
+            raw = self._conn.execute(
+                "SELECT ts, rx, tx, rx_rate, tx_rate FROM peer_samples "
+                "WHERE host = ? AND peer = ? AND ts >= ? ORDER BY ts",
+                (host, peer, since),
+            ).fetchall()
+        return rollups + raw
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+TRACE_FORMATS = ("chrome", "json")
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    hostname: Optional[str] = None
+    command: Optional[str] = None
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    exit_code: Optional[int] = None
+    error: Optional[str] = None
+    # seconds since the tracer was enabled
+    start: float = 0.0
+    duration: float = 0.0
+    thread_id: int = field(default_factory=threading.get_ident)
+
+
+class Tracer:
+    """
+    Collects spans of workflows, instructions and host operations.
+
+    Disabled by default, spans are then created but not recorded. Spans are
+    appended from the worker threads of run_per_host, hence the lock.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def enable(self) -> None:
+        with self._lock:
+            self.enabled = True
+            self.spans = []
+            self._origin = time.perf_counter()
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    @contextmanager
+    def span(self, name: str, category: str, **fields: Any) -> Iterator[Span]:
+        """Time the block; the yielded span can be filled with bytes/exit code"""
+        span = Span(name, category, **fields)
+        if not self.enabled:
+            yield span
+            return
+
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as err:
+            span.error = type(err).__name__
+            raise
+        finally:
+            span.start = started - self._origin
+            span.duration = time.perf_counter() - started
+            with self._lock:
+                self.spans.append(span)
+
+    def summary(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Per (category, name) totals, in the order spans were first seen"""
+        rows: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for span in sorted(self.spans, key=lambda span: span.start):
+            row = rows.setdefault(
+                (span.category, span.name),
+                {
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                    "bytes_sent": 0,
+                    "bytes_received": 0,
+                    "failed": 0,
+                },
+            )
+            row["count"] += 1
+            row["total"] += span.duration
+            row["max"] = max(row["max"], span.duration)
+            row["bytes_sent"] += span.bytes_sent
+            row["bytes_received"] += span.bytes_received
+            row["failed"] += bool(span.error or span.exit_code)
+        return rows
+
+    def summary_table(self) -> Any:
+        # pylint: disable=import-outside-toplevel
+        from prettytable import PrettyTable
+
+        table = PrettyTable()
+        table.field_names = [
+            "Category",
+            "Name",
+            "Count",
+            "Total (s)",
+            "Avg (s)",
+            "Max (s)",
+            "Sent (B)",
+            "Received (B)",
+            "Failed",
+        ]
+        table.align = "r"
+        table.align["Category"] = "l"
+        table.align["Name"] = "l"
+        for (category, name), row in self.summary().items():
+            table.add_row(
+                [
+                    category,
+                    name,
+                    row["count"],
+                    f"{row['total']:.3f}",
+                    f"{row['total'] / row['count']:.3f}",
+                    f"{row['max']:.3f}",
+                    row["bytes_sent"],
+                    row["bytes_received"],
+                    row["failed"],
+                ]
+            )
+        return table
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Trace Event Format, loadable in chrome://tracing or Perfetto"""
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            span_args = {
+                key: value
+                for key, value in asdict(span).items()
+                if key not in ("name", "category", "start", "duration", "thread_id")
+                and value
+            }
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": round(span.start * 1e6, 3),
+                    "dur": round(span.duration * 1e6, 3),
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": span_args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str, trace_format: str = "chrome") -> None:
+        if trace_format == "chrome":
+            data: Any = self.to_chrome_trace()
+        elif trace_format == "json":
+            data = [asdict(span) for span in self.spans]
+        else:
+            raise ValueError(f"Unknown trace format {trace_format}")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        logger.info("Trace with %d span(s) written to %s", len(self.spans), path)
+
+    def report(
+        self, trace_file: Optional[str] = None, trace_format: Optional[str] = None
+    ) -> None:
+        """Print the summary table to stderr and export the spans if asked to"""
+        print(self.summary_table(), file=sys.stderr)
+        if trace_file:
+            self.export(trace_file, trace_format or "chrome")
+
+
+TRACER = Tracer()
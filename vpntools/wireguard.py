@@ -1,28 +1,162 @@
+import shlex
 import datetime
-import socket
 import ipaddress
-from typing import Any, Dict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from vpntools.host import Host
 
 from vpntools.jinja_render import render_from_template
+from vpntools.parsers import WgPeerRecord
+from vpntools.peers import PeerRecord, PeerRegistry
+from vpntools.resolver import RESOLVER, format_endpoint
+
+WG_CONFIG_DIR = "/etc/wireguard"
+
+
+@dataclass
+class WgServerStats:
+    # live peers found in the config, {interface: {peer name: record}}
+    peers: Dict[str, Dict[str, WgPeerRecord]] = field(default_factory=dict)
+    # live peers missing from the config, {interface: {public key: record}}
+    unknown_peers: Dict[str, Dict[str, WgPeerRecord]] = field(default_factory=dict)
+    # {interface: wg-quick unit state}, when WIREGUARD_SVC_STATUS was collected
+    interfaces: Dict[str, str] = field(default_factory=dict)
+
+    def iter_peers(self) -> Iterator[Tuple[Optional[str], WgPeerRecord]]:
+        """(peer name, record) of all live peers, the name is None if unknown"""
+        for if_peers in self.peers.values():
+            for peer_name, record in if_peers.items():
+                yield peer_name, record
+        for if_peers in self.unknown_peers.values():
+            for record in if_peers.values():
+                yield None, record
+
+    def filter_peers(self, peer_ids: Iterable[str]) -> "WgServerStats":
+        """Only the peers with one of the names or public keys"""
+        peer_ids = set(peer_ids)
+        return WgServerStats(
+            {
+                wg_if_name: {
+                    peer_name: record
+                    for peer_name, record in if_peers.items()
+                    if peer_name in peer_ids or record.public_key in peer_ids
+                }
+                for wg_if_name, if_peers in self.peers.items()
+            },
+            {
+                wg_if_name: {
+                    public_key: record
+                    for public_key, record in if_peers.items()
+                    if public_key in peer_ids
+                }
+                for wg_if_name, if_peers in self.unknown_peers.items()
+            },
+            self.interfaces,
+        )
 
 
 class WireguardServer:
-    def __init__(self, host: Host, config: Dict[str, Any]):
+    def __init__(
+        self,
+        host: Host,
+        config: Dict[str, Any],
+        peers: Optional[PeerRegistry] = None,
+    ):
         self.host = host
         self.config = config
-        self.peer_key_map: Dict[str, str] = {}
+        self.peers = (
+            peers
+            if peers is not None
+            else PeerRegistry.from_wg_config(host.hostname, config)
+        )
+
+    def get_peer_stats(
+        self,
+        wg_status: Optional[Dict[Tuple[Optional[str], str], WgPeerRecord]] = None,
+        interfaces: Optional[Dict[str, str]] = None,
+    ) -> WgServerStats:
+        """
+        Map WG_STATUS output onto peer names, per interface.
+
+        wg_status is an already parsed WG_STATUS result (e.g. from a batched
+        Host.run_linux_cmds call), it is fetched from the host when omitted.
+        interfaces is an optional WIREGUARD_SVC_STATUS result, every configured
+        interface is reported, "missing" if it has no wg-quick unit.
+        """
+        if wg_status is None:
+            wg_status = self.host.run_linux_cmd("WG_STATUS")
+
+        stats = WgServerStats()
+        if interfaces is not None:
+            stats.interfaces = {
+                wg_if_name: interfaces.get(wg_if_name, "missing")
+                for wg_if_name in self.config
+            }
+        for record in wg_status.values():
+            peer = self.peers.by_public_key(record.public_key, record.interface)
+            if peer is None:
+                stats.unknown_peers.setdefault(record.interface, {})[
+                    record.public_key
+                ] = record
+            else:
+                stats.peers.setdefault(record.interface, {})[peer.name] = record
+        return stats
+
+
+@dataclass
+class WgPeerDiff:
+    add: Dict[str, List[str]] = field(default_factory=dict)
+    update: Dict[str, List[str]] = field(default_factory=dict)
+    remove: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.add or self.update or self.remove)
+
+    def __str__(self) -> str:
+        return f"+{len(self.add)} ~{len(self.update)} -{len(self.remove)}"
 
-        for wg_if in self.config:
-            for peer_dict in self.config[wg_if].get("peers", []):
-                for peer_id, peer_cfg in peer_dict.items():
-                    self.peer_key_map[peer_cfg["public_key"]] = peer_id
 
-    def get_peer_stats(self) -> Dict[str, Any]:
-        return {
-            self.peer_key_map[k]: v
-            for k, v in self.host.run_linux_cmd("WG_STATUS").items()
-        }
+def get_peer_allowed_ips(peer: PeerRecord) -> List[str]:
+    peer_ip = ipaddress.ip_address(peer.private_ip)
+    return [f"{peer_ip}/{peer_ip.max_prefixlen}"]
+
+
+def get_desired_peers(peers: Iterable[PeerRecord]) -> Dict[str, List[str]]:
+    """{public key: allowed ips} of the peers declared for an interface"""
+    return {peer.public_key: get_peer_allowed_ips(peer) for peer in peers}
+
+
+def diff_wg_peers(
+    desired: Dict[str, List[str]], current: Dict[str, List[str]]
+) -> WgPeerDiff:
+    """
+    Changes turning current into desired, both {public key: allowed ips}: e.g.
+    config vs `wg show` of a running interface, or vs the deploy state.
+    """
+    diff = WgPeerDiff()
+    for public_key, allowed_ips in desired.items():
+        if public_key not in current:
+            diff.add[public_key] = allowed_ips
+        elif set(current[public_key]) != set(allowed_ips):
+            diff.update[public_key] = allowed_ips
+    diff.remove = [public_key for public_key in current if public_key not in desired]
+    return diff
+
+
+def build_wg_sync_cmds(wg_if_name: str, diff: WgPeerDiff) -> List[str]:
+    """
+    `wg set` commands applying diff to a running interface. Names, keys and
+    addresses come from the VPN yaml and run under sudo, so they are quoted.
+    """
+    wg_set = f"wg set {shlex.quote(wg_if_name)} peer"
+    cmds = [
+        f"{wg_set} {shlex.quote(public_key)} allowed-ips "
+        f"{shlex.quote(','.join(allowed_ips))}"
+        for peers in (diff.add, diff.update)
+        for public_key, allowed_ips in peers.items()
+    ]
+    cmds += [f"{wg_set} {shlex.quote(public_key)} remove" for public_key in diff.remove]
+    return cmds
 
 
 def build_wg_server_cfg(
@@ -45,22 +179,41 @@ def build_wg_peer_cfg(
     wg_srv_if_cfg: Dict[str, Any],
     hostname: str,
 ) -> str:
-    try:
-        if ipaddress.ip_address(hostname):
-            server_external_ip_address = hostname
-    except ValueError:
-        server_external_ip_address = socket.gethostbyname(hostname)
+    """
+    Render a client config, the server endpoint is the "endpoint" pinned in the
+    interface config or the (cached) resolved address of hostname.
+    """
+    server_address = wg_srv_if_cfg.get("endpoint") or RESOLVER.resolve(hostname)
 
     return render_from_template(
         "wg_client_cfg.j2",
         wg_peer_cfg,
         {
             "wg_srv_cfg": wg_srv_if_cfg,
-            "server_external_ip_address": server_external_ip_address,
+            "server_endpoint": format_endpoint(
+                server_address, wg_srv_if_cfg["server_port"]
+            ),
             "ipaddress": ipaddress,
         },
     )
 
 
+def format_handshake(
+    latest_handshake: int, now: Optional[datetime.datetime] = None
+) -> str:
+    if not latest_handshake:
+        return "never"
+    now = now or datetime.datetime.utcnow()
+    handshake_age = now - datetime.datetime.utcfromtimestamp(latest_handshake)
+    return f"{datetime.timedelta(seconds=int(handshake_age.total_seconds()))} ago"
+
+
 def get_wg_from_host_cfg(host_cfg: Dict[str, Any]) -> Dict[str, Any]:
     return host_cfg.get("app_config", {}).get("wireguard", {})
+
+
+def build_peer_registries(config: Dict[str, Any]) -> Dict[str, PeerRegistry]:
+    return {
+        hostname: PeerRegistry.from_wg_config(hostname, get_wg_from_host_cfg(host_cfg))
+        for hostname, host_cfg in config.items()
+    }
@@ -1,33 +1,81 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-import subprocess
+import io
 
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from dataclasses import dataclass
 from datetime import datetime
-from collections import deque
 import os.path
 import logging
-from typing import Any, Dict, List, Optional
-
-from termcolor import cprint
-from prettytable import PrettyTable
+import posixpath
+import shlex
+import shutil
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
-from vpntools.helpers import get_resource_path, yaml_to_dict
-from vpntools.host import Host
+from vpntools.clients import (
+    build_client_artifacts,
+    iter_client_jobs,
+    write_client_artifacts,
+)
+from vpntools.config import load_config, parse_hostnames
+from vpntools.deploy_cache import (
+    DEFAULT_DEPLOY_STATE_PATH,
+    DeployStateCache,
+    get_deploy_versions,
+    make_deploy_entry,
+)
+from vpntools.helpers import dict_to_yaml, get_resource_path, yaml_to_dict
+from vpntools.host import Host, RemoteFile
+from vpntools.ipam import allocate_peer_ips
+from vpntools.keygen import fill_missing_keys
+from vpntools.output import PLAN_FIELDS, get_record_writer
+from vpntools.metrics import DEFAULT_LISTEN, DEFAULT_PORT, MetricsServer, MetricsText
+from vpntools.peers import PeerRegistry
+from vpntools.plan import (
+    DEFAULT_RTT,
+    ClientsPlan,
+    HostPlan,
+    plan_clients,
+    plan_host,
+    read_client_configs,
+    render_server_configs,
+)
+from vpntools.result_cache import DEFAULT_RESULT_CACHE_DB, ResultCache
+from vpntools.sshpool import CONNECTION_POOL, ConnectionPool
+from vpntools.step_cache import StepCache, run_key
+from vpntools.telemetry import (
+    DEFAULT_RETENTION,
+    DEFAULT_TELEMETRY_DB,
+    RateTracker,
+    TelemetryStore,
+)
 from vpntools.wireguard import (
+    WG_CONFIG_DIR,
+    WgServerStats,
     WireguardServer,
-    build_wg_peer_cfg,
+    build_peer_registries,
     build_wg_server_cfg,
+    build_wg_sync_cmds,
+    diff_wg_peers,
+    format_handshake,
+    get_desired_peers,
     get_wg_from_host_cfg,
 )
+from vpntools.tracing import TRACER
 from vpntools.resources import scripts
 
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s:%(message)s"
-)
 logger = logging.getLogger(__name__)
 
+DEFAULT_WORKERS = 16
+
 
 @dataclass
 class DataContainer:
@@ -35,12 +83,31 @@ class DataContainer:
 
 
 class ExecutionContext:
-    def __init__(self, args: Optional[Dict[str, Any]] = None):
-        self._instr_queue = deque([])
+    def __init__(
+        self,
+        args: Optional[Dict[str, Any]] = None,
+        pool: ConnectionPool = CONNECTION_POOL,
+    ):
         self._args: Dict[str, Any] = {} if args is None else args
+        # connections of the hosts, a fake_transport pool in benchmarks
+        self.pool = pool
         self.data: Dict[str, DataContainer] = {}
         self.config: Dict[str, Any] = {}
         self.hosts: Dict[str, Host] = {}
+        self.errors: Dict[str, List[Exception]] = {}
+        self.peers: Dict[str, PeerRegistry] = {}
+        # key pairs LOAD_CONFIG generated without writing them to vpn_yaml
+        self.unsaved_keys = 0
+        # opened by CONNECT_HOSTS, closed when the workflow run ends
+        self.result_cache: Optional[ResultCache] = None
+
+    def add_error(self, hostname: str, err: Exception) -> None:
+        self.errors.setdefault(hostname, []).append(err)
+
+    def trim_errors(self, keep: int = 1) -> None:
+        """Keep only the latest keep errors of each host, for long running loops"""
+        for errors in self.errors.values():
+            del errors[:-keep]
 
     def set_data(self, key: str, container: DataContainer) -> None:
         self.data[key] = container
@@ -53,14 +120,6 @@ class ExecutionContext:
             return self.data[key]
         return self.data
 
-    def get_next_instr(self) -> Instruction:
-        if self._instr_queue:
-            return self._instr_queue.popleft()
-        return None
-
-    def set_instr(self, instr_list: List[Instruction]) -> None:
-        self._instr_queue = deque(instr_list)
-
     def get_args(self, key: Optional[str] = None) -> Dict[str, Any]:
         if key is not None:
             return self._args[key]
@@ -68,6 +127,10 @@ class ExecutionContext:
 
 
 class Instruction(ABC):
+    # whether a resumable run (see StepCache) may skip the instruction once it
+    # completed, restoring what get_result returned instead of running it again
+    CACHEABLE = False
+
     def __init__(self, **kwargs: Dict[str, Any]):
         self._attr = kwargs
 
@@ -78,86 +141,543 @@ class Instruction(ABC):
     def run(self, ctx: ExecutionContext) -> ExecutionContext:
         return ctx
 
+    def get_result(self, ctx: ExecutionContext) -> Any:
+        """What a resumed run needs to restore, see CACHEABLE"""
+        return None
+
+    def restore_result(self, ctx: ExecutionContext, result: Any) -> None:
+        pass
+
+    def get_workers(self, ctx: ExecutionContext) -> int:
+        workers = (
+            self._attr.get("workers")
+            or ctx.get_args().get("workers")
+            or DEFAULT_WORKERS
+        )
+        return max(1, int(workers))
+
+    def run_per_host(
+        self,
+        ctx: ExecutionContext,
+        func: Callable[[str], Any],
+        hostnames: Optional[Iterable[str]] = None,
+        on_result: Optional[Callable[[str, Any], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run func(hostname) for every host on a bounded thread pool.
+
+        Results are returned in the order of hostnames (ctx.hosts by default).
+        on_result(hostname, result) is called from the calling thread as soon as
+        a host finishes. A host that raises is recorded in ctx.errors and left
+        out of the results, the remaining hosts keep running.
+        """
+        hostnames = list(ctx.hosts if hostnames is None else hostnames)
+        results: Dict[str, Any] = {}
+        if not hostnames:
+            return results
+
+        def traced(hostname: str) -> Any:
+            with TRACER.span(type(self).__name__, "host", hostname=hostname):
+                return func(hostname)
+
+        workers = min(self.get_workers(ctx), len(hostnames))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(traced, hostname): hostname for hostname in hostnames
+            }
+            for future in as_completed(futures):
+                hostname = futures[future]
+                try:
+                    results[hostname] = future.result()
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.error(
+                        "%s: %s failed: %s", hostname, type(self).__name__, err
+                    )
+                    ctx.add_error(hostname, err)
+                    continue
+                if on_result is not None:
+                    on_result(hostname, results[hostname])
+        return {
+            hostname: results[hostname] for hostname in hostnames if hostname in results
+        }
+
+
+class WorkflowStep:
+    def __init__(
+        self, name: str, instr: Instruction, needs: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.instr = instr
+        self.needs = list(needs)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name}: {self.instr})"
+
 
 class Workflow:
-    def __init__(self, instr_list: List[Instruction]):
-        self.instr_list = instr_list
+    """
+    Instructions with dependencies between them, run by a DAG scheduler.
+
+    Steps whose dependencies completed run concurrently, all sharing one
+    ExecutionContext. A step that raises fails the steps depending on it,
+    independent steps keep running.
+    """
+
+    def __init__(self, steps: List[WorkflowStep]):
+        self.steps = steps
+        self._check_steps()
+
+    @property
+    def instr_list(self) -> List[Instruction]:
+        return [step.instr for step in self.steps]
+
+    def _check_steps(self) -> None:
+        names = [step.name for step in self.steps]
+        duplicates = {name for name in names if names.count(name) > 1}
+        if duplicates:
+            raise ValueError(f"Duplicate workflow steps: {', '.join(duplicates)}")
+        for step in self.steps:
+            unknown = [need for need in step.needs if need not in names]
+            if unknown:
+                raise ValueError(f"{step.name} needs unknown steps {unknown}")
+
+        ordered: Set[str] = set()
+        remaining = list(self.steps)
+        while remaining:
+            ready = [s for s in remaining if all(n in ordered for n in s.needs)]
+            if not ready:
+                raise ValueError(
+                    "Workflow steps depend on each other: "
+                    + ", ".join(step.name for step in remaining)
+                )
+            ordered.update(step.name for step in ready)
+            remaining = [step for step in remaining if step.name not in ordered]
 
     @classmethod
     def from_dict(cls, workflow_dict: Dict[str, Any]) -> Workflow:
-        instr_list = []
-        for instr_item in workflow_dict["instructions"]:
+        """
+        Either a linear list of instructions, each depending on the previous one:
+
+            {"instructions": [{"LOAD_CONFIG": {}}, {"CONNECT_HOSTS": {}}, ...]}
+
+        or named steps with explicit dependencies and instruction attributes:
+
+            {"steps": {"deploy": {"instruction": "DEPLOY_WIREGUARD",
+                                  "needs": ["connect"], "attr": {"force": True}},
+                       ...}}
+        """
+        steps = []
+        if "steps" in workflow_dict:
+            for step_name, step_dict in workflow_dict["steps"].items():
+                needs = step_dict.get("needs") or []
+                steps.append(
+                    WorkflowStep(
+                        step_name,
+                        INSTRUCTIONS[step_dict["instruction"]](
+                            **(step_dict.get("attr") or {})
+                        ),
+                        [needs] if isinstance(needs, str) else needs,
+                    )
+                )
+            return cls(steps)
+
+        for idx, instr_item in enumerate(workflow_dict["instructions"]):
             ((instr_name, instr_attr),) = instr_item.items()
-            instr_list.append(INSTRUCTIONS[instr_name](**instr_attr))
-        return cls(instr_list)
+            names = [step.name for step in steps]
+            step_name = instr_name if instr_name not in names else f"{instr_name}_{idx}"
+            steps.append(
+                WorkflowStep(
+                    step_name,
+                    INSTRUCTIONS[instr_name](**(instr_attr or {})),
+                    names[-1:],
+                )
+            )
+        return cls(steps)
+
+    @classmethod
+    def from_file(cls, path: str) -> Workflow:
+        with open(path, "rb") as f:
+            return cls.from_dict(yaml_to_dict(f.read()))
 
     def run(
         self,
         ctx: Optional[ExecutionContext] = None,
         args: Optional[Dict[str, Any]] = None,
+        step_cache: Optional[StepCache] = None,
     ) -> ExecutionContext:
+        """
+        Run all steps. With step_cache, completed cacheable steps are recorded
+        there and restored instead of run again; the cache is cleared once the
+        whole workflow succeeded.
+        """
         if ctx is None:
             ctx = ExecutionContext(args)
-            ctx.set_instr(self.instr_list)
-        while instr := ctx.get_next_instr():
-            logger.info("Executing: %s", instr)
-            ctx = instr.run(ctx)
+        args = ctx.get_args()
+        tracing = args.get("trace") or args.get("trace_file")
+        if tracing:
+            TRACER.enable()
+
+        try:
+            with TRACER.span(type(self).__name__, "workflow"):
+                failed = self._run_steps(ctx, step_cache)
+        finally:
+            if ctx.result_cache is not None:
+                ctx.result_cache.close()
+                ctx.result_cache = None
+            if tracing:
+                TRACER.report(args.get("trace_file"), args.get("trace_format"))
+
+        if ctx.errors:
+            logger.error(
+                "Failed hosts (%d): %s", len(ctx.errors), ", ".join(ctx.errors)
+            )
+        if failed:
+            raise next(iter(failed.values()))
+        if step_cache is not None and not ctx.errors:
+            step_cache.clear()
         return ctx
 
+    @staticmethod
+    def _run_step(ctx: ExecutionContext, step: WorkflowStep) -> None:
+        logger.info("Executing: %s", step.instr)
+        with TRACER.span(type(step.instr).__name__, "instruction"):
+            step.instr.run(ctx)
+
+    def _run_steps(
+        self, ctx: ExecutionContext, step_cache: Optional[StepCache]
+    ) -> Dict[str, Exception]:
+        pending = {step.name: step for step in self.steps}
+        done: Set[str] = set()
+        failed: Dict[str, Exception] = {}
+        skipped: Set[str] = set()
+        running: Dict[Future, WorkflowStep] = {}
+
+        def complete(step: WorkflowStep) -> None:
+            done.add(step.name)
+            # a step that left host errors behind is run again on resume
+            if step_cache is not None and step.instr.CACHEABLE and not ctx.errors:
+                step_cache.set(step.name, step.instr.get_result(ctx))
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.steps))) as executor:
+            while pending or running:
+                ready = []
+                for step in list(pending.values()):
+                    if any(need in failed or need in skipped for need in step.needs):
+                        logger.error("Skipping %s, a step it needs failed", step.name)
+                        skipped.add(step.name)
+                        del pending[step.name]
+                    elif all(need in done for need in step.needs):
+                        del pending[step.name]
+                        if (
+                            step_cache is not None
+                            and step.instr.CACHEABLE
+                            and step.name in step_cache
+                        ):
+                            logger.info("Resuming: %s already completed", step.name)
+                            step.instr.restore_result(ctx, step_cache.get(step.name))
+                            done.add(step.name)
+                        else:
+                            ready.append(step)
+
+                if len(ready) == 1 and not running:
+                    # a lone step runs in the calling thread, so linear
+                    # workflows behave as before (e.g. KeyboardInterrupt)
+                    step = ready[0]
+                    try:
+                        self._run_step(ctx, step)
+                    except Exception as err:  # pylint: disable=broad-except
+                        logger.error("%s failed: %s", step.name, err)
+                        failed[step.name] = err
+                    else:
+                        complete(step)
+                    continue
+                for step in ready:
+                    running[executor.submit(self._run_step, ctx, step)] = step
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as err:  # pylint: disable=broad-except
+                        logger.error("%s failed: %s", step.name, err)
+                        failed[step.name] = err
+                    else:
+                        complete(step)
+        return failed
+
+
+def run_workflow_file(
+    workflow_file: str, args: Dict[str, Any], resume: bool = True
+) -> ExecutionContext:
+    """
+    Run a user supplied workflow file (see Workflow.from_dict for the format).
+
+    With resume, a rerun of a failed run with the same workflow file, VPN yaml
+    and arguments skips the steps that already completed. The VPN yaml content
+    is checked by the StepCache, it may be rewritten by the run itself.
+    """
+    with open(workflow_file, "rb") as f:
+        workflow_bytes = f.read()
+    workflow = Workflow.from_dict(yaml_to_dict(workflow_bytes))
+
+    step_cache = None
+    if resume:
+        vpn_yaml = os.path.abspath(args["vpn_yaml"])
+        run_args = sorted(
+            (key, value)
+            for key, value in args.items()
+            if isinstance(value, (str, int, float, bool, type(None)))
+            and not key.startswith("trace")
+            and key != "vpn_yaml"
+        )
+        step_cache = StepCache(
+            run_key(workflow_bytes, vpn_yaml, run_args), files=[vpn_yaml]
+        )
+        if step_cache.completed:
+            logger.info(
+                "Resuming %s, completed steps: %s",
+                workflow_file,
+                ", ".join(step_cache.completed),
+            )
+    return workflow.run(args=args, step_cache=step_cache)
+
 
 class LoadConfig(Instruction):
+    """
+    Load the VPN yaml (only the hosts selected with "hostname", a comma separated
+    list), generate missing Wireguard keys and allocate missing peer addresses.
+    With "write_config" the completed config is written back (comments are not
+    preserved, the original is kept as <vpn_yaml>.bak).
+    """
+
+    CACHEABLE = True
+
+    def get_result(self, ctx: ExecutionContext) -> Any:
+        return {
+            "config": ctx.config,
+            "peers": ctx.peers,
+            "unsaved_keys": ctx.unsaved_keys,
+        }
+
+    def restore_result(self, ctx: ExecutionContext, result: Any) -> None:
+        ctx.config = result["config"]
+        ctx.peers = result["peers"]
+        ctx.unsaved_keys = result.get("unsaved_keys", 0)
+
     def run(self, ctx: ExecutionContext) -> ExecutionContext:
-        with open(ctx.get_args("vpn_yaml"), encoding="utf-8") as f:
-            ctx.config = yaml_to_dict(f.read())
+        args = {**ctx.get_args(), **self._attr}
+        vpn_yaml = args["vpn_yaml"]
+        ctx.config = load_config(
+            vpn_yaml,
+            parse_hostnames(args.get("hostname")),
+            use_cache=not args.get("no_config_cache"),
+        )
+        generated = fill_missing_keys(ctx.config)
+        allocated = allocate_peer_ips(ctx.config)
+        ctx.peers = build_peer_registries(ctx.config)
+
+        if not generated and not allocated:
+            return ctx
+        if args.get("write_config"):
+            # the loaded config may be a subset of hosts
+            full_config = load_config(vpn_yaml, use_cache=False)
+            full_config.update(ctx.config)
+            shutil.copyfile(vpn_yaml, f"{vpn_yaml}.bak")
+            tmp_path = f"{vpn_yaml}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(dict_to_yaml(full_config))
+            shutil.copymode(vpn_yaml, tmp_path)
+            os.replace(tmp_path, vpn_yaml)
+            logger.info("Completed config written to %s", vpn_yaml)
+        elif generated:
+            ctx.unsaved_keys = generated
+            logger.warning(
+                "Generated keys are not saved and will change on the next run, "
+                "use --write-config to store them in %s",
+                vpn_yaml,
+            )
         return ctx
 
 
+def check_saved_keys(ctx: ExecutionContext) -> None:
+    """
+    Refuse to push configs with keys that only exist in this run: the next run
+    would generate others, rotating server keys and breaking issued clients.
+    """
+    if ctx.unsaved_keys:
+        raise RuntimeError(
+            f"{ctx.unsaved_keys} Wireguard key pair(s) were generated but not "
+            f"saved, rerun with --write-config to store them in "
+            f"{ctx.get_args().get('vpn_yaml')} before pushing configs"
+        )
+
+
 class ConnectHosts(Instruction):
+    """
+    Connect to every host.
+
+    With "result_cache" the hosts serve LINUX_COMMANDS results from the local
+    ResultCache ("result_cache_db", "max_age" overrides the per-command ttl,
+    "refresh" skips the cached results) and connect lazily, on their first
+    remote command, so runs answered from the cache make no SSH connection at
+    all.
+    """
+
     def run(self, ctx: ExecutionContext) -> ExecutionContext:
-        for hostname, host_config in ctx.config.items():
-            host = Host(hostname, host_config)
+        args = {**ctx.get_args(), **self._attr}
+        if args.get("result_cache"):
+            if ctx.result_cache is None:
+                ctx.result_cache = ResultCache(
+                    args.get("result_cache_db") or DEFAULT_RESULT_CACHE_DB
+                )
+            ctx.hosts.update(
+                {
+                    hostname: Host(
+                        hostname,
+                        host_cfg,
+                        pool=ctx.pool,
+                        result_cache=ctx.result_cache,
+                        max_age=args.get("max_age"),
+                        refresh=args.get("refresh", False),
+                    )
+                    for hostname, host_cfg in ctx.config.items()
+                }
+            )
+            return ctx
+
+        def connect(hostname: str) -> Host:
+            host = Host(hostname, ctx.config[hostname], pool=ctx.pool)
             host.connect()
-            ctx.hosts[hostname] = host
+            return host
+
+        ctx.hosts.update(self.run_per_host(ctx, connect, ctx.config))
         return ctx
 
 
 class GetWireguardStatus(Instruction):
+    """
+    Show server uptimes and peer handshakes of every host.
+
+    "format" is "table" (default) or a machine-readable format of
+    vpntools.output: ndjson and csv stream host and peer records as each host
+    responds, json writes one document at the end. "peer" limits the peers
+    shown to a comma separated list of peer names (or public keys).
+    """
+
     def run(self, ctx: ExecutionContext) -> ExecutionContext:
+        args = {**ctx.get_args(), **self._attr}
+        output_format = args.get("format") or "table"
+        peer_filter = parse_hostnames(args.get("peer"))
+
+        def collect(hostname: str) -> Tuple[WgServerStats, datetime]:
+            host = ctx.hosts[hostname]
+            wg_app_config = get_wg_from_host_cfg(ctx.config[hostname])
+            wg_srv = WireguardServer(host, wg_app_config, ctx.peers.get(hostname))
+            res = host.run_linux_cmds(
+                ["WG_STATUS", "GET_UPTIME", "WIREGUARD_SVC_STATUS"]
+            )
+            wg_srv_status = wg_srv.get_peer_stats(
+                res["WG_STATUS"], res["WIREGUARD_SVC_STATUS"]
+            )
+            if peer_filter is not None:
+                wg_srv_status = wg_srv_status.filter_peers(peer_filter)
+            return wg_srv_status, res["GET_UPTIME"]
+
+        if output_format == "table":
+            self._print_tables(ctx, self.run_per_host(ctx, collect))
+            return ctx
+
+        writer = get_record_writer(output_format)
+
+        def write_records(
+            hostname: str, result: Tuple[WgServerStats, datetime]
+        ) -> None:
+            wg_srv_status, uptime = result
+            writer.write(
+                {
+                    "type": "host",
+                    "hostname": hostname,
+                    "description": ctx.hosts[hostname].config.get("description", ""),
+                    "uptime_seconds": int((datetime.utcnow() - uptime).total_seconds()),
+                    "interfaces": wg_srv_status.interfaces,
+                }
+            )
+            for peer_name, record in wg_srv_status.iter_peers():
+                writer.write(
+                    {
+                        "type": "peer",
+                        "hostname": hostname,
+                        "interface": record.interface,
+                        "peer": peer_name,
+                        "known": peer_name is not None,
+                        "public_key": record.public_key,
+                        "endpoint": record.endpoint,
+                        "allowed_ips": record.allowed_ips,
+                        "latest_handshake": record.latest_handshake or None,
+                        "transfer_rx": record.transfer_rx,
+                        "transfer_tx": record.transfer_tx,
+                    }
+                )
+
+        try:
+            self.run_per_host(ctx, collect, on_result=write_records)
+        finally:
+            writer.close()
+        return ctx
+
+    @staticmethod
+    def _print_tables(
+        ctx: ExecutionContext, results: Dict[str, Tuple[WgServerStats, datetime]]
+    ) -> None:
+        # pylint: disable=import-outside-toplevel
+        from termcolor import cprint
+        from prettytable import PrettyTable
+
         hosts_tbl = PrettyTable()
         hosts_tbl.field_names = [
             "Hostname",
             "Description",
             "Server Uptime",
+            "Interfaces",
         ]
         hosts_tbl.align["Hostname"] = "r"
         hosts_tbl.align["Description"] = "l"
         hosts_tbl.align["Server Uptime"] = "l"
+        hosts_tbl.align["Interfaces"] = "l"
         host_tables = {}
-        for hostname, host in ctx.hosts.items():
-            wg_app_config = get_wg_from_host_cfg(ctx.config[hostname])
-
-            wg_srv = WireguardServer(host, wg_app_config)
-            wg_srv_status = wg_srv.get_peer_stats()
-
+        for hostname, (wg_srv_status, uptime) in results.items():
             host_table = PrettyTable()
-            host_table.field_names = ["Client", "Latest Endpoint", "Latest Active"]
+            host_table.field_names = [
+                "Client",
+                "Interface",
+                "Latest Endpoint",
+                "Latest Active",
+            ]
             host_table.align = "r"
             host_tables[hostname] = host_table
 
-            for peer_id, peer_status in wg_srv_status.items():
+            for peer_name, peer_status in wg_srv_status.iter_peers():
                 host_table.add_row(
                     [
-                        peer_id,
-                        peer_status.get("endpoint", ""),
-                        peer_status.get("latest handshake", ""),
+                        peer_name or f"unknown: {peer_status.public_key}",
+                        peer_status.interface,
+                        peer_status.endpoint or "",
+                        format_handshake(peer_status.latest_handshake),
                     ]
                 )
 
             hosts_tbl.add_row(
                 [
                     hostname,
-                    host.config.get("description", ""),
-                    str(datetime.utcnow() - host.run_linux_cmd("GET_UPTIME")),
+                    ctx.hosts[hostname].config.get("description", ""),
+                    str(datetime.utcnow() - uptime),
+                    ", ".join(
+                        f"{wg_if_name}: {state}"
+                        for wg_if_name, state in wg_srv_status.interfaces.items()
+                    ),
                 ]
             )
 
@@ -166,66 +686,640 @@ class GetWireguardStatus(Instruction):
         for hostname, host_tbl in host_tables.items():
             cprint(f"Details for {hostname}:", color="cyan")
             print(host_tbl.get_string(sortby="Client"))
-        return ctx
 
 
 class DeployWireguard(Instruction):
+    """
+    Render, upload and activate the Wireguard configs of every host.
+
+    Hosts whose rendered configs, deploy script and template are unchanged since
+    the last deployment recorded in the local deploy state (and whose remote
+    config checksums still match) are skipped, unless "force" is set. Refuses
+    to run with keys LOAD_CONFIG generated but did not save.
+    """
+
+    CACHEABLE = True
+
     def run(self, ctx: ExecutionContext) -> ExecutionContext:
+        check_saved_keys(ctx)
         wg_script_path = get_resource_path("deploy_wireguard.sh", scripts)
+        deploy_state = DeployStateCache(
+            ctx.get_args().get("state_file") or DEFAULT_DEPLOY_STATE_PATH
+        )
+        force = self._attr.get("force") or ctx.get_args().get("force")
+        versions = get_deploy_versions()
 
-        for hostname, host in ctx.hosts.items():
-            logger.info("%s: Deploying Wireguard", hostname)
+        def is_unchanged(
+            hostname: str, host: Host, entries: Dict[str, Dict[str, Any]]
+        ) -> bool:
+            if force or not all(
+                deploy_state.is_unchanged(hostname, wg_if_name, entry)
+                for wg_if_name, entry in entries.items()
+            ):
+                return False
+            remote_hashes = host.run_linux_cmd("WG_CONFIG_CHECKSUMS")
+            return all(
+                remote_hashes.get(wg_if_name) == entry["config_hash"]
+                for wg_if_name, entry in entries.items()
+            )
+
+        def deploy(hostname: str) -> bool:
+            host = ctx.hosts[hostname]
             wg_app_config = get_wg_from_host_cfg(ctx.config[hostname])
 
+            wg_cfgs = {}
+            entries = {}
             for wg_if_name, wg_if_dict in wg_app_config.items():
                 logger.info(
                     "%s: Generating Wireguard configuration for %s",
                     hostname,
                     wg_if_name,
                 )
-                wg_cfg_str = build_wg_server_cfg(wg_if_dict, hostname, wg_if_name)
-                wg_cfg_path = os.path.join(host.TMP_DATA_DIR, f"{wg_if_name}.conf")
-                logger.info("%s: Uploading Wireguard configuration", hostname)
-                host.put_data_into_file(
-                    wg_cfg_str,
-                    wg_cfg_path,
+                wg_cfgs[wg_if_name] = build_wg_server_cfg(
+                    wg_if_dict, hostname, wg_if_name
                 )
-            res = host.runscript(wg_script_path, root=True)
+                entries[wg_if_name] = make_deploy_entry(
+                    wg_cfgs[wg_if_name],
+                    get_desired_peers(ctx.peers[hostname].by_interface(wg_if_name)),
+                    versions,
+                )
+
+            if is_unchanged(hostname, host, entries):
+                logger.info("%s: Wireguard configuration unchanged, skipping", hostname)
+                return False
+
+            logger.info("%s: Deploying Wireguard", hostname)
+            # configs and script go up in one SFTP session
+            script = host.script_file(wg_script_path)
+            host.put_files(
+                [
+                    *(
+                        RemoteFile(host.tmp_path(f"{wg_if_name}.conf"), wg_cfg_str)
+                        for wg_if_name, wg_cfg_str in wg_cfgs.items()
+                    ),
+                    script,
+                ]
+            )
+            res = host.run_uploaded_script(
+                script.path, root=True, args=[host.tmp_dir, *wg_cfgs]
+            )
             if res.ok:
                 logger.info("%s: Wireguard deployed", hostname)
+                for wg_if_name, entry in entries.items():
+                    deploy_state.set(hostname, wg_if_name, entry)
+            return True
+
+        deployed = self.run_per_host(ctx, deploy)
+        deploy_state.save()
+        logger.info(
+            "Wireguard deploy: %d host(s) deployed, %d skipped as unchanged",
+            sum(deployed.values()),
+            len(deployed) - sum(deployed.values()),
+        )
+        return ctx
+
+
+class PlanWireguard(Instruction):
+    """
+    Show what DEPLOY_WIREGUARD would change, without connecting to any host.
+
+    Server configs are rendered locally (in a process pool for huge fleets)
+    and compared with the deploy state ("state_file"): per interface whether
+    it is created or updated and why, the peers added, updated and removed,
+    and per host an estimate of the deployment (uploads, restarts, SSH
+    round-trips, network time at "rtt_ms"). With "output_dir" the client
+    configs are also compared with the ones written there. "format" as for
+    GET_WIREGUARD_STATUS.
+    """
+
+    def run(self, ctx: ExecutionContext) -> ExecutionContext:
+        args = {**ctx.get_args(), **self._attr}
+        deploy_state = DeployStateCache(
+            args.get("state_file") or DEFAULT_DEPLOY_STATE_PATH
+        )
+        versions = get_deploy_versions()
+        rtt = (args.get("rtt_ms") or DEFAULT_RTT * 1000) / 1000
+        script_size = os.path.getsize(get_resource_path("deploy_wireguard.sh", scripts))
+
+        if ctx.unsaved_keys:
+            logger.warning(
+                "%d Wireguard key pair(s) were generated for this run only, the "
+                "hosts using them show up as changed, use --write-config with "
+                "deploy_wg or sync_wg to store them in %s first",
+                ctx.unsaved_keys,
+                args.get("vpn_yaml"),
+            )
+        rendered, errors = render_server_configs(ctx.config, args.get("processes"))
+        for hostname, err in errors.items():
+            logger.error("%s: Rendering Wireguard configs failed: %s", hostname, err)
+            ctx.add_error(hostname, err)
+        plans = {
+            hostname: plan_host(
+                hostname, wg_cfgs, ctx.peers[hostname], deploy_state, versions
+            )
+            for hostname, wg_cfgs in rendered.items()
+        }
+
+        output_dir = args.get("output_dir")
+        if output_dir:
+            artifacts = build_client_artifacts(
+                list(
+                    iter_client_jobs(
+                        ctx.config,
+                        ctx.peers,
+                        list(plans),
+                        bool(args.get("prefer_ipv6")),
+                    )
+                ),
+                processes=args.get("processes"),
+            )
+            client_plans = plan_clients(
+                artifacts, read_client_configs(output_dir, args.get("bundle"))
+            )
+            for hostname, host_plan in plans.items():
+                host_plan.clients = client_plans.get(hostname, ClientsPlan())
+
+        costs = {
+            hostname: host_plan.estimate_cost(script_size, rtt)
+            for hostname, host_plan in plans.items()
+        }
+        output_format = args.get("format") or "table"
+        if output_format == "table":
+            self._print_table(plans, costs, self.get_workers(ctx))
+            return ctx
+
+        writer = get_record_writer(output_format, fields=PLAN_FIELDS)
+        try:
+            for hostname, host_plan in plans.items():
+                host_record = {
+                    "type": "host",
+                    "hostname": hostname,
+                    "action": "deploy" if host_plan.changed else "unchanged",
+                    **costs[hostname],
+                }
+                if host_plan.clients is not None:
+                    host_record["clients_new"] = host_plan.clients.new
+                    host_record["clients_changed"] = host_plan.clients.changed
+                    host_record["clients_removed"] = host_plan.clients.removed
+                writer.write(host_record)
+                for if_plan in host_plan.interfaces:
+                    if_record = {
+                        "type": "interface",
+                        "hostname": hostname,
+                        "interface": if_plan.wg_if_name,
+                        "action": if_plan.action,
+                        "reason": if_plan.reason,
+                    }
+                    if if_plan.peers is not None:
+                        if_record["peers_added"] = len(if_plan.peers.add)
+                        if_record["peers_updated"] = len(if_plan.peers.update)
+                        if_record["peers_removed"] = len(if_plan.peers.remove)
+                    writer.write(if_record)
+        finally:
+            writer.close()
+        return ctx
+
+    @staticmethod
+    def _print_table(
+        plans: Dict[str, HostPlan], costs: Dict[str, Dict[str, Any]], workers: int
+    ) -> None:
+        # pylint: disable=import-outside-toplevel
+        from termcolor import cprint
+        from prettytable import PrettyTable
+
+        tbl = PrettyTable()
+        tbl.field_names = [
+            "Hostname",
+            "Interfaces",
+            "Restarts",
+            "Upload",
+            "Round-trips",
+            "Est. Time",
+            "Clients",
+        ]
+        tbl.align = "l"
+        tbl.align["Hostname"] = "r"
+        for hostname, host_plan in plans.items():
+            interfaces = []
+            for if_plan in host_plan.interfaces:
+                line = f"{if_plan.wg_if_name}: {if_plan.action}"
+                if if_plan.reason:
+                    line += f" ({if_plan.reason})"
+                if if_plan.peers:
+                    line += f" peers {if_plan.peers}"
+                interfaces.append(line)
+            cost = costs[hostname]
+            clients = host_plan.clients
+            tbl.add_row(
+                [
+                    hostname,
+                    "\n".join(interfaces),
+                    len(cost["restarts"]) or "",
+                    f"{cost['upload_bytes'] / 1024:.1f} KiB"
+                    if cost["upload_bytes"]
+                    else "",
+                    cost["round_trips"],
+                    f"{cost['estimated_seconds']:.2f} s",
+                    f"+{clients.new} ~{clients.changed} -{clients.removed}"
+                    if clients
+                    else "",
+                ]
+            )
+
+        cprint("Deployment plan:", color="cyan")
+        print(tbl)
+        changed = [host_plan for host_plan in plans.values() if host_plan.changed]
+        seconds = [cost["estimated_seconds"] for cost in costs.values()]
+        # hosts run concurrently, at most workers at a time
+        total = max(max(seconds, default=0), sum(seconds) / workers)
+        print(
+            f"{len(changed)} host(s) to deploy, {len(plans) - len(changed)} "
+            f"unchanged, {sum(len(cost['restarts']) for cost in costs.values())} "
+            f"interface restart(s), ~{total:.1f} s of network time "
+            f"with {workers} worker(s)"
+        )
+        syncable = [host_plan.hostname for host_plan in changed if host_plan.syncable]
+        if syncable:
+            print(
+                f"Only peers changed on {len(syncable)} host(s), sync_wg applies "
+                "that without restarting: " + ", ".join(syncable)
+            )
+
+
+class SyncWireguard(Instruction):
+    """
+    Apply peer changes to running Wireguard interfaces without a restart.
+
+    Desired peers from the config are diffed against the live `wg show all dump`
+    state and only the delta is applied with `wg set`. Configured interfaces
+    that are not running get their config installed and are started, together
+    in the same remote script. Interface level settings (address, port, keys)
+    of running interfaces are not synced, those still need DEPLOY_WIREGUARD.
+    Refuses to run with keys LOAD_CONFIG generated but did not save.
+
+    Interfaces whose settings match the deploy state ("state_file") get their
+    synced config recorded there, so DEPLOY_WIREGUARD skips them afterwards.
+    """
+
+    CACHEABLE = True
+
+    def run(self, ctx: ExecutionContext) -> ExecutionContext:
+        check_saved_keys(ctx)
+        deploy_state = DeployStateCache(
+            ctx.get_args().get("state_file") or DEFAULT_DEPLOY_STATE_PATH
+        )
+        versions = get_deploy_versions()
+
+        def sync(hostname: str) -> bool:
+            host = ctx.hosts[hostname]
+            wg_app_config = get_wg_from_host_cfg(ctx.config[hostname])
+            res = host.run_linux_cmds(["WG_INTERFACES", "WG_STATUS"])
+            live_peers: Dict[str, Dict[str, List[str]]] = {}
+            for record in res["WG_STATUS"].values():
+                live_peers.setdefault(record.interface, {})[
+                    record.public_key
+                ] = record.allowed_ips
+
+            script_lines = []
+            wg_cfg_files = []
+            start_ifs = []
+            entries = {}
+            for wg_if_name, wg_if_dict in wg_app_config.items():
+                wg_cfg_str = build_wg_server_cfg(wg_if_dict, hostname, wg_if_name)
+                desired_peers = get_desired_peers(
+                    ctx.peers[hostname].by_interface(wg_if_name)
+                )
+                entry = make_deploy_entry(wg_cfg_str, desired_peers, versions)
+                cached = deploy_state.get(hostname, wg_if_name)
+                # the deploy script did not run, only the config is new
+                recordable = (
+                    cached is not None
+                    and cached.get("interface_hash") == entry["interface_hash"]
+                    and cached.get("template_version") == entry["template_version"]
+                )
+                if wg_if_name in res["WG_INTERFACES"]:
+                    diff = diff_wg_peers(desired_peers, live_peers.get(wg_if_name, {}))
+                    logger.info("%s: %s peers %s", hostname, wg_if_name, diff)
+                    stale = recordable and cached["config_hash"] != entry["config_hash"]
+                    if not diff and not stale:
+                        continue
+                else:
+                    logger.info(
+                        "%s: %s is not running, starting it", hostname, wg_if_name
+                    )
+                    start_ifs.append(wg_if_name)
+                    diff = None
+                if recordable:
+                    entries[wg_if_name] = {
+                        **entry,
+                        "script_version": cached.get("script_version"),
+                    }
+
+                wg_cfg_path = host.tmp_path(f"{wg_if_name}.conf")
+                wg_cfg_files.append(RemoteFile(wg_cfg_path, wg_cfg_str))
+                # keeps the on-disk config in line for the next wg-quick restart
+                wg_cfg_dst = posixpath.join(WG_CONFIG_DIR, f"{wg_if_name}.conf")
+                script_lines.append(
+                    f"install -m 0600 {shlex.quote(wg_cfg_path)} "
+                    f"{shlex.quote(wg_cfg_dst)}"
+                )
+                script_lines.append(f"rm {shlex.quote(wg_cfg_path)}")
+                if diff:
+                    script_lines += build_wg_sync_cmds(wg_if_name, diff)
+
+            if not script_lines:
+                return False
+            if start_ifs:
+                units = " ".join(
+                    shlex.quote(f"wg-quick@{wg_if_name}") for wg_if_name in start_ifs
+                )
+                script_lines.append(f"systemctl enable --now {units}")
+            script = "\n".join(["#!/usr/bin/env bash", "set -e", *script_lines])
+            script_file = host.script_file(io.BytesIO(script.encode()))
+            # configs and script go up in one SFTP session
+            host.put_files([*wg_cfg_files, script_file])
+            host.run_uploaded_script(script_file.path, root=True)
+            logger.info("%s: Wireguard peers synced", hostname)
+            for wg_if_name, entry in entries.items():
+                deploy_state.set(hostname, wg_if_name, entry)
+            return True
+
+        synced = self.run_per_host(ctx, sync)
+        deploy_state.save()
+        logger.info(
+            "Wireguard sync: %d host(s) changed, %d unchanged",
+            sum(synced.values()),
+            len(synced) - sum(synced.values()),
+        )
         return ctx
 
 
 class BuildWireguardClients(Instruction):
+    """
+    Generate client configs with QR codes for every peer.
+
+    With "output_dir" the artifacts are written there (as a zip bundle with
+    "bundle"), QR codes in "qr_format". Otherwise configs and ANSI QR codes are
+    printed to stdout.
+    """
+
+    CACHEABLE = True
+
     def run(self, ctx: ExecutionContext) -> ExecutionContext:
-        for hostname, _ in ctx.hosts.items():
+        hostnames = []
+        # only needs the config, may run before or alongside CONNECT_HOSTS
+        for hostname in ctx.config:
+            if hostname in ctx.errors:
+                logger.warning(
+                    "%s: Skipping Wireguard client configurations, host has errors",
+                    hostname,
+                )
+                continue
             logger.info("%s: Generating Wireguard client configurations", hostname)
-            wg_app_config = get_wg_from_host_cfg(ctx.config[hostname])
+            hostnames.append(hostname)
 
-            for _, wg_if_dict in wg_app_config.items():
-                for peer in wg_if_dict["peers"]:
-                    for peer_name, peer_dict in peer.items():
-                        logger.info(
-                            "%s: Generating Wireguard client configuration for %s",
-                            hostname,
-                            peer_name,
-                        )
-                        wg_peer_cfg_str = build_wg_peer_cfg(
-                            peer_dict, wg_if_dict, hostname
-                        )
-                        wg_peer_cfg_path = os.path.join(
-                            os.path.curdir, f"{peer_name}.conf"
+        args = {**ctx.get_args(), **self._attr}
+        output_dir = args.get("output_dir")
+        qr_format = (args.get("qr_format") or "png") if output_dir else "ansi"
+        artifacts = build_client_artifacts(
+            list(
+                iter_client_jobs(
+                    ctx.config, ctx.peers, hostnames, bool(args.get("prefer_ipv6"))
+                )
+            ),
+            qr_format,
+            args.get("processes"),
+        )
+
+        if output_dir:
+            path = write_client_artifacts(artifacts, output_dir, args.get("bundle"))
+            logger.info(
+                "%d client configuration(s) written to %s", len(artifacts), path
+            )
+            return ctx
+
+        for artifact in artifacts:
+            print(f"Configuration for {artifact.peer_name}:")
+            print(artifact.config)
+            print(f"QR code for {artifact.peer_name}:")
+            print(artifact.qr_code)
+        return ctx
+
+
+def get_wg_servers(ctx: ExecutionContext) -> Dict[str, WireguardServer]:
+    """
+    WireguardServer of every configured host, for the polling instructions.
+    Hosts that failed CONNECT_HOSTS get an unconnected Host, which connects on
+    its first command: they are retried on every poll instead of dropped.
+    """
+    for hostname, host_cfg in ctx.config.items():
+        if hostname not in ctx.hosts:
+            ctx.hosts[hostname] = Host(hostname, host_cfg, pool=ctx.pool)
+    return {
+        hostname: WireguardServer(
+            ctx.hosts[hostname],
+            get_wg_from_host_cfg(host_cfg),
+            ctx.peers.get(hostname),
+        )
+        for hostname, host_cfg in ctx.config.items()
+    }
+
+
+class MonitorWireguard(Instruction):
+    """
+    Poll `wg show all dump` of every host each "interval" seconds (over the
+    open connections, hosts that could not be connected are retried on every
+    poll) and store per-peer counters and rx/tx rates in the local telemetry
+    database "db". Runs until interrupted, or for "count" polls. Old samples
+    are downsampled and dropped after "retention" seconds.
+    """
+
+    DEFAULT_INTERVAL = 10
+    # polls between two compactions of the telemetry database
+    COMPACT_EVERY = 60
+
+    def run(self, ctx: ExecutionContext) -> ExecutionContext:
+        args = {**ctx.get_args(), **self._attr}
+        interval = args.get("interval") or self.DEFAULT_INTERVAL
+        count = args.get("count")
+        store = TelemetryStore(
+            args.get("db") or DEFAULT_TELEMETRY_DB,
+            retention=args.get("retention") or DEFAULT_RETENTION,
+        )
+        rates = RateTracker()
+        wg_servers = get_wg_servers(ctx)
+
+        def collect(hostname: str) -> WgServerStats:
+            return wg_servers[hostname].get_peer_stats()
+
+        logger.info(
+            "Monitoring %d host(s) every %ss into %s",
+            len(wg_servers),
+            interval,
+            store.path,
+        )
+        polls = 0
+        try:
+            while count is None or polls < count:
+                started = time.monotonic()
+                ts = int(time.time())
+                samples = []
+                for hostname, wg_srv_status in self.run_per_host(
+                    ctx, collect, wg_servers
+                ).items():
+                    for peer_name, record in wg_srv_status.iter_peers():
+                        samples.append(
+                            rates.sample(
+                                ts, hostname, peer_name or record.public_key, record
+                            )
                         )
-                        print(f"Configuration for {peer_name}:")
-                        print(wg_peer_cfg_str)
-                        print(f"QR code for {peer_name}:")
-                        ret = subprocess.run(
-                            f"echo '{wg_peer_cfg_str}' | qrencode -t ansiutf8",
-                            capture_output=True,
-                            shell=True,
-                            check=True,
+                store.add_samples(samples)
+                ctx.trim_errors()
+
+                polls += 1
+                if polls % self.COMPACT_EVERY == 0:
+                    store.compact(ts)
+                logger.info(
+                    "Poll %d: %d peer sample(s), rx %.1f B/s, tx %.1f B/s",
+                    polls,
+                    len(samples),
+                    sum(sample.rx_rate or 0 for sample in samples),
+                    sum(sample.tx_rate or 0 for sample in samples),
+                )
+                if count is None or polls < count:
+                    time.sleep(max(0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            logger.info("Monitoring stopped after %d poll(s)", polls)
+        finally:
+            store.compact(int(time.time()))
+            store.close()
+        return ctx
+
+
+class ServeMetrics(Instruction):
+    """
+    Serve Prometheus metrics of every host on "listen":"port" (/metrics).
+
+    Hosts are polled in the background every "interval" seconds over the open
+    connections (hosts that could not be connected are retried on every poll),
+    scrapes are answered from the last rendered result. Besides uptime, peer
+    handshake age and rx/tx counters, the collection duration and per-host
+    error counters (failed connections included) are exported.
+    """
+
+    DEFAULT_INTERVAL = 15
+
+    def run(self, ctx: ExecutionContext) -> ExecutionContext:
+        args = {**ctx.get_args(), **self._attr}
+        interval = args.get("interval") or self.DEFAULT_INTERVAL
+        wg_servers = get_wg_servers(ctx)
+        error_counts = {hostname: 0 for hostname in ctx.config}
+        payload = [b""]
+
+        def collect(hostname: str) -> Tuple[WgServerStats, datetime, float]:
+            started = time.monotonic()
+            host = wg_servers[hostname].host
+            res = host.run_linux_cmds(["WG_STATUS", "GET_UPTIME"])
+            wg_srv_status = wg_servers[hostname].get_peer_stats(res["WG_STATUS"])
+            return wg_srv_status, res["GET_UPTIME"], time.monotonic() - started
+
+        def refresh() -> None:
+            started = time.monotonic()
+            results = self.run_per_host(ctx, collect, wg_servers)
+            now = time.time()
+            metrics = MetricsText()
+            for hostname in ctx.config:
+                if hostname not in results:
+                    error_counts[hostname] += 1
+                metrics.add(
+                    "vpntools_host_up",
+                    "gauge",
+                    "1 if the last collection from the host succeeded",
+                    int(hostname in results),
+                    host=hostname,
+                )
+                metrics.add(
+                    "vpntools_host_errors_total",
+                    "counter",
+                    "Failed collections from the host",
+                    error_counts[hostname],
+                    host=hostname,
+                )
+
+            for hostname, (wg_srv_status, uptime, duration) in results.items():
+                metrics.add(
+                    "vpntools_host_uptime_seconds",
+                    "gauge",
+                    "Host uptime",
+                    (datetime.utcnow() - uptime).total_seconds(),
+                    host=hostname,
+                )
+                metrics.add(
+                    "vpntools_host_collection_duration_seconds",
+                    "gauge",
+                    "Duration of the last collection from the host",
+                    duration,
+                    host=hostname,
+                )
+                for peer_name, record in wg_srv_status.iter_peers():
+                    labels = {
+                        "host": hostname,
+                        "interface": record.interface or "",
+                        "peer": peer_name or record.public_key,
+                    }
+                    if record.latest_handshake:
+                        metrics.add(
+                            "vpntools_peer_latest_handshake_age_seconds",
+                            "gauge",
+                            "Seconds since the latest handshake of the peer",
+                            max(0, now - record.latest_handshake),
+                            **labels,
                         )
-                        print(ret.stdout.decode("utf8"))
+                    metrics.add(
+                        "vpntools_peer_receive_bytes_total",
+                        "counter",
+                        "Bytes received from the peer",
+                        record.transfer_rx,
+                        **labels,
+                    )
+                    metrics.add(
+                        "vpntools_peer_transmit_bytes_total",
+                        "counter",
+                        "Bytes sent to the peer",
+                        record.transfer_tx,
+                        **labels,
+                    )
+
+            metrics.add(
+                "vpntools_collection_duration_seconds",
+                "gauge",
+                "Duration of the last collection from all hosts",
+                time.monotonic() - started,
+            )
+            metrics.add(
+                "vpntools_last_collection_timestamp_seconds",
+                "gauge",
+                "Unix time of the last collection",
+                now,
+            )
+            payload[0] = metrics.render().encode()
+            ctx.trim_errors()
+
+        refresh()
+        server = MetricsServer(
+            lambda: payload[0],
+            args.get("listen") or DEFAULT_LISTEN,
+            args.get("port") or DEFAULT_PORT,
+        )
+        server.start()
+        try:
+            while True:
+                time.sleep(interval)
+                refresh()
+        except KeyboardInterrupt:
+            logger.info("Metrics server stopped")
+        finally:
+            server.close()
         return ctx
 
 
@@ -234,5 +1328,9 @@ INSTRUCTIONS = {
     "CONNECT_HOSTS": ConnectHosts,
     "GET_WIREGUARD_STATUS": GetWireguardStatus,
     "DEPLOY_WIREGUARD": DeployWireguard,
+    "SYNC_WIREGUARD": SyncWireguard,
+    "PLAN_WIREGUARD": PlanWireguard,
     "BUILD_WIREGUARD_CLIENTS": BuildWireguardClients,
+    "MONITOR_WIREGUARD": MonitorWireguard,
+    "SERVE_METRICS": ServeMetrics,
 }
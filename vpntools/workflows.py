@@ -1,23 +1,66 @@
-from vpntools.workflow import Workflow
+from functools import lru_cache
+from typing import Any, Dict
 
-
-STATUS_WF = Workflow.from_dict(
-    {
+# Workflow definitions, built on first use by get_workflow so that importing
+# this module (e.g. for `--help`) does not pull in the instruction modules.
+WORKFLOWS: Dict[str, Dict[str, Any]] = {
+    "STATUS_WF": {
         "instructions": [
             {"LOAD_CONFIG": {}},
-            {"CONNECT_HOSTS": {}},
+            {"CONNECT_HOSTS": {"result_cache": True}},
             {"GET_WIREGUARD_STATUS": {}},
         ]
-    }
-)
-
-DEPLOY_WIREGUARD_WF = Workflow.from_dict(
-    {
+    },
+    "DEPLOY_WIREGUARD_WF": {
         "instructions": [
             {"LOAD_CONFIG": {}},
             {"CONNECT_HOSTS": {}},
             {"DEPLOY_WIREGUARD": {}},
             {"BUILD_WIREGUARD_CLIENTS": {}},
         ]
-    }
-)
+    },
+    "SYNC_WIREGUARD_WF": {
+        "instructions": [
+            {"LOAD_CONFIG": {}},
+            {"CONNECT_HOSTS": {}},
+            {"SYNC_WIREGUARD": {}},
+            {"BUILD_WIREGUARD_CLIENTS": {}},
+        ]
+    },
+    "PLAN_WIREGUARD_WF": {
+        "instructions": [
+            {"LOAD_CONFIG": {}},
+            {"PLAN_WIREGUARD": {}},
+        ]
+    },
+    "MONITOR_WIREGUARD_WF": {
+        "instructions": [
+            {"LOAD_CONFIG": {}},
+            {"CONNECT_HOSTS": {}},
+            {"MONITOR_WIREGUARD": {}},
+        ]
+    },
+    "SERVE_METRICS_WF": {
+        "instructions": [
+            {"LOAD_CONFIG": {}},
+            {"CONNECT_HOSTS": {}},
+            {"SERVE_METRICS": {}},
+        ]
+    },
+}
+
+
+@lru_cache(maxsize=None)
+def get_workflow(name: str) -> Any:
+    """Build the Workflow registered as name in WORKFLOWS"""
+    # pylint: disable=import-outside-toplevel
+    from vpntools.workflow import Workflow
+
+    return Workflow.from_dict(WORKFLOWS[name])
+
+
+def __getattr__(name: str) -> Any:
+    # keeps `from vpntools.workflows import STATUS_WF` working
+    if name in WORKFLOWS:
+        return get_workflow(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")